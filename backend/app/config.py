@@ -1,9 +1,113 @@
+from typing import List
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     ENV: str = "development"
-    DATABASE_URL: str = "sqlite:///./app.db"
+    # Пустое значение - SQLite-файл backend/data/trustytrade.db
+    DATABASE_URL: str = ""
     BOT_TOKEN: str = ""
+
+    # Профиль движка БД: development или production (по умолчанию равен ENV)
+    DB_PROFILE: str = ""
+    # Бэкенд БД: sqlite или postgres (URL собирается из переменных DB_*)
+    DB_BACKEND: str = "sqlite"
+    DB_USER: str = "trustytrade"
+    DB_PASSWORD: str = "trustytrade"
+    DB_HOST: str = "localhost"
+    DB_PORT: str = "5432"
+    DB_NAME: str = "trustytrade_db"
+
+    # Пул соединений (профиль production)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30
+
+    # Движок чтения для GET-обработчиков: URL реплики или, если он пуст,
+    # отдельный пул read-only соединений к тому же файлу SQLite (WAL)
+    DATABASE_READ_URL: str = ""
+    DB_READ_SPLIT: bool = True
+    DB_READ_POOL_SIZE: int = 10
+    # Сколько секунд после записи чтения пользователя идут в основную БД
+    READ_YOUR_WRITES_WINDOW: float = 5.0
+    READ_YOUR_WRITES_MAX_KEYS: int = 100000
+
+    # PRAGMA для SQLite (профиль production)
+    SQLITE_BUSY_TIMEOUT: int = 5000
+    SQLITE_CACHE_SIZE: int = -65536
+    SQLITE_MMAP_SIZE: int = 268435456
+
+    # Счетчик SQL-запросов в заголовках ответа и поиск N+1
+    DEBUG_SQL: bool = False
+    N_PLUS_ONE_THRESHOLD: int = 5
+
+    # Кэш ответов каталога (GET /accounts/)
+    RESPONSE_CACHE_MAX_ENTRIES: int = 2000
+    RESPONSE_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+
+    # Уведомления участникам сделок через Bot API
+    NOTIFY_ENABLED: bool = True
+    TELEGRAM_API_URL: str = "https://api.telegram.org"
+    # Лимиты Telegram: ~30 сообщений в секунду всего и ~1 в секунду в один чат
+    NOTIFY_GLOBAL_RATE: float = 30.0
+    NOTIFY_CHAT_RATE: float = 1.0
+    NOTIFY_CHAT_BURST: int = 1
+    NOTIFY_BATCH_SIZE: int = 200
+    NOTIFY_POLL_INTERVAL: float = 1.0
+    # На сколько секунд отправщик захватывает пачку сообщений
+    NOTIFY_LEASE: float = 60.0
+    NOTIFY_MAX_ATTEMPTS: int = 5
+    NOTIFY_RETRY_BASE: float = 2.0
+    NOTIFY_RETRY_MAX: float = 300.0
+
+    # Idempotency-Key для POST /deals/ и /accounts/
+    IDEMPOTENCY_TTL: int = 24 * 3600
+    IDEMPOTENCY_CACHE_SIZE: int = 10000
+    # Сколько повтор ждет завершения первого запроса
+    IDEMPOTENCY_WAIT_TIMEOUT: float = 30.0
+    # Аренда незавершенной записи: продлевается, пока обработчик работает,
+    # и истекает, только если процесс упал, не дописав ответ
+    IDEMPOTENCY_LEASE: float = 60.0
+    IDEMPOTENCY_SWEEP_INTERVAL: float = 300.0
+    IDEMPOTENCY_SWEEP_BATCH: int = 1000
+
+    # Transactional outbox событий сделок и отзывов
+    OUTBOX_ENABLED: bool = True
+    OUTBOX_BATCH_SIZE: int = 500
+    OUTBOX_POLL_INTERVAL: float = 1.0
+    # Аренда потребителя процессом; истекшую аренду забирает другой процесс
+    OUTBOX_LEASE: float = 30.0
+    OUTBOX_MAX_ATTEMPTS: int = 10
+    OUTBOX_RETRY_BASE: float = 1.0
+    OUTBOX_RETRY_MAX: float = 60.0
+    # Сколько ждать незафиксированную транзакцию с меньшим id, прежде чем
+    # считать пропуск в id откатом
+    OUTBOX_GAP_TIMEOUT: float = 30.0
+    OUTBOX_RETENTION: int = 7 * 24 * 3600
+    OUTBOX_PRUNE_INTERVAL: float = 3600.0
+    OUTBOX_PRUNE_BATCH: int = 1000
+
+    # Сводка цен по играм (GET /accounts/stats)
+    PRICE_STATS_REFRESH_INTERVAL: float = 60.0
+    # Игр в одной пачке пересчета
+    PRICE_STATS_BATCH_GAMES: int = 50
+    # Нижние границы корзин гистограммы; последняя корзина не ограничена сверху
+    PRICE_STATS_BUCKETS: List[float] = [0, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000]
+
+    # Перенос завершенных и отмененных сделок (с отзывами) в архивные таблицы
+    DEAL_ARCHIVE_ENABLED: bool = True
+    DEAL_ARCHIVE_AFTER_DAYS: int = 90
+    DEAL_ARCHIVE_BATCH: int = 500
+    DEAL_ARCHIVE_INTERVAL: float = 3600.0
+
+    # SSE-лента изменений объявлений (GET /accounts/stream)
+    STREAM_BUFFER_SIZE: int = 64
+    STREAM_MAX_SUBSCRIBERS: int = 50000
+    STREAM_HEARTBEAT_INTERVAL: float = 15.0
+
+    # Кэш проверенных данных авторизации Telegram
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL: int = 3600
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import DateTime, delete, func, insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..models.deal import ArchivedDeal, ArchivedReview, Deal, Review
+from ..schemas.deal import DEAL_TRANSITIONS
+from ..utils.metrics import DEALS_ARCHIVED
+
+logger = logging.getLogger(__name__)
+
+# Статусы, из которых переходов нет: такие сделки больше не меняются
+TERMINAL_STATUSES = [status for status, targets in DEAL_TRANSITIONS.items() if not targets]
+
+async def _archive_batch(db: AsyncSession, cutoff: datetime) -> int:
+    """Переносит одну пачку сделок с их отзывами, возвращает ее размер"""
+    # Сделка и отзыв с наибольшими id остаются в горячих таблицах: SQLite
+    # без AUTOINCREMENT выдает новые id от текущего максимума и иначе
+    # повторно выдала бы id, уже занятый в архиве
+    newest_deal = select(func.max(Deal.id)).scalar_subquery()
+    newest_review_deal = select(Review.deal_id).order_by(Review.id.desc()).limit(1).scalar_subquery()
+    result = await db.execute(
+        select(Deal.id)
+        .where(
+            Deal.status.in_(TERMINAL_STATUSES),
+            Deal.updated_at < cutoff,
+            Deal.id < newest_deal,
+            Deal.id != func.coalesce(newest_review_deal, 0),
+        )
+        # Без ORDER BY выборка останавливается на первой пачке подходящих строк
+        # индекса по статусу, а не сортирует все завершенные сделки
+        .limit(settings.DEAL_ARCHIVE_BATCH)
+    )
+    ids = result.scalars().all()
+    # Читающая транзакция закрывается до записи: в WAL запись из старого
+    # снимка завершилась бы ошибкой, если между ними писал кто-то еще
+    await db.commit()
+    if not ids:
+        return 0
+
+    archived_at = literal(datetime.utcnow(), DateTime)
+    deal_columns = [column.name for column in Deal.__table__.columns]
+    review_columns = [column.name for column in Review.__table__.columns]
+    # Копирование и удаление - одна транзакция: сделка видна ровно в одной таблице
+    await db.execute(
+        insert(ArchivedDeal.__table__).from_select(
+            deal_columns + ["archived_at"],
+            select(*Deal.__table__.columns, archived_at).where(Deal.id.in_(ids)),
+        )
+    )
+    await db.execute(
+        insert(ArchivedReview.__table__).from_select(
+            review_columns + ["archived_at"],
+            select(*Review.__table__.columns, archived_at).where(Review.deal_id.in_(ids)),
+        )
+    )
+    await db.execute(
+        delete(Review).where(Review.deal_id.in_(ids)).execution_options(synchronize_session=False)
+    )
+    await db.execute(
+        delete(Deal).where(Deal.id.in_(ids)).execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return len(ids)
+
+async def archive_finished_deals(db: AsyncSession, older_than: Optional[timedelta] = None) -> int:
+    """
+    Переносит завершенные и отмененные сделки старше older_than в архив
+
+    Возраст считается от последнего изменения сделки (перехода в
+    конечный статус), по умолчанию DEAL_ARCHIVE_AFTER_DAYS. Сделки
+    переносятся пачками по DEAL_ARCHIVE_BATCH вместе с отзывами, каждая
+    пачка - отдельная транзакция. Возвращает число перенесенных сделок.
+    """
+    if older_than is None:
+        older_than = timedelta(days=settings.DEAL_ARCHIVE_AFTER_DAYS)
+    cutoff = datetime.utcnow() - older_than
+    archived = 0
+    while True:
+        moved = await _archive_batch(db, cutoff)
+        archived += moved
+        DEALS_ARCHIVED.inc(moved)
+        if moved < settings.DEAL_ARCHIVE_BATCH:
+            return archived
+        # Между пачками отдаем управление, чтобы не держать блокировку БД подряд
+        await asyncio.sleep(0)
+
+async def run_deal_archiver() -> None:
+    """Периодически переносит старые завершенные сделки в архив"""
+    from .config import new_session
+
+    while True:
+        try:
+            async with new_session() as db:
+                archived = await archive_finished_deals(db)
+            if archived:
+                logger.info("Archived %d finished deals", archived)
+        except Exception:
+            logger.exception("Deal archival failed")
+        await asyncio.sleep(settings.DEAL_ARCHIVE_INTERVAL)
+
+async def main():
+    """Архивация сделок из командной строки"""
+    from .config import new_session
+
+    async with new_session() as db:
+        archived = await archive_finished_deals(db)
+    print(f"В архив перенесено сделок: {archived}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
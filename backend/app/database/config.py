@@ -1,8 +1,15 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import event, pool
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 import os
+import time
 from pathlib import Path
+from typing import Callable, List, Optional
+
+from ..config import settings
+from ..utils.metrics import DB_CONNECTION_WAIT
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -11,29 +18,193 @@ load_dotenv()
 DB_DIR = Path(__file__).parent.parent.parent / "data"
 DB_DIR.mkdir(exist_ok=True)
 
+def build_database_url() -> str:
+    """Собирает URL БД из настроек"""
+    if settings.DATABASE_URL:
+        return settings.DATABASE_URL
+    if settings.DB_BACKEND == "postgres":
+        return (
+            f"postgresql+asyncpg://{settings.DB_USER}:{settings.DB_PASSWORD}"
+            f"@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
+        )
+    return f"sqlite+aiosqlite:///{DB_DIR}/trustytrade.db"
+
 # URL для подключения к БД
-DATABASE_URL = f"sqlite+aiosqlite:///{DB_DIR}/trustytrade.db"
-
-# Создаем асинхронный движок SQLAlchemy
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=True,
-    connect_args={"check_same_thread": False}  # Нужно для SQLite
-)
-
-# Создаем фабрику асинхронных сессий
-AsyncSessionLocal = sessionmaker(
-    engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autocommit=False,
-    autoflush=False,
-)
+DATABASE_URL = build_database_url()
+
+def build_read_database_url() -> Optional[str]:
+    """URL движка чтения или None, если чтения идут через основной движок"""
+    if settings.DATABASE_READ_URL:
+        return settings.DATABASE_READ_URL
+    url = make_url(DATABASE_URL)
+    profile = settings.DB_PROFILE or settings.ENV
+    # Отдельный пул к тому же файлу SQLite полезен только в WAL (профиль
+    # production): без него читатели и писатель блокируют друг друга
+    if (
+        settings.DB_READ_SPLIT
+        and profile == "production"
+        and url.get_backend_name() == "sqlite"
+        and url.database not in (None, "", ":memory:")
+    ):
+        return DATABASE_URL
+    return None
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Применяет PRAGMA к каждому новому соединению SQLite"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT)}")
+    cursor.execute(f"PRAGMA cache_size={int(settings.SQLITE_CACHE_SIZE)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.close()
+
+def _set_sqlite_query_only(dbapi_connection, connection_record):
+    """Запрещает запись через соединения движка чтения"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+def create_engine_for_profile(url: str = None, profile: str = None, read_only: bool = False) -> AsyncEngine:
+    """
+    Создает асинхронный движок SQLAlchemy для профиля
+
+    development - настройки по умолчанию и логирование всех запросов;
+    production - без логирования, пул соединений, а для SQLite еще
+    WAL и PRAGMA, чтобы читатели не ждали писателей.
+    read_only - движок чтения (реплика): свой размер пула, имя replica
+    в логах и метриках, для SQLite - query_only.
+    """
+    url = url or DATABASE_URL
+    profile = profile or settings.DB_PROFILE or settings.ENV
+    is_sqlite = make_url(url).get_backend_name() == "sqlite"
+
+    options = {}
+    if is_sqlite:
+        options["connect_args"] = {"check_same_thread": False}  # Нужно для SQLite
+    if read_only:
+        options["logging_name"] = "replica"
+
+    if profile != "production":
+        return create_async_engine(url, echo=True, **options)
+
+    options.update(
+        echo=False,
+        pool_size=settings.DB_READ_POOL_SIZE if read_only else settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+    if is_sqlite:
+        # Для файловой SQLite aiosqlite по умолчанию использует NullPool
+        # и открывает новое соединение (и поток) на каждую сессию
+        options["poolclass"] = pool.AsyncAdaptedQueuePool
+    else:
+        options["pool_pre_ping"] = True
+
+    engine = create_async_engine(url, **options)
+    if is_sqlite:
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+        if read_only:
+            event.listen(engine.sync_engine, "connect", _set_sqlite_query_only)
+    return engine
+
+# Движок и фабрика сессий создаются при первом обращении, а не при импорте,
+# чтобы холодный старт не платил за то, что может не понадобиться
+_engine: Optional[AsyncEngine] = None
+_session_factory: Optional[sessionmaker] = None
+_read_engine: Optional[AsyncEngine] = None
+_read_session_factory: Optional[sessionmaker] = None
+_engine_hooks: List[Callable[[AsyncEngine], None]] = []
+
+def on_engine_created(hook: Callable[[AsyncEngine], None]) -> None:
+    """Регистрирует функцию, вызываемую для каждого движка (основного и чтения) при его создании"""
+    _engine_hooks.append(hook)
+    if _engine is not None:
+        hook(_engine)
+    if _read_engine is not None and _read_engine is not _engine:
+        hook(_read_engine)
+
+def get_engine() -> AsyncEngine:
+    """Основной асинхронный движок SQLAlchemy"""
+    global _engine
+    if _engine is None:
+        _engine = create_engine_for_profile()
+        for hook in _engine_hooks:
+            hook(_engine)
+    return _engine
+
+def get_sessionmaker() -> sessionmaker:
+    """Фабрика асинхронных сессий основного движка"""
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = sessionmaker(
+            get_engine(),
+            class_=AsyncSession,
+            expire_on_commit=False,
+            autocommit=False,
+            autoflush=False,
+        )
+    return _session_factory
+
+def new_session() -> AsyncSession:
+    """Новая сессия основного движка"""
+    return get_sessionmaker()()
+
+def get_read_engine() -> AsyncEngine:
+    """Движок чтения; если реплики нет - основной движок"""
+    global _read_engine
+    if _read_engine is None:
+        url = build_read_database_url()
+        if url is None:
+            _read_engine = get_engine()
+        else:
+            _read_engine = create_engine_for_profile(url, read_only=True)
+            for hook in _engine_hooks:
+                hook(_read_engine)
+    return _read_engine
+
+def has_read_replica() -> bool:
+    """Идут ли чтения через отдельный движок"""
+    return get_read_engine() is not get_engine()
+
+def get_read_sessionmaker() -> sessionmaker:
+    """Фабрика сессий движка чтения"""
+    global _read_session_factory
+    if not has_read_replica():
+        return get_sessionmaker()
+    if _read_session_factory is None:
+        _read_session_factory = sessionmaker(
+            get_read_engine(),
+            class_=AsyncSession,
+            expire_on_commit=False,
+            autocommit=False,
+            autoflush=False,
+        )
+    return _read_session_factory
+
+def new_read_session() -> AsyncSession:
+    """Новая сессия движка чтения (только для запросов без записи)"""
+    return get_read_sessionmaker()()
+
+def __getattr__(name: str):
+    # Прежние имена модуля: engine и AsyncSessionLocal
+    if name == "engine":
+        return get_engine()
+    if name == "AsyncSessionLocal":
+        return get_sessionmaker()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+async def acquire_connection(session: AsyncSession) -> None:
+    """Берет соединение сразу, чтобы измерить ожидание свободного соединения в пуле"""
+    started = time.perf_counter()
+    await session.connection()
+    DB_CONNECTION_WAIT.observe(time.perf_counter() - started)
 
 async def get_db() -> AsyncSession:
     """Функция-генератор для получения асинхронной сессии БД"""
-    async with AsyncSessionLocal() as session:
+    async with new_session() as session:
         try:
+            await acquire_connection(session)
             yield session
         finally:
-            await session.close() 
\ No newline at end of file
+            await session.close()
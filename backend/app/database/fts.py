@@ -0,0 +1,94 @@
+import re
+from typing import List
+
+from sqlalchemy import and_, column, false, or_, table, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from ..models.account import Account
+
+# Полнотекстовый индекс по игре и описанию аккаунта (external content FTS5).
+# Таблица хранит только индекс, сами данные остаются в accounts.
+ACCOUNTS_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS accounts_fts USING fts5(
+        game,
+        description,
+        content='accounts',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    # Триггеры поддерживают индекс в актуальном состоянии при любых записях
+    # в accounts, в том числе из create_account, update_account и delete_account
+    """
+    CREATE TRIGGER IF NOT EXISTS accounts_fts_ai AFTER INSERT ON accounts BEGIN
+        INSERT INTO accounts_fts(rowid, game, description)
+        VALUES (new.id, new.game, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS accounts_fts_ad AFTER DELETE ON accounts BEGIN
+        INSERT INTO accounts_fts(accounts_fts, rowid, game, description)
+        VALUES ('delete', old.id, old.game, old.description);
+    END
+    """,
+    # Изменения цены и доступности индекс не затрагивают
+    """
+    CREATE TRIGGER IF NOT EXISTS accounts_fts_au AFTER UPDATE OF game, description ON accounts BEGIN
+        INSERT INTO accounts_fts(accounts_fts, rowid, game, description)
+        VALUES ('delete', old.id, old.game, old.description);
+        INSERT INTO accounts_fts(rowid, game, description)
+        VALUES (new.id, new.game, new.description);
+    END
+    """,
+]
+
+accounts_fts = table("accounts_fts", column("rowid"), column("rank"))
+
+
+async def ensure_accounts_fts(conn: AsyncConnection) -> None:
+    """Создает FTS5-индекс и триггеры, при первом создании индексирует существующие строки"""
+    if conn.dialect.name != "sqlite":
+        return
+
+    result = await conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'accounts_fts'")
+    )
+    exists = result.scalar() is not None
+
+    for statement in ACCOUNTS_FTS_DDL:
+        await conn.execute(text(statement))
+
+    if not exists:
+        await conn.execute(text("INSERT INTO accounts_fts(accounts_fts) VALUES ('rebuild')"))
+
+
+def _tokenize(q: str) -> List[str]:
+    """Разбивает пользовательский запрос на слова"""
+    return re.findall(r"\w+", q)
+
+
+def apply_text_search(query, q: str, dialect_name: str):
+    """
+    Добавляет к запросу по Account полнотекстовый поиск с ранжированием
+
+    Каждое слово запроса экранируется, поэтому синтаксис FTS5 из
+    пользовательского ввода не интерпретируется. Для СУБД без FTS5
+    используется поиск через ILIKE без ранжирования.
+    """
+    tokens = _tokenize(q)
+    if not tokens:
+        return query.where(false())
+
+    if dialect_name != "sqlite":
+        return query.where(and_(*[
+            or_(Account.game.ilike(f"%{token}%"), Account.description.ilike(f"%{token}%"))
+            for token in tokens
+        ]))
+
+    match = " ".join(f'"{token}"' for token in tokens)
+    return (
+        query.join(accounts_fts, accounts_fts.c.rowid == Account.id)
+        .where(text("accounts_fts MATCH :fts_query").bindparams(fts_query=match))
+        .order_by(accounts_fts.c.rank)
+    )
@@ -0,0 +1,73 @@
+from pathlib import Path
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection
+
+from ..models import Base
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent.parent
+
+# Ревизия, соответствующая схеме до появления миграций: БД, созданные
+# через create_all без alembic_version, помечаются ею перед обновлением
+BASELINE_REVISION = "0001_baseline"
+
+def alembic_config(connection: Connection = None):
+    """Конфигурация Alembic с абсолютными путями; connection - для запуска из приложения"""
+    from alembic.config import Config
+
+    config = Config(str(BACKEND_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_DIR / "migrations"))
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+def upgrade_schema(connection: Connection) -> None:
+    """
+    Приводит схему БД к последней ревизии
+
+    Пустая БД создается по моделям и помечается последней ревизией.
+    БД без alembic_version (созданная create_all) помечается базовой
+    ревизией и обновляется: ревизии проверяют, какие таблицы, колонки
+    и индексы уже есть, поэтому подходят и для БД, созданных любой
+    промежуточной версией приложения.
+    """
+    # Alembic импортируется только здесь, чтобы не замедлять холодный старт
+    from alembic import command
+    from alembic.runtime.migration import MigrationContext
+
+    config = alembic_config(connection)
+    if MigrationContext.configure(connection).get_current_revision() is None:
+        if not inspect(connection).has_table("users"):
+            Base.metadata.create_all(connection)
+            command.stamp(config, "head")
+            return
+        command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, "head")
+
+def _inspector():
+    """
+    Инспектор БД текущей миграции; None в offline-режиме (alembic --sql)
+
+    Без соединения схема считается ровно такой, какой ее оставила
+    предыдущая ревизия: проверки "есть ли" отвечают "нет".
+    """
+    from alembic import context, op
+
+    if context.is_offline_mode():
+        return None
+    return inspect(op.get_bind())
+
+def has_table(name: str) -> bool:
+    """Есть ли таблица в БД текущей миграции"""
+    inspector = _inspector()
+    return inspector is not None and inspector.has_table(name)
+
+def has_column(table: str, name: str) -> bool:
+    """Есть ли колонка в таблице БД текущей миграции"""
+    inspector = _inspector()
+    return inspector is not None and any(column["name"] == name for column in inspector.get_columns(table))
+
+def has_index(table: str, name: str) -> bool:
+    """Есть ли индекс в таблице БД текущей миграции"""
+    inspector = _inspector()
+    return inspector is not None and any(index["name"] == name for index in inspector.get_indexes(table))
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Set
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..models.account import Account
+from ..models.price_stats import GamePriceStats
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Транзакция могла записать updated_at до начала прохода, а зафиксироваться
+# после него; такие изменения подхватит следующий проход
+REFRESH_OVERLAP = timedelta(seconds=30)
+
+def summarize_prices(prices: "np.ndarray", edges: "np.ndarray") -> Dict:
+    """
+    Сводка по отсортированному массиву цен одной игры
+
+    Корзина i - цены в [edges[i], edges[i + 1]), последняя не ограничена
+    сверху. Так как цены отсортированы, границы корзин находятся бинарным
+    поиском, без прохода по всем ценам.
+    """
+    import numpy as np
+
+    p25, p50, p75 = np.percentile(prices, [25, 50, 75])
+    positions = np.searchsorted(prices, edges, side="left")
+    counts = np.diff(np.append(positions, len(prices)))
+    upper = list(edges[1:]) + [None]
+    return {
+        "count": int(len(prices)),
+        "min_price": float(prices[0]),
+        "max_price": float(prices[-1]),
+        "mean_price": float(prices.mean()),
+        "p25": float(p25),
+        "p50": float(p50),
+        "p75": float(p75),
+        "histogram": [
+            {"min": float(low), "max": None if high is None else float(high), "count": int(count)}
+            for low, high, count in zip(edges, upper, counts)
+        ],
+    }
+
+async def _changed_games(db: AsyncSession, since: Optional[datetime]) -> Set[str]:
+    """
+    Игры, сводку которых нужно пересчитать
+
+    Это игры объявлений, измененных после since, и игры, у которых число
+    доступных объявлений разошлось со сводкой: удаление не оставляет
+    updated_at. Без since - все игры.
+    """
+    # Те же условия, что и при расчете сводки, иначе игра с объявлением
+    # без цены пересчитывалась бы на каждом проходе
+    counts_result = await db.execute(
+        select(Account.game, func.count())
+        .where(Account.is_available == True, Account.game.isnot(None), Account.price.isnot(None))
+        .group_by(Account.game)
+    )
+    counts = dict(counts_result.all())
+    stored = dict((await db.execute(select(GamePriceStats.game, GamePriceStats.count))).all())
+    if since is None:
+        return set(counts) | set(stored)
+
+    games = {game for game in set(counts) | set(stored) if counts.get(game, 0) != stored.get(game)}
+    changed = await db.execute(
+        select(Account.game).where(Account.updated_at > since, Account.game.isnot(None)).distinct()
+    )
+    games.update(changed.scalars())
+    return games
+
+async def _refresh_games(db: AsyncSession, games: Sequence[str], edges: "np.ndarray") -> None:
+    """Пересчитывает сводку для пачки игр одним запросом цен"""
+    import numpy as np
+
+    result = await db.execute(
+        select(Account.game, Account.price)
+        .where(Account.game.in_(games), Account.is_available == True, Account.price.isnot(None))
+        .order_by(Account.game, Account.price)
+    )
+    rows = result.all()
+    prices = np.fromiter((row.price for row in rows), dtype=np.float64, count=len(rows))
+    # Строки упорядочены по игре: цены каждой игры - непрерывный отрезок
+    bounds = [0] + [i for i in range(1, len(rows)) if rows[i].game != rows[i - 1].game] + [len(rows)]
+    now = datetime.utcnow()
+    values: List[Dict] = []
+    for start, end in zip(bounds, bounds[1:]):
+        if start == end:
+            continue
+        values.append({
+            "game": rows[start].game,
+            "created_at": now,
+            "updated_at": now,
+            **summarize_prices(prices[start:end], edges),
+        })
+
+    # Игры без доступных объявлений из сводки удаляются
+    await db.execute(delete(GamePriceStats).where(GamePriceStats.game.in_(games)))
+    if values:
+        await db.execute(insert(GamePriceStats), values)
+
+async def refresh_price_stats(db: AsyncSession, since: Optional[datetime] = None) -> int:
+    """
+    Обновляет сводку цен для игр, изменившихся после since
+
+    Каждая пачка из PRICE_STATS_BATCH_GAMES игр пересчитывается и
+    фиксируется отдельно. Возвращает число пересчитанных игр.
+    """
+    # NumPy импортируется при первом пересчете, а не при старте приложения
+    import numpy as np
+
+    games = sorted(await _changed_games(db, since))
+    edges = np.asarray(sorted(settings.PRICE_STATS_BUCKETS), dtype=np.float64)
+    batch = settings.PRICE_STATS_BATCH_GAMES
+    for start in range(0, len(games), batch):
+        await _refresh_games(db, games[start:start + batch], edges)
+        await db.commit()
+        # Между пачками отдаем управление, чтобы не держать блокировку БД подряд
+        await asyncio.sleep(0)
+    await db.commit()
+    return len(games)
+
+async def run_price_stats_refresher() -> None:
+    """Периодически обновляет сводку цен; первый проход после старта - полный"""
+    from .config import new_session
+
+    since = None
+    while True:
+        started = datetime.utcnow()
+        try:
+            async with new_session() as db:
+                refreshed = await refresh_price_stats(db, since)
+            since = started - REFRESH_OVERLAP
+            if refreshed:
+                logger.info("Refreshed price stats for %d games", refreshed)
+        except Exception:
+            logger.exception("Price stats refresh failed")
+        await asyncio.sleep(settings.PRICE_STATS_REFRESH_INTERVAL)
+
+async def main():
+    """Полный пересчет сводки цен из командной строки"""
+    from .config import new_session
+
+    async with new_session() as db:
+        games = await refresh_price_stats(db)
+    print(f"Сводка цен пересчитана для {games} игр")
+
+if __name__ == "__main__":
+    asyncio.run(main())
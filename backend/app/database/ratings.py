@@ -0,0 +1,98 @@
+import asyncio
+
+from sqlalchemy import bindparam, case, func, select, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.deal import ArchivedDeal, ArchivedReview, Deal, Review
+from ..models.user import User
+
+# Размер пачки при массовом пересчете
+REBUILD_BATCH_SIZE = 500
+
+async def apply_rating_delta(db: AsyncSession, seller_id: int, count_delta: int, sum_delta: int) -> None:
+    """
+    Инкрементально обновляет агрегаты рейтинга продавца
+
+    Выполняется одним UPDATE в текущей транзакции, поэтому агрегаты
+    фиксируются вместе с записью отзыва. Правые части выражений в UPDATE
+    ссылаются на значения до изменения.
+    """
+    new_count = User.review_count + count_delta
+    new_sum = User.rating_sum + sum_delta
+    await db.execute(
+        update(User)
+        .where(User.id == seller_id)
+        .values(
+            review_count=new_count,
+            rating_sum=new_sum,
+            rating=case((new_count > 0, new_sum * 1.0 / new_count), else_=0.0),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+async def rebuild_seller_ratings(db: AsyncSession) -> int:
+    """
+    Пересчитывает агрегаты рейтинга всех продавцов по таблице отзывов
+
+    Учитываются и отзывы архивных сделок. Возвращает количество
+    продавцов, у которых есть отзывы.
+    """
+    reviews = union_all(
+        select(Deal.seller_id, Review.rating).join(Review, Review.deal_id == Deal.id),
+        select(ArchivedDeal.seller_id, ArchivedReview.rating)
+        .join(ArchivedReview, ArchivedReview.deal_id == ArchivedDeal.id),
+    ).subquery()
+    stats_query = (
+        select(
+            reviews.c.seller_id,
+            func.count().label("review_count"),
+            func.sum(reviews.c.rating).label("rating_sum"),
+        )
+        .group_by(reviews.c.seller_id)
+    )
+    result = await db.execute(stats_query)
+    rows = [
+        {
+            "seller_id": row.seller_id,
+            "review_count": row.review_count,
+            "rating_sum": row.rating_sum,
+            "rating": row.rating_sum / row.review_count,
+        }
+        for row in result
+        if row.seller_id is not None
+    ]
+
+    # Обнуляем продавцов, у которых больше нет отзывов
+    reviewed_sellers = select(reviews.c.seller_id).where(reviews.c.seller_id.isnot(None))
+    await db.execute(
+        update(User)
+        .where(User.id.not_in(reviewed_sellers), User.review_count != 0)
+        .values(review_count=0, rating_sum=0, rating=0.0)
+        .execution_options(synchronize_session=False)
+    )
+
+    statement = (
+        update(User.__table__)
+        .where(User.__table__.c.id == bindparam("seller_id"))
+        .values(
+            review_count=bindparam("review_count"),
+            rating_sum=bindparam("rating_sum"),
+            rating=bindparam("rating"),
+        )
+    )
+    for start in range(0, len(rows), REBUILD_BATCH_SIZE):
+        await db.execute(statement, rows[start:start + REBUILD_BATCH_SIZE])
+
+    await db.commit()
+    return len(rows)
+
+async def main():
+    """Пересчет агрегатов рейтинга из командной строки"""
+    from .config import new_session
+
+    async with new_session() as db:
+        sellers = await rebuild_seller_ratings(db)
+    print(f"Рейтинги пересчитаны для {sellers} продавцов")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..utils.metrics import DB_READ_SESSIONS
+from ..utils.telegram_auth import client_key
+from .config import acquire_connection, get_read_engine, has_read_replica, new_read_session, new_session
+
+# Методы, которые не меняют данные
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+class WriteStickiness:
+    """
+    Окна read-your-writes: после записи чтения клиента идут в основную БД
+
+    Ключ - пользователь Telegram, без авторизации (разработка) - IP
+    клиента. Окна хранятся в памяти процесса (приложение работает одним
+    процессом uvicorn) и имеют одинаковую длину, поэтому в начале
+    словаря всегда самые ранние.
+    """
+
+    def __init__(self, window: float, maxsize: int):
+        self.window = window
+        self.maxsize = maxsize
+        self.last_write = float("-inf")
+        self._until: "OrderedDict[str, float]" = OrderedDict()
+
+    def mark(self, key: Optional[str]) -> None:
+        """Открывает окно для клиента, выполнившего запись"""
+        now = time.monotonic()
+        self.last_write = now
+        if key is None:
+            return
+        self._until[key] = now + self.window
+        self._until.move_to_end(key)
+        while self._until and (len(self._until) > self.maxsize or next(iter(self._until.values())) <= now):
+            self._until.popitem(last=False)
+
+    def active(self, key: Optional[str]) -> bool:
+        """Читает ли клиент сейчас из основной БД"""
+        if key is None:
+            return False
+        until = self._until.get(key)
+        return until is not None and until > time.monotonic()
+
+    def recent_write(self) -> bool:
+        """Была ли в пределах окна хоть одна запись"""
+        return time.monotonic() - self.last_write < self.window
+
+    def clear(self) -> None:
+        self._until.clear()
+        self.last_write = float("-inf")
+
+    def stats(self) -> Dict:
+        return {"keys": len(self._until)}
+
+write_stickiness = WriteStickiness(settings.READ_YOUR_WRITES_WINDOW, settings.READ_YOUR_WRITES_MAX_KEYS)
+
+def sticky_key(request: Request) -> Optional[str]:
+    """Ключ окна read-your-writes для запроса"""
+    return client_key(request)
+
+async def read_your_writes_middleware(request: Request, call_next):
+    """После успешного изменяющего запроса открывает клиенту окно чтения из основной БД"""
+    response = await call_next(request)
+    if request.method not in READ_METHODS and response.status_code < 400:
+        write_stickiness.mark(sticky_key(request))
+    return response
+
+async def get_read_db(request: Request) -> AsyncSession:
+    """
+    Сессия для обработчиков, которые только читают
+
+    Идет через движок чтения, а в окне read-your-writes клиента - через
+    основной, чтобы он сразу видел свои изменения.
+    """
+    primary = not has_read_replica() or write_stickiness.active(sticky_key(request))
+    DB_READ_SESSIONS.labels("primary" if primary else "replica").inc()
+    async with (new_session() if primary else new_read_session()) as session:
+        try:
+            await acquire_connection(session)
+            yield session
+        finally:
+            await session.close()
+
+def replica_may_lag(session: AsyncSession) -> bool:
+    """
+    Может ли сессия не видеть недавнюю запись
+
+    Так бывает только с внешней репликой (DATABASE_READ_URL) в пределах
+    окна после записи. Такие ответы не кладутся в общий кэш: иначе он
+    хранил бы устаревшие данные уже после инвалидации.
+    """
+    return (
+        bool(settings.DATABASE_READ_URL)
+        and has_read_replica()
+        and session.bind is get_read_engine()
+        and write_stickiness.recent_write()
+    )
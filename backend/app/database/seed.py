@@ -1,8 +1,13 @@
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..models.account import Account
 
 async def seed_accounts(db: AsyncSession):
-    """Заполняем базу тестовыми аккаунтами"""
+    """Заполняем базу тестовыми аккаунтами, если она пуста"""
+    existing = await db.execute(select(Account.id).limit(1))
+    if existing.first() is not None:
+        return
+
     test_accounts = [
         Account(
             user_id=1,
@@ -1,10 +1,26 @@
+import asyncio
+import time
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import users, accounts, deals, auth
-from .database.config import engine, get_db
-from .models.base import Base
+from .database.config import get_engine, new_session, on_engine_created
+from .database.routing import read_your_writes_middleware
+from .database.migrations import upgrade_schema
 from .database.seed import seed_accounts
+from .database.fts import ensure_accounts_fts
+from .database.price_stats import run_price_stats_refresher
+from .database.archive import run_deal_archiver
 from .utils.telegram_auth import verify_telegram_auth
+from .utils.metrics import (
+    AUTH_LATENCY, instrument_engine, metrics_middleware, metrics_response
+)
+from .utils.query_counter import install_query_counter, query_counter_middleware
+from .utils.notifications import notification_sender, notify_outbox_event
+from .utils.outbox import outbox_dispatcher
+from .utils.idempotency import REPLAYED_HEADER, idempotency_middleware, run_idempotency_sweeper
+from .utils.broadcaster import listing_broadcaster
+from .utils.streaming import StreamBypassMiddleware
+from .config import settings
 
 app = FastAPI(
     title="TrustyTrade API",
@@ -23,6 +39,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Cache", REPLAYED_HEADER],
 )
 
 # Настройка CORS для Telegram Mini App
@@ -32,6 +49,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Cache", REPLAYED_HEADER],
 )
 
 # Добавляем CORS middleware
@@ -41,25 +59,45 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Cache", REPLAYED_HEADER],
 )
 
+# HTTP-middleware регистрируются через StreamBypassMiddleware, чтобы
+# SSE-потоки их не проходили (см. utils/streaming.py)
+def http_middleware(dispatch):
+    app.add_middleware(StreamBypassMiddleware, dispatch=dispatch)
+    return dispatch
+
+# Idempotency-Key для POST-запросов; добавляется до авторизации, чтобы
+# выполняться после нее и видеть пользователя в request.state
+http_middleware(idempotency_middleware)
+
+# Окно read-your-writes после изменяющих запросов; как и idempotency,
+# выполняется после авторизации, чтобы знать пользователя
+http_middleware(read_your_writes_middleware)
+
 # Добавляем middleware для аутентификации Telegram
-@app.middleware("http")
+@http_middleware
 async def telegram_auth_middleware(request: Request, call_next):
     if request.method == "OPTIONS":
         response = await call_next(request)
         return response
         
-    await verify_telegram_auth(request)
+    started = time.perf_counter()
+    try:
+        await verify_telegram_auth(request)
+    finally:
+        AUTH_LATENCY.observe(time.perf_counter() - started)
     response = await call_next(request)
     return response
 
-@app.on_event("startup")
-async def startup_event():
-    """Выполняется при запуске приложения"""
-    async for db in get_db():
-        await seed_accounts(db)
-        break
+# Счетчик SQL-запросов на запрос (заголовки X-DB-* при DEBUG_SQL)
+http_middleware(query_counter_middleware)
+on_engine_created(install_query_counter)
+
+# Метрики запросов; middleware добавляется последним, чтобы учитывать и время авторизации
+http_middleware(metrics_middleware)
+on_engine_created(instrument_engine)
 
 # Подключаем роутеры
 app.include_router(auth.router, prefix="/api/v1", tags=["auth"])
@@ -69,9 +107,75 @@ app.include_router(deals.router, prefix="/api/v1", tags=["deals"])
 
 @app.on_event("startup")
 async def startup():
-    """Создаем таблицы при запуске приложения"""
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    """Обновляем схему БД (миграции Alembic) при запуске приложения, в разработке - тестовые данные"""
+    async with get_engine().begin() as conn:
+        await conn.run_sync(upgrade_schema)
+        await ensure_accounts_fts(conn)
+    if settings.ENV == "development":
+        async with new_session() as db:
+            await seed_accounts(db)
+
+@app.on_event("startup")
+async def start_notifications():
+    """Запускаем отправку уведомлений (продолжает неотправленное после рестарта)"""
+    if settings.NOTIFY_ENABLED and settings.BOT_TOKEN:
+        notification_sender.start()
+
+@app.on_event("shutdown")
+async def stop_notifications():
+    await notification_sender.stop()
+
+# Потребители событий сделок и отзывов из outbox
+outbox_dispatcher.register("notifications", notify_outbox_event, on_commit=notification_sender.wake)
+
+@app.on_event("startup")
+async def start_outbox_dispatcher():
+    """Запускаем доставку событий outbox (с позиций, сохраненных до рестарта)"""
+    if settings.OUTBOX_ENABLED:
+        outbox_dispatcher.start()
+
+@app.on_event("shutdown")
+async def stop_outbox_dispatcher():
+    await outbox_dispatcher.stop()
+
+@app.on_event("startup")
+async def start_idempotency_sweeper():
+    """Периодическая очистка истекших ключей идемпотентности"""
+    app.state.idempotency_sweeper = asyncio.create_task(run_idempotency_sweeper())
+
+@app.on_event("shutdown")
+async def stop_idempotency_sweeper():
+    app.state.idempotency_sweeper.cancel()
+
+@app.on_event("startup")
+async def start_price_stats_refresher():
+    """Фоновое обновление сводки цен по играм (GET /accounts/stats)"""
+    app.state.price_stats_refresher = asyncio.create_task(run_price_stats_refresher())
+
+@app.on_event("shutdown")
+async def stop_price_stats_refresher():
+    app.state.price_stats_refresher.cancel()
+
+@app.on_event("startup")
+async def start_deal_archiver():
+    """Периодический перенос старых завершенных сделок в архив"""
+    if settings.DEAL_ARCHIVE_ENABLED:
+        app.state.deal_archiver = asyncio.create_task(run_deal_archiver())
+
+@app.on_event("shutdown")
+async def stop_deal_archiver():
+    if getattr(app.state, "deal_archiver", None) is not None:
+        app.state.deal_archiver.cancel()
+
+@app.on_event("shutdown")
+async def close_listing_streams():
+    """Останавливаем heartbeat и завершаем оставшиеся SSE-потоки"""
+    listing_broadcaster.close()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики в формате Prometheus"""
+    return metrics_response()
 
 @app.get("/")
 async def root():
@@ -3,7 +3,11 @@
 from .base import Base, BaseModel
 from .user import User
 from .account import Account
-from .deal import Deal, Review
+from .deal import Deal, Review, ArchivedDeal, ArchivedReview
+from .notification import Notification
+from .idempotency import IdempotencyKey
+from .outbox import OutboxEvent, OutboxCursor
+from .price_stats import GamePriceStats
 
 __all__ = [
     "Base",
@@ -11,5 +15,12 @@ __all__ = [
     "User",
     "Account",
     "Deal",
-    "Review"
+    "Review",
+    "ArchivedDeal",
+    "ArchivedReview",
+    "Notification",
+    "IdempotencyKey",
+    "OutboxEvent",
+    "OutboxCursor",
+    "GamePriceStats"
 ] 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Boolean
+from sqlalchemy import Column, Index, Integer, String, Float, ForeignKey, Boolean
 from sqlalchemy.orm import relationship
 
 from .base import BaseModel
@@ -6,9 +6,17 @@ from .base import BaseModel
 class Account(BaseModel):
     """Модель игрового аккаунта"""
     __tablename__ = "accounts"
+    __table_args__ = (
+        # Keyset-пагинация по (created_at, id)
+        Index("ix_accounts_created_at_id", "created_at", "id"),
+        # Фасетный поиск: фильтр по игре, доступности и диапазону цены
+        Index("ix_accounts_game_available_price", "game", "is_available", "price"),
+        # Инкрементальное обновление сводки цен: игры, измененные с прошлого прохода
+        Index("ix_accounts_updated_at", "updated_at"),
+    )
 
-    user_id = Column(Integer, ForeignKey("users.id"))
-    game = Column(String, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    game = Column(String)
     description = Column(String)
     price = Column(Float)
     is_available = Column(Boolean, default=True)
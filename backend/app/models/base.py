@@ -10,4 +10,8 @@ class BaseModel(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow) 
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def as_dict(self) -> dict:
+        """Значения колонок без обращения к связям (без ленивых запросов)"""
+        return {column.key: getattr(self, column.key) for column in self.__table__.columns} 
\ No newline at end of file
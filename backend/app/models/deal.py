@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum as SQLAlchemyEnum
+from sqlalchemy import Column, DateTime, Index, Integer, String, ForeignKey, Enum as SQLAlchemyEnum
 from sqlalchemy.orm import relationship
 
 from .base import BaseModel
@@ -7,11 +7,20 @@ from ..schemas.deal import DealStatus
 class Deal(BaseModel):
     """Модель сделки"""
     __tablename__ = "deals"
+    __table_args__ = (
+        # Keyset-пагинация по (created_at, id)
+        Index("ix_deals_created_at_id", "created_at", "id"),
+        # Фильтр по статусу в списке сделок (с тем же порядком) и выборка
+        # завершенных сделок для архивации
+        Index("ix_deals_status_created_at_id", "status", "created_at", "id"),
+    )
 
     seller_id = Column(Integer, ForeignKey("users.id"))
     buyer_id = Column(Integer, ForeignKey("users.id"))
     account_id = Column(Integer, ForeignKey("accounts.id"))
     status = Column(SQLAlchemyEnum(DealStatus), default=DealStatus.PENDING)
+    # Версия для оптимистичной блокировки, растет при каждой смене статуса
+    version = Column(Integer, default=1, server_default="1", nullable=False)
 
     # Связи с другими таблицами
     seller = relationship("User", foreign_keys=[seller_id], back_populates="sales")
@@ -28,4 +37,40 @@ class Review(BaseModel):
     comment = Column(String, nullable=True)
 
     # Связь с таблицей сделок
-    deal = relationship("Deal", back_populates="review") 
\ No newline at end of file
+    deal = relationship("Deal", back_populates="review")
+
+class ArchivedDeal(BaseModel):
+    """
+    Завершенная или отмененная сделка, перенесенная из deals
+
+    Строки переносятся с исходными id и временем создания, поэтому
+    сделка в архиве доступна по тому же id. Связи те же, что у Deal.
+    """
+    __tablename__ = "deals_archive"
+    __table_args__ = (
+        Index("ix_deals_archive_created_at_id", "created_at", "id"),
+        Index("ix_deals_archive_status_created_at_id", "status", "created_at", "id"),
+    )
+
+    seller_id = Column(Integer, ForeignKey("users.id"), index=True)
+    buyer_id = Column(Integer, ForeignKey("users.id"), index=True)
+    account_id = Column(Integer, ForeignKey("accounts.id"))
+    status = Column(SQLAlchemyEnum(DealStatus), nullable=False)
+    version = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, nullable=False)
+
+    seller = relationship("User", foreign_keys=[seller_id])
+    buyer = relationship("User", foreign_keys=[buyer_id])
+    account = relationship("Account")
+    review = relationship("ArchivedReview", back_populates="deal", uselist=False)
+
+class ArchivedReview(BaseModel):
+    """Отзыв архивной сделки"""
+    __tablename__ = "reviews_archive"
+
+    deal_id = Column(Integer, ForeignKey("deals_archive.id"), unique=True)
+    rating = Column(Integer)
+    comment = Column(String, nullable=True)
+    archived_at = Column(DateTime, nullable=False)
+
+    deal = relationship("ArchivedDeal", back_populates="review")
@@ -0,0 +1,19 @@
+from sqlalchemy import JSON, Column, DateTime, Integer, String, Text
+
+from .base import BaseModel
+
+class IdempotencyKey(BaseModel):
+    """Сохраненный ответ на POST-запрос с заголовком Idempotency-Key"""
+    __tablename__ = "idempotency_keys"
+
+    # Ключ клиента вместе с методом, путем и пользователем
+    key = Column(String, unique=True, nullable=False)
+    # SHA-256 тела запроса: тот же ключ с другим телом - ошибка клиента
+    request_hash = Column(String, nullable=False)
+    # NULL, пока первый запрос еще выполняется
+    status_code = Column(Integer, nullable=True)
+    body = Column(Text, nullable=True)
+    media_type = Column(String, nullable=True)
+    # Заголовки ответа парами [имя, значение], с повторами (Set-Cookie)
+    headers = Column(JSON, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text
+
+from .base import BaseModel
+
+class Notification(BaseModel):
+    """Исходящее сообщение бота, ожидающее отправки в Telegram"""
+    __tablename__ = "notifications"
+    __table_args__ = (
+        # Выборка готовых к отправке сообщений
+        Index("ix_notifications_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    chat_id = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    # pending, sending (захвачено отправщиком), sent или failed
+    status = Column(String, default="pending", nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    # Захват на время отправки: сообщение отправляет один процесс, пока
+    # захват не истек; истекший захват упавшего процесса забирает другой
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(DateTime, nullable=True)
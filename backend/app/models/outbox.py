@@ -0,0 +1,24 @@
+from sqlalchemy import JSON, Column, DateTime, Integer, String
+
+from .base import BaseModel
+
+class OutboxEvent(BaseModel):
+    """Событие сделки или отзыва, записанное в одной транзакции с изменением"""
+    __tablename__ = "outbox"
+    # AUTOINCREMENT: SQLite не должна повторно выдавать id после очистки
+    # таблицы, иначе курсоры потребителей пропустят новые события
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    topic = Column(String, nullable=False)
+    aggregate_id = Column(Integer, nullable=False)
+    payload = Column(JSON, nullable=False)
+
+class OutboxCursor(BaseModel):
+    """Позиция потребителя outbox: id последнего доставленного события"""
+    __tablename__ = "outbox_cursors"
+
+    consumer = Column(String, unique=True, nullable=False)
+    position = Column(Integer, default=0, nullable=False)
+    # Аренда: потребителя обрабатывает один процесс, пока она не истекла
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(DateTime, nullable=True)
@@ -0,0 +1,18 @@
+from sqlalchemy import JSON, Column, Float, Integer, String
+
+from .base import BaseModel
+
+class GamePriceStats(BaseModel):
+    """Сводка цен доступных аккаунтов по игре (обновляется фоновой задачей)"""
+    __tablename__ = "game_price_stats"
+
+    game = Column(String, unique=True, nullable=False)
+    count = Column(Integer, nullable=False)
+    min_price = Column(Float, nullable=False)
+    max_price = Column(Float, nullable=False)
+    mean_price = Column(Float, nullable=False)
+    p25 = Column(Float, nullable=False)
+    p50 = Column(Float, nullable=False)
+    p75 = Column(Float, nullable=False)
+    # Корзины PRICE_STATS_BUCKETS: [{"min", "max", "count"}], у последней max = null
+    histogram = Column(JSON, nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import Column, Index, Integer, String, Float
 from sqlalchemy.orm import relationship
 
 from .base import BaseModel
@@ -6,10 +6,18 @@ from .base import BaseModel
 class User(BaseModel):
     """Модель пользователя"""
     __tablename__ = "users"
+    __table_args__ = (
+        # Keyset-пагинация по (created_at, id)
+        Index("ix_users_created_at_id", "created_at", "id"),
+    )
 
     telegram_id = Column(Integer, unique=True, index=True)
     username = Column(String, index=True)
+    # Средний рейтинг продавца, вычисляется из rating_sum / review_count
     rating = Column(Float, default=0.0)
+    # Агрегаты отзывов, обновляются в одной транзакции с записью отзыва
+    review_count = Column(Integer, default=0, server_default="0", nullable=False)
+    rating_sum = Column(Integer, default=0, server_default="0", nullable=False)
 
     # Связи с другими таблицами
     accounts = relationship("Account", back_populates="owner")
@@ -1,19 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from collections import Counter
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List
+from sqlalchemy import select, func, insert
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
 from ..database.config import get_db
+from ..database.routing import get_read_db, replica_may_lag
+from ..database.fts import apply_text_search
 from ..models.account import Account
-from ..schemas.account import AccountCreate, AccountUpdate, Account as AccountSchema
+from ..models.user import User
+from ..models.price_stats import GamePriceStats
+from ..schemas.account import (
+    AccountCreate, AccountUpdate, Account as AccountSchema,
+    AccountSearchResult, AccountSort, AccountBulkResult, AccountPriceStats
+)
+from ..utils.pagination import paginate, next_cursor, NEXT_CURSOR_HEADER
+from ..utils.export import ExportFormat, export_response
+from ..utils.response_cache import (
+    response_cache, cache_key, account_tag, ACCOUNTS_LIST_TAG, ACCOUNTS_SEARCH_TAG
+)
+from ..utils.broadcaster import listing_broadcaster, publish_listing, StreamFull
+from ..utils.telegram_auth import verify_telegram_auth
 
 router = APIRouter()
 
+# Размер пачки для многострочной вставки при массовом импорте
+BULK_CHUNK_SIZE = 500
+
 @router.post("/accounts/", response_model=AccountSchema)
 async def create_account(account: AccountCreate, db: AsyncSession = Depends(get_db)):
     """Создание нового аккаунта"""
     # Проверяем существование пользователя
-    from ..models.user import User
     query = select(User).where(User.id == account.user_id)
     result = await db.execute(query)
     user = result.scalar_one_or_none()
@@ -29,30 +50,313 @@ async def create_account(account: AccountCreate, db: AsyncSession = Depends(get_
     )
     db.add(db_account)
     await db.commit()
+    response_cache.invalidate(ACCOUNTS_LIST_TAG)
     await db.refresh(db_account)
+    publish_listing("created", db_account.id, db_account.game, db_account.as_dict())
     return db_account
 
+async def _iter_bulk_rows(request: Request) -> AsyncIterator[Tuple[int, bytes]]:
+    """
+    Построчно читает тело запроса массового импорта
+
+    NDJSON (application/x-ndjson) читается потоком без буферизации всего
+    тела, JSON-массив разбирается целиком. Возвращает пары (номер строки,
+    сырые данные строки или уже разобранный объект).
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" not in content_type and "jsonlines" not in content_type:
+        try:
+            rows = json.loads(await request.body())
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Expected a JSON array")
+        for index, row in enumerate(rows):
+            yield index, row
+        return
+
+    index = 0
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield index, line
+                index += 1
+    if buffer.strip():
+        yield index, buffer
+
+@router.post("/accounts/bulk", response_model=AccountBulkResult)
+async def create_accounts_bulk(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Массовое создание аккаунтов
+
+    Принимает JSON-массив или NDJSON-поток объектов AccountCreate.
+    Каждый user_id проверяется один раз, аккаунты вставляются пачками
+    по BULK_CHUNK_SIZE строк в одной транзакции. Ошибочные строки
+    возвращаются в errors и не мешают вставке остальных.
+    """
+    known_users: Dict[int, bool] = {}
+    inserted_games: Counter = Counter()
+    pending: List[Tuple[int, AccountCreate]] = []
+    errors = []
+    inserted = 0
+
+    async def flush():
+        nonlocal inserted
+        unknown_ids = {account.user_id for _, account in pending} - known_users.keys()
+        if unknown_ids:
+            result = await db.execute(select(User.id).where(User.id.in_(unknown_ids)))
+            found = set(result.scalars().all())
+            for user_id in unknown_ids:
+                known_users[user_id] = user_id in found
+
+        rows = []
+        for index, account in pending:
+            if known_users[account.user_id]:
+                rows.append(account.dict())
+            else:
+                errors.append({"row": index, "detail": "User not found"})
+        if rows:
+            await db.execute(insert(Account), rows)
+            inserted += len(rows)
+            inserted_games.update(row["game"] for row in rows)
+        pending.clear()
+
+    async for index, raw in _iter_bulk_rows(request):
+        try:
+            data = json.loads(raw) if isinstance(raw, bytes) else raw
+            pending.append((index, AccountCreate.parse_obj(data)))
+        except ValueError as e:
+            # ValidationError тоже наследуется от ValueError
+            if isinstance(e, ValidationError):
+                detail = [{"loc": list(err["loc"]), "msg": err["msg"]} for err in e.errors()]
+            else:
+                detail = "Invalid JSON"
+            errors.append({"row": index, "detail": detail})
+            continue
+
+        if len(pending) >= BULK_CHUNK_SIZE:
+            await flush()
+
+    if pending:
+        await flush()
+    await db.commit()
+    if inserted:
+        response_cache.invalidate(ACCOUNTS_LIST_TAG)
+    # Идентификаторы multi-row INSERT не возвращает, поэтому в ленту уходит
+    # одно событие на игру с числом добавленных аккаунтов
+    for game, count in inserted_games.items():
+        listing_broadcaster.publish({"type": "bulk_created", "game": game, "count": count}, {game})
+
+    errors.sort(key=lambda error: error["row"])
+    return {"inserted": inserted, "errors": errors}
+
 @router.get("/accounts/", response_model=List[AccountSchema])
-async def read_accounts(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
-    """Получение списка аккаунтов"""
-    query = select(Account).offset(skip).limit(limit)
+async def read_accounts(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    q: Optional[str] = Query(None, max_length=200),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Получение списка аккаунтов
+
+    Если передан cursor, используется keyset-пагинация, а курсор
+    следующей страницы возвращается в заголовке X-Next-Cursor.
+    Если передан q, выполняется полнотекстовый поиск по игре и описанию,
+    результаты упорядочены по релевантности и листаются через skip/limit.
+
+    Ответы кэшируются в памяти и отдаются со строгим ETag; при совпадении
+    If-None-Match возвращается 304.
+    """
+    key = cache_key(request)
+    entry = response_cache.get(key)
+    if entry is not None:
+        return entry.to_response(request, "HIT")
+
+    # Ответ реплики, которая могла отстать от записи, в кэш не попадет
+    generation = None if replica_may_lag(db) else response_cache.generation
+    headers = {}
+    tags = {ACCOUNTS_LIST_TAG}
+    if q:
+        query = apply_text_search(select(Account), q, db.bind.dialect.name)
+        result = await db.execute(query.offset(skip).limit(limit))
+        accounts = result.scalars().all()
+        tags.add(ACCOUNTS_SEARCH_TAG)
+    else:
+        query = paginate(select(Account), Account, skip, limit, cursor)
+        result = await db.execute(query)
+        accounts = result.scalars().all()
+        cursor = next_cursor(accounts, limit)
+        if cursor:
+            headers[NEXT_CURSOR_HEADER] = cursor
+
+    tags.update(account_tag(account.id) for account in accounts)
+    payload = [AccountSchema(**account.as_dict()) for account in accounts]
+    entry = response_cache.set(key, payload, tags, generation, headers)
+    return entry.to_response(request, "MISS")
+
+@router.get("/accounts/search", response_model=AccountSearchResult)
+async def search_accounts(
+    game: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    is_available: bool = True,
+    min_rating: Optional[float] = Query(None, ge=0, le=5),
+    sort: AccountSort = AccountSort.NEWEST,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Фасетный поиск аккаунтов
+
+    Фильтрует по игре, диапазону цены, доступности и минимальному рейтингу
+    продавца. В ответе, помимо страницы результатов, возвращается общее
+    число найденных аккаунтов и количество аккаунтов по каждой игре
+    (без учета фильтра по игре), чтобы UI мог построить фильтры сразу.
+    """
+    # accounts.game допускает NULL; такие объявления не попадают ни в
+    # фасеты, ни в выдачу (схемы ответа требуют игру)
+    filters = [Account.is_available == is_available, Account.game.isnot(None)]
+    if min_price is not None:
+        filters.append(Account.price >= min_price)
+    if max_price is not None:
+        filters.append(Account.price <= max_price)
+    if min_rating is not None:
+        filters.append(
+            Account.user_id.in_(select(User.id).where(User.rating >= min_rating))
+        )
+
+    # Фасеты по играм считаются по всем фильтрам, кроме самой игры
+    facet_query = (
+        select(Account.game, func.count().label("count"))
+        .where(*filters)
+        .group_by(Account.game)
+        .order_by(func.count().desc(), Account.game)
+    )
+    facet_result = await db.execute(facet_query)
+    facets = [{"game": row.game, "count": row.count} for row in facet_result]
+
+    if game is not None:
+        filters.append(Account.game == game)
+        total = next((facet["count"] for facet in facets if facet["game"] == game), 0)
+    else:
+        total = sum(facet["count"] for facet in facets)
+
+    order_by = {
+        AccountSort.PRICE_ASC: (Account.price.asc(), Account.id.asc()),
+        AccountSort.PRICE_DESC: (Account.price.desc(), Account.id.desc()),
+        AccountSort.NEWEST: (Account.created_at.desc(), Account.id.desc()),
+    }[sort]
+    query = select(Account).where(*filters).order_by(*order_by).offset(skip).limit(limit)
     result = await db.execute(query)
-    accounts = result.scalars().all()
-    return accounts
+
+    return {
+        "items": result.scalars().all(),
+        "total": total,
+        "facets": facets,
+    }
+
+@router.get("/accounts/stats", response_model=AccountPriceStats)
+async def read_price_stats(game: str = Query(..., min_length=1, max_length=100), db: AsyncSession = Depends(get_read_db)):
+    """
+    Сводка цен доступных аккаунтов игры
+
+    Количество, минимум, максимум, среднее, квартили и гистограмма по
+    корзинам PRICE_STATS_BUCKETS. Отдается из сводной таблицы, которую
+    фоново обновляет database/price_stats.py, поэтому может отставать от
+    каталога на PRICE_STATS_REFRESH_INTERVAL (время пересчета - updated_at).
+    """
+    result = await db.execute(select(GamePriceStats).where(GamePriceStats.game == game))
+    stats = result.scalar_one_or_none()
+    if stats is None:
+        return {"game": game, "count": 0, "histogram": []}
+    return {
+        "game": stats.game,
+        "count": stats.count,
+        "min": stats.min_price,
+        "max": stats.max_price,
+        "mean": stats.mean_price,
+        "p25": stats.p25,
+        "p50": stats.p50,
+        "p75": stats.p75,
+        "histogram": stats.histogram,
+        "updated_at": stats.updated_at,
+    }
+
+@router.get("/accounts/export")
+async def export_accounts(
+    format: ExportFormat = ExportFormat.NDJSON,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    game: Optional[str] = None,
+    is_available: Optional[bool] = None,
+):
+    """Потоковая выгрузка аккаунтов в NDJSON или CSV"""
+    query = select(*Account.__table__.columns)
+    if created_from is not None:
+        query = query.where(Account.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(Account.created_at < created_to)
+    if game is not None:
+        query = query.where(Account.game == game)
+    if is_available is not None:
+        query = query.where(Account.is_available == is_available)
+    return export_response(query.order_by(Account.id), format, "accounts")
+
+@router.get("/accounts/stream", dependencies=[Depends(verify_telegram_auth)])
+async def stream_accounts(game: Optional[List[str]] = Query(None)):
+    """
+    Лента изменений объявлений (Server-Sent Events)
+
+    Каждое событие listing - компактная дельта: created, updated, deleted
+    (id, game и изменившиеся game/price/is_available) или bulk_created
+    (game и count). game можно передать несколько раз, чтобы получать
+    события только по этим играм. Раз в STREAM_HEARTBEAT_INTERVAL
+    приходит комментарий-пинг. Клиент, не успевающий читать, получает
+    событие dropped и отключается; после переподключения каталог нужно
+    перечитать.
+    """
+    # HTTP-middleware поток не проходит, поэтому авторизация - зависимостью.
+    # get_db не используется: сессия не должна жить все время потока.
+    try:
+        subscriber = listing_broadcaster.subscribe(game)
+    except StreamFull:
+        raise HTTPException(status_code=503, detail="Too many stream subscribers", headers={"Retry-After": "30"})
+    return StreamingResponse(
+        listing_broadcaster.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.get("/accounts/{account_id}", response_model=AccountSchema)
-async def read_account(account_id: int, db: AsyncSession = Depends(get_db)):
-    """Получение информации об аккаунте по ID"""
+async def read_account(account_id: int, request: Request, db: AsyncSession = Depends(get_read_db)):
+    """Получение информации об аккаунте по ID (с кэшем и ETag)"""
+    key = cache_key(request)
+    entry = response_cache.get(key)
+    if entry is not None:
+        return entry.to_response(request, "HIT")
+
+    # Ответ реплики, которая могла отстать от записи, в кэш не попадет
+    generation = None if replica_may_lag(db) else response_cache.generation
     query = select(Account).where(Account.id == account_id)
     result = await db.execute(query)
     account = result.scalar_one_or_none()
     
     if account is None:
         raise HTTPException(status_code=404, detail="Account not found")
-    return account
+
+    payload = AccountSchema(**account.as_dict())
+    entry = response_cache.set(key, payload, {account_tag(account_id)}, generation)
+    return entry.to_response(request, "MISS")
 
 @router.get("/accounts/user/{user_id}", response_model=List[AccountSchema])
-async def read_user_accounts(user_id: int, db: AsyncSession = Depends(get_db)):
+async def read_user_accounts(user_id: int, db: AsyncSession = Depends(get_read_db)):
     """Получение списка аккаунтов пользователя"""
     query = select(Account).where(Account.user_id == user_id)
     result = await db.execute(query)
@@ -70,11 +374,22 @@ async def update_account(account_id: int, account: AccountUpdate, db: AsyncSessi
         raise HTTPException(status_code=404, detail="Account not found")
     
     # Обновляем только предоставленные поля
-    for field, value in account.dict(exclude_unset=True).items():
+    update_data = account.dict(exclude_unset=True)
+    previous_game = db_account.game
+    for field, value in update_data.items():
         setattr(db_account, field, value)
     
     await db.commit()
+    # Изменение текста может изменить состав результатов полнотекстового поиска
+    tags = [account_tag(account_id)]
+    if "game" in update_data or "description" in update_data:
+        tags.append(ACCOUNTS_SEARCH_TAG)
+    response_cache.invalidate(*tags)
     await db.refresh(db_account)
+    publish_listing(
+        "updated", account_id, db_account.game, update_data,
+        previous_game if previous_game != db_account.game else None
+    )
     return db_account
 
 @router.delete("/accounts/{account_id}")
@@ -89,4 +404,7 @@ async def delete_account(account_id: int, db: AsyncSession = Depends(get_db)):
     
     await db.delete(account)
     await db.commit()
+    # Удаление сдвигает все последующие offset-страницы
+    response_cache.invalidate(ACCOUNTS_LIST_TAG, account_tag(account_id))
+    publish_listing("deleted", account_id, account.game)
     return {"ok": True} 
\ No newline at end of file
@@ -1,98 +1,288 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List
+from sqlalchemy import select, union_all, update
+from sqlalchemy.orm import joinedload, selectinload
+from datetime import datetime
+from typing import List, Optional, Set
 
 from ..database.config import get_db
-from ..models.deal import Deal, Review
+from ..database.routing import get_read_db
+from ..database.ratings import apply_rating_delta
+from ..models.deal import ArchivedDeal, ArchivedReview, Deal, Review
 from ..models.account import Account
 from ..schemas.deal import (
     DealCreate, DealUpdate, Deal as DealSchema,
     ReviewCreate, ReviewUpdate, Review as ReviewSchema,
-    DealStatus
+    DealStatus, DealExpand, DealExpanded, transition_sources
 )
+from ..utils.pagination import paginate, next_cursor, NEXT_CURSOR_HEADER
+from ..utils.export import ExportFormat, export_response
+from ..utils.response_cache import response_cache, account_tag
+from ..utils.outbox import (
+    outbox_dispatcher, add_outbox_event,
+    DEAL_CREATED, DEAL_STATUS_CHANGED, REVIEW_CREATED, REVIEW_UPDATED
+)
+from ..utils.broadcaster import publish_listing
 
 router = APIRouter()
 
+# Стратегии загрузки связанных объектов сделки (и архивной сделки). Связи
+# "многие к одному" подтягиваются JOIN-ом в том же запросе, отзыв - одним
+# дополнительным запросом на всю страницу.
+EXPAND_LOADERS = {
+    model: {
+        DealExpand.ACCOUNT: joinedload(model.account),
+        DealExpand.SELLER: joinedload(model.seller),
+        DealExpand.BUYER: joinedload(model.buyer),
+        DealExpand.REVIEW: selectinload(model.review),
+    }
+    for model in (Deal, ArchivedDeal)
+}
+
+def parse_expand(expand: Optional[str]) -> Set[DealExpand]:
+    """Разбирает параметр expand вида account,seller,buyer,review"""
+    if not expand:
+        return set()
+    try:
+        return {DealExpand(name.strip()) for name in expand.split(",") if name.strip()}
+    except ValueError:
+        allowed = ", ".join(item.value for item in DealExpand)
+        raise HTTPException(status_code=400, detail=f"Invalid expand, allowed: {allowed}")
+
+def serialize_deal(deal: Deal, expand: Set[DealExpand]) -> dict:
+    """
+    Собирает ответ со сделкой и запрошенными связанными объектами
+
+    В ответ попадают только запрошенные связи: обращение к незагруженной
+    связи в асинхронной сессии привело бы к ленивому запросу.
+    """
+    data = deal.as_dict()
+    for name in expand:
+        related = getattr(deal, name.value)
+        data[name.value] = related.as_dict() if related is not None else None
+    return data
+
+def deal_payload(deal: Deal) -> dict:
+    """Данные сделки для событий outbox"""
+    return {
+        "deal_id": deal.id,
+        "seller_id": deal.seller_id,
+        "buyer_id": deal.buyer_id,
+        "account_id": deal.account_id,
+        "status": DealStatus(deal.status).value,
+        "version": deal.version,
+    }
+
 @router.post("/deals/", response_model=DealSchema)
 async def create_deal(deal: DealCreate, db: AsyncSession = Depends(get_db)):
     """Создание новой сделки"""
-    # Проверяем доступность аккаунта
-    query = select(Account).where(Account.id == deal.account_id)
-    result = await db.execute(query)
-    account = result.scalar_one_or_none()
+    # Резервируем аккаунт одним условным UPDATE: из нескольких одновременных
+    # покупателей строку изменит только один, остальные получат rowcount = 0
+    reserve = await db.execute(
+        update(Account)
+        .where(Account.id == deal.account_id, Account.is_available == True)
+        .values(is_available=False)
+    )
     
-    if account is None:
-        raise HTTPException(status_code=404, detail="Account not found")
-    if not account.is_available:
+    if reserve.rowcount == 0:
+        query = select(Account.id).where(Account.id == deal.account_id)
+        result = await db.execute(query)
+        account_id = result.scalar_one_or_none()
+        await db.rollback()
+        if account_id is None:
+            raise HTTPException(status_code=404, detail="Account not found")
         raise HTTPException(status_code=400, detail="Account is not available")
     
-    # Создаем сделку
+    # Создаем сделку в той же транзакции, что и резервирование
     db_deal = Deal(
         seller_id=deal.seller_id,
         buyer_id=deal.buyer_id,
         account_id=deal.account_id,
-        status=deal.status
+        status=DealStatus.PENDING
     )
     
-    # Помечаем аккаунт как недоступный
-    account.is_available = False
-    
     db.add(db_deal)
+    await db.flush()
+    add_outbox_event(db, DEAL_CREATED, db_deal.id, deal_payload(db_deal))
+    game = await db.scalar(select(Account.game).where(Account.id == deal.account_id))
     await db.commit()
+    response_cache.invalidate(account_tag(deal.account_id))
+    publish_listing("updated", deal.account_id, game, {"is_available": False})
+    outbox_dispatcher.wake()
     await db.refresh(db_deal)
     return db_deal
 
-@router.get("/deals/", response_model=List[DealSchema])
+@router.get("/deals/", response_model=List[DealExpanded], response_model_exclude_unset=True)
 async def read_deals(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     status: DealStatus = None,
-    db: AsyncSession = Depends(get_db)
+    cursor: Optional[str] = None,
+    expand: Optional[str] = None,
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Получение списка сделок с фильтрацией по статусу"""
-    query = select(Deal)
-    if status:
-        query = query.where(Deal.status == status)
-    query = query.offset(skip).limit(limit)
-    result = await db.execute(query)
-    deals = result.scalars().all()
-    return deals
+    """
+    Получение списка сделок с фильтрацией по статусу (offset или keyset-пагинация)
 
-@router.get("/deals/{deal_id}", response_model=DealSchema)
-async def read_deal(deal_id: int, db: AsyncSession = Depends(get_db)):
-    """Получение информации о сделке по ID"""
-    query = select(Deal).where(Deal.id == deal_id)
-    result = await db.execute(query)
-    deal = result.scalar_one_or_none()
+    expand=account,seller,buyer,review добавляет в каждую сделку связанные
+    объекты, загруженные фиксированным числом запросов на всю страницу.
+    include_archived=true добавляет перенесенные в архив сделки (у них
+    есть archived_at) в общем порядке и с той же пагинацией.
+    """
+    expand_fields = parse_expand(expand)
+    models = [Deal]
+    # В архиве только завершенные и отмененные сделки
+    if include_archived and status != DealStatus.PENDING:
+        models.append(ArchivedDeal)
+
+    deals = []
+    for model in models:
+        query = select(model).options(*[EXPAND_LOADERS[model][name] for name in expand_fields])
+        if status:
+            query = query.where(model.status == status)
+        if len(models) > 1:
+            # Страница собирается из двух таблиц: из каждой берутся первые
+            # skip + limit строк, затем они сливаются в общем порядке
+            query = paginate(query, model, 0, skip + limit, cursor)
+        else:
+            query = paginate(query, model, skip, limit, cursor)
+        result = await db.execute(query)
+        deals.extend(result.scalars().all())
+    if len(models) > 1:
+        deals.sort(key=lambda deal: (deal.created_at, deal.id))
+        offset = 0 if cursor else skip
+        deals = deals[offset:offset + limit]
+    cursor = next_cursor(deals, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return [serialize_deal(deal, expand_fields) for deal in deals]
+
+@router.get("/deals/export")
+async def export_deals(
+    format: ExportFormat = ExportFormat.NDJSON,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    status: Optional[DealStatus] = None,
+    include_archived: bool = False,
+):
+    """Потоковая выгрузка сделок в NDJSON или CSV (include_archived - вместе с архивом)"""
+    queries = []
+    for table in [Deal.__table__, ArchivedDeal.__table__] if include_archived else [Deal.__table__]:
+        query = select(*[table.c[column.name] for column in Deal.__table__.columns])
+        if created_from is not None:
+            query = query.where(table.c.created_at >= created_from)
+        if created_to is not None:
+            query = query.where(table.c.created_at < created_to)
+        if status is not None:
+            query = query.where(table.c.status == status)
+        queries.append(query)
+    if len(queries) == 1:
+        query = queries[0].order_by(Deal.id)
+    else:
+        query = union_all(*queries).order_by("id")
+    return export_response(query, format, "deals")
+
+@router.get("/deals/{deal_id}", response_model=DealExpanded, response_model_exclude_unset=True)
+async def read_deal(
+    deal_id: int,
+    expand: Optional[str] = None,
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Получение информации о сделке по ID (expand=account,seller,buyer,review)
+
+    include_archived=true ищет сделку и в архиве, если ее нет в deals.
+    """
+    expand_fields = parse_expand(expand)
+    deal = None
+    for model in [Deal, ArchivedDeal] if include_archived else [Deal]:
+        query = (
+            select(model)
+            .options(*[EXPAND_LOADERS[model][name] for name in expand_fields])
+            .where(model.id == deal_id)
+        )
+        result = await db.execute(query)
+        deal = result.scalar_one_or_none()
+        if deal is not None:
+            break
     
     if deal is None:
         raise HTTPException(status_code=404, detail="Deal not found")
-    return deal
+    return serialize_deal(deal, expand_fields)
 
 @router.put("/deals/{deal_id}", response_model=DealSchema)
 async def update_deal(deal_id: int, deal: DealUpdate, db: AsyncSession = Depends(get_db)):
-    """Обновление статуса сделки"""
-    query = select(Deal).where(Deal.id == deal_id)
-    result = await db.execute(query)
-    db_deal = result.scalar_one_or_none()
-    
-    if db_deal is None:
-        raise HTTPException(status_code=404, detail="Deal not found")
-    
-    # Обновляем статус
-    if deal.status:
-        db_deal.status = deal.status
-        # Если сделка отменена, возвращаем аккаунт в доступные
-        if deal.status == DealStatus.CANCELLED:
-            account_query = select(Account).where(Account.id == db_deal.account_id)
-            account_result = await db.execute(account_query)
-            account = account_result.scalar_one_or_none()
-            if account:
-                account.is_available = True
-    
+    """
+    Обновление статуса сделки
+
+    Переход выполняется одним условным UPDATE: строка меняется, только если
+    текущий статус допускает переход (DEAL_TRANSITIONS) и, если клиент
+    передал version, версия не изменилась. Иначе ответ 409. Если сделка
+    уже в запрошенном статусе и version не передана или предшествует
+    этому переходу (повтор запроса), возвращается ее текущее состояние.
+    """
+    if deal.status is None:
+        result = await db.execute(select(Deal).where(Deal.id == deal_id))
+        db_deal = result.scalar_one_or_none()
+        if db_deal is None:
+            raise HTTPException(status_code=404, detail="Deal not found")
+        return db_deal
+
+    conditions = [Deal.id == deal_id, Deal.status.in_(transition_sources(deal.status))]
+    if deal.version is not None:
+        conditions.append(Deal.version == deal.version)
+    transition = await db.execute(
+        update(Deal)
+        .where(*conditions)
+        .values(status=deal.status, version=Deal.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+    if transition.rowcount == 0:
+        result = await db.execute(select(Deal).where(Deal.id == deal_id))
+        current = result.scalar_one_or_none()
+        if current is None:
+            await db.rollback()
+            raise HTTPException(status_code=404, detail="Deal not found")
+        # Повтор уже выполненного перехода: без version или с версией, которую
+        # клиент видел до своего перехода (или текущей). Проигравший гонку с
+        # устаревшей версией получает 409, даже если статус совпал
+        if current.status == deal.status and (
+            deal.version is None or deal.version in (current.version - 1, current.version)
+        ):
+            await db.commit()
+            return current
+        status, version = current.status, current.version
+        await db.rollback()
+        if deal.version is not None and version != deal.version:
+            raise HTTPException(status_code=409, detail="Deal was modified concurrently")
+        raise HTTPException(
+            status_code=409,
+            detail=f"Cannot change deal status from {status.value} to {deal.status.value}"
+        )
+
+    # Если сделка отменена, возвращаем аккаунт в доступные в той же транзакции
+    if deal.status == DealStatus.CANCELLED:
+        await db.execute(
+            update(Account)
+            .where(Account.id == select(Deal.account_id).where(Deal.id == deal_id).scalar_subquery())
+            .values(is_available=True)
+            .execution_options(synchronize_session=False)
+        )
+
+    result = await db.execute(select(Deal).where(Deal.id == deal_id))
+    db_deal = result.scalar_one()
+    add_outbox_event(db, DEAL_STATUS_CHANGED, deal_id, deal_payload(db_deal))
+    if deal.status == DealStatus.CANCELLED:
+        game = await db.scalar(select(Account.game).where(Account.id == db_deal.account_id))
     await db.commit()
-    await db.refresh(db_deal)
+    if deal.status == DealStatus.CANCELLED:
+        response_cache.invalidate(account_tag(db_deal.account_id))
+        publish_listing("updated", db_deal.account_id, game, {"is_available": True})
+    outbox_dispatcher.wake()
     return db_deal
 
 @router.post("/deals/{deal_id}/reviews/", response_model=ReviewSchema)
@@ -124,16 +314,29 @@ async def create_review(deal_id: int, review: ReviewCreate, db: AsyncSession = D
     )
     
     db.add(db_review)
+    await db.flush()
+    # Обновляем агрегаты рейтинга продавца в той же транзакции
+    await apply_rating_delta(db, deal.seller_id, 1, review.rating)
+    add_outbox_event(db, REVIEW_CREATED, db_review.id, {
+        "review_id": db_review.id,
+        "deal_id": deal_id,
+        "seller_id": deal.seller_id,
+        "rating": review.rating,
+    })
     await db.commit()
+    outbox_dispatcher.wake()
     await db.refresh(db_review)
     return db_review
 
 @router.get("/deals/{deal_id}/review/", response_model=ReviewSchema)
-async def read_deal_review(deal_id: int, db: AsyncSession = Depends(get_db)):
-    """Получение отзыва для сделки"""
-    query = select(Review).where(Review.deal_id == deal_id)
-    result = await db.execute(query)
-    review = result.scalar_one_or_none()
+async def read_deal_review(deal_id: int, include_archived: bool = False, db: AsyncSession = Depends(get_read_db)):
+    """Получение отзыва для сделки (include_archived - и для архивной)"""
+    review = None
+    for model in [Review, ArchivedReview] if include_archived else [Review]:
+        result = await db.execute(select(model).where(model.deal_id == deal_id))
+        review = result.scalar_one_or_none()
+        if review is not None:
+            break
     
     if review is None:
         raise HTTPException(status_code=404, detail="Review not found")
@@ -149,10 +352,41 @@ async def update_review(deal_id: int, review: ReviewUpdate, db: AsyncSession = D
     if db_review is None:
         raise HTTPException(status_code=404, detail="Review not found")
     
+    update_data = review.dict(exclude_unset=True)
+    
+    # Изменение оценки отражаем в агрегатах рейтинга продавца. Оценка
+    # меняется условным UPDATE по прочитанному значению: если отзыв успели
+    # изменить параллельно, строка не совпадет и дельта не применится
+    new_rating = update_data.pop("rating", None)
+    previous_rating = db_review.rating
+    if new_rating is not None and new_rating != previous_rating:
+        changed = await db.execute(
+            update(Review)
+            .where(Review.id == db_review.id, Review.rating == previous_rating)
+            .values(rating=new_rating)
+            .execution_options(synchronize_session=False)
+        )
+        if changed.rowcount == 0:
+            await db.rollback()
+            raise HTTPException(status_code=409, detail="Review was modified concurrently")
+        seller_query = select(Deal.seller_id).where(Deal.id == deal_id)
+        seller_result = await db.execute(seller_query)
+        seller_id = seller_result.scalar_one_or_none()
+        if seller_id is not None:
+            await apply_rating_delta(db, seller_id, 0, new_rating - previous_rating)
+        add_outbox_event(db, REVIEW_UPDATED, db_review.id, {
+            "review_id": db_review.id,
+            "deal_id": deal_id,
+            "seller_id": seller_id,
+            "rating": new_rating,
+            "previous_rating": previous_rating,
+        })
+    
     # Обновляем только предоставленные поля
-    for field, value in review.dict(exclude_unset=True).items():
+    for field, value in update_data.items():
         setattr(db_review, field, value)
     
     await db.commit()
+    outbox_dispatcher.wake()
     await db.refresh(db_review)
     return db_review 
\ No newline at end of file
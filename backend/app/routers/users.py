@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import List
+from typing import List, Optional
 
 from ..database.config import get_db
+from ..database.routing import get_read_db
 from ..models.user import User
 from ..schemas.user import UserCreate, UserUpdate, User as UserSchema
+from ..utils.pagination import paginate, next_cursor, NEXT_CURSOR_HEADER
 
 router = APIRouter()
 
@@ -22,8 +24,7 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     
     db_user = User(
         telegram_id=user.telegram_id,
-        username=user.username,
-        rating=user.rating
+        username=user.username
     )
     db.add(db_user)
     await db.commit()
@@ -31,15 +32,24 @@ async def create_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     return db_user
 
 @router.get("/users/", response_model=List[UserSchema])
-async def read_users(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
-    """Получение списка пользователей"""
-    query = select(User).offset(skip).limit(limit)
+async def read_users(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Получение списка пользователей (offset или keyset-пагинация)"""
+    query = paginate(select(User), User, skip, limit, cursor)
     result = await db.execute(query)
     users = result.scalars().all()
+    cursor = next_cursor(users, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
     return users
 
 @router.get("/users/{user_id}", response_model=UserSchema)
-async def read_user(user_id: int, db: AsyncSession = Depends(get_db)):
+async def read_user(user_id: int, db: AsyncSession = Depends(get_read_db)):
     """Получение информации о пользователе по ID"""
     query = select(User).where(User.id == user_id)
     result = await db.execute(query)
@@ -50,7 +60,7 @@ async def read_user(user_id: int, db: AsyncSession = Depends(get_db)):
     return user
 
 @router.get("/users/telegram/{telegram_id}", response_model=UserSchema)
-async def read_user_by_telegram(telegram_id: int, db: AsyncSession = Depends(get_db)):
+async def read_user_by_telegram(telegram_id: int, db: AsyncSession = Depends(get_read_db)):
     """Получение информации о пользователе по Telegram ID"""
     query = select(User).where(User.telegram_id == telegram_id)
     result = await db.execute(query)
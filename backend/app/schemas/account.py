@@ -1,7 +1,15 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from datetime import datetime
+from typing import Any, List, Optional
+from enum import Enum
 from .base import BaseSchema
 
+class AccountSort(str, Enum):
+    """Варианты сортировки при поиске аккаунтов"""
+    PRICE_ASC = "price_asc"
+    PRICE_DESC = "price_desc"
+    NEWEST = "newest"
+
 class AccountBase(BaseModel):
     """Базовая схема игрового аккаунта"""
     user_id: int
@@ -25,4 +33,45 @@ class AccountInDB(AccountBase, BaseSchema):
 
 class Account(AccountInDB):
     """Схема для ответа API"""
-    pass 
\ No newline at end of file
+    pass
+
+class GameFacet(BaseModel):
+    """Количество аккаунтов по игре"""
+    game: str
+    count: int
+
+class AccountSearchResult(BaseModel):
+    """Схема ответа фасетного поиска"""
+    items: List[Account]
+    total: int
+    facets: List[GameFacet]
+
+class BulkRowError(BaseModel):
+    """Ошибка в строке массового импорта"""
+    row: int
+    detail: Any
+
+class AccountBulkResult(BaseModel):
+    """Схема ответа массового импорта аккаунтов"""
+    inserted: int
+    errors: List[BulkRowError]
+
+class PriceBucket(BaseModel):
+    """Корзина гистограммы цен: [min, max), у последней max = null"""
+    min: float
+    max: Optional[float] = None
+    count: int
+
+class AccountPriceStats(BaseModel):
+    """Сводка цен доступных аккаунтов по игре"""
+    game: str
+    count: int
+    min: Optional[float] = None
+    max: Optional[float] = None
+    mean: Optional[float] = None
+    p25: Optional[float] = None
+    p50: Optional[float] = None
+    p75: Optional[float] = None
+    histogram: List[PriceBucket]
+    # Время последнего пересчета сводки
+    updated_at: Optional[datetime] = None
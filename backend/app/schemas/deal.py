@@ -1,7 +1,10 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from datetime import datetime
+from typing import Dict, FrozenSet, Optional
 from enum import Enum
 from .base import BaseSchema
+from .account import Account as AccountSchema
+from .user import User as UserSchema
 
 class DealStatus(str, Enum):
     """Статусы сделки"""
@@ -9,24 +12,46 @@ class DealStatus(str, Enum):
     COMPLETED = "completed"
     CANCELLED = "cancelled"
 
+# Допустимые переходы статусов: завершенная и отмененная сделки окончательны
+DEAL_TRANSITIONS: Dict[DealStatus, FrozenSet[DealStatus]] = {
+    DealStatus.PENDING: frozenset({DealStatus.COMPLETED, DealStatus.CANCELLED}),
+    DealStatus.COMPLETED: frozenset(),
+    DealStatus.CANCELLED: frozenset(),
+}
+
+def transition_sources(target: DealStatus) -> FrozenSet[DealStatus]:
+    """Статусы, из которых сделку можно перевести в target"""
+    return frozenset(status for status, targets in DEAL_TRANSITIONS.items() if target in targets)
+
+class DealExpand(str, Enum):
+    """Связанные объекты, которые можно включить в ответ со сделкой"""
+    ACCOUNT = "account"
+    SELLER = "seller"
+    BUYER = "buyer"
+    REVIEW = "review"
+
 class DealBase(BaseModel):
     """Базовая схема сделки"""
     seller_id: int
     buyer_id: int
     account_id: int
-    status: DealStatus = Field(default=DealStatus.PENDING)
 
 class DealCreate(DealBase):
-    """Схема для создания сделки"""
+    """Схема для создания сделки (сделка всегда создается в статусе pending)"""
     pass
 
 class DealUpdate(BaseModel):
     """Схема для обновления сделки"""
     status: Optional[DealStatus] = None
+    # Необязательная оптимистическая блокировка: версия, которую видел
+    # клиент, при расхождении ответ 409. Без нее переход проверяется
+    # только по текущему статусу
+    version: Optional[int] = None
 
 class DealInDB(DealBase, BaseSchema):
     """Схема сделки в БД"""
-    pass
+    status: DealStatus = Field(default=DealStatus.PENDING)
+    version: int = 1
 
 class Deal(DealInDB):
     """Схема для ответа API"""
@@ -53,4 +78,13 @@ class ReviewInDB(ReviewBase, BaseSchema):
 
 class Review(ReviewInDB):
     """Схема для ответа API"""
-    pass 
\ No newline at end of file
+    pass
+
+class DealExpanded(Deal):
+    """Схема сделки со связанными объектами, запрошенными через expand"""
+    account: Optional[AccountSchema] = None
+    seller: Optional[UserSchema] = None
+    buyer: Optional[UserSchema] = None
+    review: Optional[Review] = None
+    # Только у сделок из архива (include_archived)
+    archived_at: Optional[datetime] = None
@@ -6,7 +6,6 @@ class UserBase(BaseModel):
     """Базовая схема пользователя"""
     telegram_id: int
     username: Optional[str] = None
-    rating: float = Field(default=0.0, ge=0.0, le=5.0)
 
 class UserCreate(UserBase):
     """Схема для создания пользователя"""
@@ -15,11 +14,12 @@ class UserCreate(UserBase):
 class UserUpdate(BaseModel):
     """Схема для обновления пользователя"""
     username: Optional[str] = None
-    rating: Optional[float] = Field(default=None, ge=0.0, le=5.0)
 
 class UserInDB(UserBase, BaseSchema):
     """Схема пользователя в БД"""
-    pass
+    # Рейтинг вычисляется по отзывам и клиентом не задается
+    rating: float = Field(default=0.0, ge=0.0, le=5.0)
+    review_count: int = 0
 
 class User(UserInDB):
     """Схема для ответа API"""
@@ -0,0 +1,192 @@
+import asyncio
+import json
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+
+from ..config import settings
+
+# Поля аккаунта, изменения которых попадают в дельту. Описание может быть
+# длинным: при его изменении клиент получает дельту без полей и сам
+# перечитывает аккаунт.
+DELTA_FIELDS = ("game", "price", "is_available")
+
+# Служебные сообщения SSE кодируются один раз
+RETRY_MESSAGE = b"retry: 3000\n\n"
+HEARTBEAT_MESSAGE = b": ping\n\n"
+DROPPED_MESSAGE = b"event: dropped\ndata: {}\n\n"
+
+class StreamFull(Exception):
+    """Достигнут лимит подписчиков STREAM_MAX_SUBSCRIBERS"""
+
+class Subscriber:
+    """
+    Подписчик ленты с ограниченным буфером
+
+    Вместо asyncio.Queue - список и одна Future ожидания: у простаивающего
+    подписчика нет ничего, кроме пустого списка и ожидающей Future.
+    """
+
+    __slots__ = ("games", "buffer", "waiter", "closed", "dropped")
+
+    def __init__(self, games: Optional[Set[str]]):
+        self.games = games
+        self.buffer = []
+        self.waiter: Optional[asyncio.Future] = None
+        self.closed = False
+        self.dropped = False
+
+    def wake(self) -> None:
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def wait(self) -> None:
+        self.waiter = asyncio.get_running_loop().create_future()
+        try:
+            await self.waiter
+        finally:
+            self.waiter = None
+
+class ListingBroadcaster:
+    """
+    In-process рассылка изменений объявлений подписчикам SSE-ленты
+
+    Событие сериализуется один раз и раскладывается в буферы подписчиков
+    без ожидания. Подписчик, чей буфер заполнен (клиент не успевает
+    читать), отключается: получает событие dropped и должен переподключиться
+    и перечитать каталог. Подписчики проиндексированы по игре, поэтому
+    событие обходит только тех, кому оно нужно. Heartbeat для всех
+    подписчиков рассылает одна задача.
+    """
+
+    def __init__(self, buffer_size: int, max_subscribers: int, heartbeat_interval: float):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.heartbeat_interval = heartbeat_interval
+        self.sequence = 0
+        self.dropped = 0
+        self._count = 0
+        # None - подписчики без фильтра по игре
+        self._by_game: Dict[Optional[str], Set[Subscriber]] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    def subscribe(self, games: Optional[Iterable[str]] = None) -> Subscriber:
+        if self._count >= self.max_subscribers:
+            raise StreamFull()
+        subscriber = Subscriber(set(games) if games else None)
+        for game in subscriber.games or (None,):
+            self._by_game.setdefault(game, set()).add(subscriber)
+        self._count += 1
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.get_running_loop().create_task(self._run_heartbeat())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        if subscriber.closed:
+            return
+        subscriber.closed = True
+        subscriber.wake()
+        for game in subscriber.games or (None,):
+            subscribers = self._by_game.get(game)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._by_game[game]
+        self._count -= 1
+
+    def _deliver(self, subscriber: Subscriber, message: bytes) -> None:
+        if len(subscriber.buffer) >= self.buffer_size:
+            subscriber.buffer.clear()
+            subscriber.dropped = True
+            self.dropped += 1
+            self.unsubscribe(subscriber)
+            return
+        subscriber.buffer.append(message)
+        subscriber.wake()
+
+    def publish(self, event: dict, games: Iterable[str] = ()) -> None:
+        """
+        Рассылает событие подписчикам без фильтра и подписчикам игр games
+
+        Вызывается после commit, из цикла событий.
+        """
+        targets = set(self._by_game.get(None, ()))
+        for game in games:
+            targets.update(self._by_game.get(game, ()))
+        if not targets:
+            return
+        self.sequence += 1
+        message = (
+            f"id: {self.sequence}\nevent: listing\n"
+            f"data: {json.dumps(event, separators=(',', ':'), ensure_ascii=False)}\n\n"
+        ).encode()
+        for subscriber in targets:
+            self._deliver(subscriber, message)
+
+    async def _run_heartbeat(self) -> None:
+        """Комментарий-пинг держит соединение через прокси и выявляет отключившихся клиентов"""
+        while self._count:
+            await asyncio.sleep(self.heartbeat_interval)
+            for subscribers in list(self._by_game.values()):
+                for subscriber in list(subscribers):
+                    self._deliver(subscriber, HEARTBEAT_MESSAGE)
+
+    async def stream(self, subscriber: Subscriber) -> AsyncIterator[bytes]:
+        """Тело ответа text/event-stream; накопленные сообщения отдаются одним куском"""
+        try:
+            yield RETRY_MESSAGE
+            while True:
+                if subscriber.buffer:
+                    chunk = b"".join(subscriber.buffer)
+                    subscriber.buffer.clear()
+                    yield chunk
+                elif subscriber.closed:
+                    break
+                else:
+                    await subscriber.wait()
+            if subscriber.dropped:
+                yield DROPPED_MESSAGE
+        finally:
+            self.unsubscribe(subscriber)
+
+    def close(self) -> None:
+        """Завершает все потоки, чтобы сервер мог остановиться"""
+        for subscribers in list(self._by_game.values()):
+            for subscriber in list(subscribers):
+                self.unsubscribe(subscriber)
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": self._count,
+            "events": self.sequence,
+            "dropped": self.dropped,
+        }
+
+listing_broadcaster = ListingBroadcaster(
+    settings.STREAM_BUFFER_SIZE,
+    settings.STREAM_MAX_SUBSCRIBERS,
+    settings.STREAM_HEARTBEAT_INTERVAL,
+)
+
+def publish_listing(
+    event_type: str,
+    account_id: int,
+    game: str,
+    changes: Optional[dict] = None,
+    previous_game: Optional[str] = None,
+) -> None:
+    """
+    Публикует компактную дельту объявления
+
+    Из changes в событие попадают только поля DELTA_FIELDS. previous_game -
+    прежняя игра при ее смене: событие получат подписчики и старой, и
+    новой игры.
+    """
+    event = {"type": event_type, "id": account_id, "game": game}
+    if changes:
+        event.update((field, value) for field, value in changes.items() if field in DELTA_FIELDS)
+    games = {game}
+    if previous_game is not None:
+        games.add(previous_game)
+    listing_broadcaster.publish(event, games)
@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+from datetime import datetime
+from enum import Enum
+from typing import AsyncIterator, Dict
+
+from fastapi.responses import StreamingResponse
+
+from ..database.config import new_read_session
+
+# Сколько строк забирается из курсора БД за один раз
+EXPORT_BATCH_SIZE = 1000
+
+class ExportFormat(str, Enum):
+    """Форматы выгрузки"""
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+}
+
+def _serialize(value):
+    """Приводит значение из БД к виду, пригодному для JSON и CSV"""
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def _format_batch(rows, columns, fmt: ExportFormat) -> str:
+    """Форматирует пачку строк в NDJSON или CSV"""
+    if fmt == ExportFormat.NDJSON:
+        return "".join(
+            json.dumps({key: _serialize(row[key]) for key in columns}, ensure_ascii=False) + "\n"
+            for row in rows
+        )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([_serialize(row[key]) for key in columns] for row in rows)
+    return buffer.getvalue()
+
+async def stream_query(query, fmt: ExportFormat) -> AsyncIterator[str]:
+    """
+    Потоково выгружает результат запроса
+
+    Строки читаются через серверный курсор движка чтения пачками по
+    EXPORT_BATCH_SIZE, поэтому потребление памяти не зависит от объема
+    выгрузки. Сессия создается внутри генератора: она должна жить, пока
+    ответ отдается клиенту, а не только пока выполняется обработчик.
+    """
+    async with new_read_session() as session:
+        result = await session.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        columns = list(result.keys())
+        if fmt == ExportFormat.CSV:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(columns)
+            yield buffer.getvalue()
+        async for rows in result.mappings().partitions(EXPORT_BATCH_SIZE):
+            yield _format_batch(rows, columns, fmt)
+
+def export_response(query, fmt: ExportFormat, filename: str) -> StreamingResponse:
+    """Оборачивает потоковую выгрузку в StreamingResponse"""
+    headers: Dict[str, str] = {
+        "Content-Disposition": f'attachment; filename="{filename}.{fmt.value}"'
+    }
+    return StreamingResponse(stream_query(query, fmt), media_type=MEDIA_TYPES[fmt], headers=headers)
@@ -0,0 +1,308 @@
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from starlette.responses import Response
+
+from ..config import settings
+from ..database.config import new_session
+from ..models.idempotency import IdempotencyKey
+from .telegram_auth import client_key
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+# POST-маршруты, повтор которых не должен создавать дубликаты
+IDEMPOTENT_PATHS = {"/api/v1/deals/", "/api/v1/accounts/"}
+
+# Как часто повтор опрашивает БД, пока первый запрос выполняется в другом процессе
+POLL_INTERVAL = 0.1
+
+class StoredResponse:
+    """Ответ на первый запрос с ключом"""
+
+    __slots__ = ("request_hash", "status_code", "body", "media_type", "expires_at", "headers")
+
+    def __init__(
+        self,
+        request_hash: str,
+        status_code: int,
+        body: str,
+        media_type: str,
+        expires_at: datetime,
+        headers: Optional[List[Tuple[str, str]]] = None,
+    ):
+        self.request_hash = request_hash
+        self.status_code = status_code
+        self.body = body
+        self.media_type = media_type
+        self.expires_at = expires_at
+        self.headers = headers
+
+    @classmethod
+    def from_row(cls, row: IdempotencyKey) -> "StoredResponse":
+        return cls(row.request_hash, row.status_code, row.body, row.media_type, row.expires_at, row.headers)
+
+    def replay(self, request_hash: str) -> Response:
+        if request_hash != self.request_hash:
+            return JSONResponse(
+                {"detail": "Idempotency-Key was already used with a different request"},
+                status_code=422,
+            )
+        response = Response(
+            content=self.body,
+            status_code=self.status_code,
+            media_type=self.media_type,
+            headers={REPLAYED_HEADER: "true"},
+        )
+        if self.headers is not None:
+            # Заголовки первого ответа как есть, включая повторяющиеся
+            response.raw_headers = [
+                (name.encode("latin-1"), value.encode("latin-1")) for name, value in self.headers
+            ] + [(REPLAYED_HEADER.lower().encode("latin-1"), b"true")]
+        return response
+
+class IdempotencyCache:
+    """
+    Кэш завершенных ответов в памяти перед таблицей idempotency_keys
+
+    Также хранит события запросов, выполняющихся в этом процессе: повтор
+    с тем же ключом ждет события, а не выполняет обработчик второй раз.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.inflight: Dict[str, asyncio.Event] = {}
+        self._entries: "OrderedDict[str, StoredResponse]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        stored = self._entries.get(key)
+        if stored is None:
+            return None
+        if stored.expires_at <= datetime.utcnow():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return stored
+
+    def set(self, key: str, stored: StoredResponse) -> None:
+        self._entries[key] = stored
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+idempotency_cache = IdempotencyCache(settings.IDEMPOTENCY_CACHE_SIZE)
+
+async def _claim(key: str, request_hash: str) -> Optional[IdempotencyKey]:
+    """
+    Занимает ключ записью без ответа
+
+    Возвращает None, если ключ занят этим вызовом, иначе существующую
+    запись. Запись без ответа арендована на IDEMPOTENCY_LEASE и
+    продлевается, пока выполняется обработчик (_renew_claim): если
+    процесс упал, не дописав ответ, ключ освободится сам.
+    """
+    now = datetime.utcnow()
+    async with new_session() as db:
+        existing = await db.scalar(select(IdempotencyKey).where(IdempotencyKey.key == key))
+        if existing is not None and existing.expires_at <= now:
+            await db.delete(existing)
+            existing = None
+        if existing is not None:
+            return existing
+        db.add(IdempotencyKey(
+            key=key,
+            request_hash=request_hash,
+            expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_LEASE),
+        ))
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Другой процесс занял ключ одновременно с нами
+            await db.rollback()
+            return await db.scalar(select(IdempotencyKey).where(IdempotencyKey.key == key))
+    return None
+
+async def _renew_claim(key: str) -> None:
+    """Продлевает аренду занятого ключа, пока обработчик не завершится"""
+    while True:
+        await asyncio.sleep(settings.IDEMPOTENCY_LEASE / 3)
+        try:
+            async with new_session() as db:
+                await db.execute(
+                    update(IdempotencyKey)
+                    .where(IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None))
+                    .values(expires_at=datetime.utcnow() + timedelta(seconds=settings.IDEMPOTENCY_LEASE))
+                )
+                await db.commit()
+        except Exception:
+            logger.exception("Failed to renew idempotency key lease")
+
+async def _complete(key: str, stored: StoredResponse) -> None:
+    async with new_session() as db:
+        await db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key == key)
+            .values(
+                status_code=stored.status_code,
+                body=stored.body,
+                media_type=stored.media_type,
+                headers=stored.headers,
+                expires_at=stored.expires_at,
+            )
+        )
+        await db.commit()
+
+async def _release(key: str) -> None:
+    """Освобождает ключ после ошибки, чтобы повтор выполнил запрос заново"""
+    async with new_session() as db:
+        await db.execute(
+            delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None))
+        )
+        await db.commit()
+
+def _in_progress() -> Response:
+    return JSONResponse(
+        {"detail": "A request with this Idempotency-Key is still in progress"},
+        status_code=409,
+    )
+
+async def _wait_for_other_process(key: str) -> Optional[IdempotencyKey]:
+    """Ждет ответа запроса, занявшего ключ в другом процессе; None - ключ освободился"""
+    deadline = asyncio.get_running_loop().time() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    while asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(POLL_INTERVAL)
+        async with new_session() as db:
+            row = await db.scalar(select(IdempotencyKey).where(IdempotencyKey.key == key))
+        if row is None or row.status_code is not None:
+            return row
+    raise asyncio.TimeoutError
+
+async def idempotency_middleware(request: Request, call_next):
+    """
+    Поддержка заголовка Idempotency-Key для POST /deals/ и /accounts/
+
+    Первый запрос с ключом выполняется и его ответ (кроме 5xx) сохраняется
+    на IDEMPOTENCY_TTL; повтор с тем же ключом получает сохраненный ответ
+    с заголовком Idempotent-Replayed, обработчик не вызывается. Повтор,
+    пришедший во время выполнения первого запроса, ждет его результата.
+    Ключ действует в пределах клиента (пользователя Telegram, без
+    авторизации - IP), метода и пути.
+    """
+    raw_key = request.headers.get(IDEMPOTENCY_HEADER)
+    if raw_key is None or request.method != "POST" or request.url.path not in IDEMPOTENT_PATHS:
+        return await call_next(request)
+    if not raw_key or len(raw_key) > MAX_KEY_LENGTH:
+        return JSONResponse({"detail": "Invalid Idempotency-Key"}, status_code=400)
+
+    key = f"{client_key(request) or ''}:{request.method}:{request.url.path}:{raw_key}"
+    request_hash = hashlib.sha256(await request.body()).hexdigest()
+
+    while True:
+        stored = idempotency_cache.get(key)
+        if stored is not None:
+            return stored.replay(request_hash)
+        event = idempotency_cache.inflight.get(key)
+        if event is None:
+            break
+        try:
+            await asyncio.wait_for(event.wait(), settings.IDEMPOTENCY_WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            return _in_progress()
+
+    event = asyncio.Event()
+    idempotency_cache.inflight[key] = event
+    claimed = False
+    try:
+        while not claimed:
+            existing = await _claim(key, request_hash)
+            if existing is None:
+                claimed = True
+            elif existing.status_code is not None:
+                stored = StoredResponse.from_row(existing)
+                idempotency_cache.set(key, stored)
+                return stored.replay(request_hash)
+            else:
+                try:
+                    finished = await _wait_for_other_process(key)
+                except asyncio.TimeoutError:
+                    return _in_progress()
+                if finished is not None:
+                    stored = StoredResponse.from_row(finished)
+                    idempotency_cache.set(key, stored)
+                    return stored.replay(request_hash)
+
+        renewal = asyncio.create_task(_renew_claim(key))
+        try:
+            response = await call_next(request)
+            body = b"".join([chunk async for chunk in response.body_iterator])
+        finally:
+            renewal.cancel()
+        if response.status_code < 500:
+            stored = StoredResponse(
+                request_hash,
+                response.status_code,
+                body.decode(),
+                response.headers.get("content-type"),
+                datetime.utcnow() + timedelta(seconds=settings.IDEMPOTENCY_TTL),
+                [(name.decode("latin-1"), value.decode("latin-1")) for name, value in response.raw_headers],
+            )
+            await _complete(key, stored)
+            idempotency_cache.set(key, stored)
+            claimed = False
+        # raw_headers, а не dict(headers): повторяющиеся заголовки сохраняются
+        result = Response(content=body, status_code=response.status_code)
+        result.raw_headers = response.raw_headers
+        return result
+    finally:
+        if claimed:
+            await asyncio.shield(_release(key))
+        del idempotency_cache.inflight[key]
+        event.set()
+
+async def sweep_expired_keys() -> int:
+    """Удаляет истекшие ключи пачками по IDEMPOTENCY_SWEEP_BATCH, возвращает их число"""
+    removed = 0
+    while True:
+        async with new_session() as db:
+            expired = (
+                select(IdempotencyKey.id)
+                .where(IdempotencyKey.expires_at <= datetime.utcnow())
+                .limit(settings.IDEMPOTENCY_SWEEP_BATCH)
+                .scalar_subquery()
+            )
+            result = await db.execute(
+                delete(IdempotencyKey)
+                .where(IdempotencyKey.id.in_(expired))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        removed += result.rowcount
+        if result.rowcount < settings.IDEMPOTENCY_SWEEP_BATCH:
+            return removed
+        # Между пачками отдаем управление, чтобы не держать блокировку БД подряд
+        await asyncio.sleep(0)
+
+async def run_idempotency_sweeper() -> None:
+    """Периодически удаляет истекшие ключи"""
+    while True:
+        await asyncio.sleep(settings.IDEMPOTENCY_SWEEP_INTERVAL)
+        try:
+            removed = await sweep_expired_keys()
+            if removed:
+                logger.info("Removed %d expired idempotency keys", removed)
+        except Exception:
+            logger.exception("Idempotency key sweep failed")
@@ -0,0 +1,207 @@
+import time
+
+from fastapi import Request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.responses import Response
+
+REQUEST_COUNT = Counter(
+    "http_requests_total",
+    "Количество HTTP-запросов",
+    ["method", "route", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Длительность обработки HTTP-запросов",
+    ["method", "route"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Количество запросов в обработке",
+)
+AUTH_LATENCY = Histogram(
+    "auth_middleware_duration_seconds",
+    "Время проверки авторизации Telegram в middleware",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05),
+)
+DB_STATEMENT_LATENCY = Histogram(
+    "db_statement_duration_seconds",
+    "Время выполнения SQL-запросов",
+    ["operation"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+DB_POOL_CHECKOUTS = Counter(
+    "db_pool_checkouts_total",
+    "Количество выдач соединений из пула",
+)
+DB_CONNECTION_WAIT = Histogram(
+    "db_connection_acquire_seconds",
+    "Время ожидания соединения с БД при открытии сессии",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+NOTIFICATIONS = Counter(
+    "notifications_total",
+    "Результаты отправки уведомлений в Telegram",
+    ["result"],
+)
+NOTIFICATION_SEND_LATENCY = Histogram(
+    "notification_send_seconds",
+    "Время вызова sendMessage Bot API",
+)
+DB_READ_SESSIONS = Counter(
+    "db_read_sessions_total",
+    "Сессии GET-обработчиков по движку (replica или primary для read-your-writes)",
+    ["engine"],
+)
+DEALS_ARCHIVED = Counter(
+    "deals_archived_total",
+    "Сделки, перенесенные в архивные таблицы",
+)
+OUTBOX_EVENTS = Counter(
+    "outbox_events_total",
+    "События outbox, обработанные потребителями",
+    ["consumer", "result"],
+)
+OUTBOX_DELIVERY_LAG = Histogram(
+    "outbox_delivery_lag_seconds",
+    "Время от записи события outbox до его доставки потребителю",
+    ["consumer"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0),
+)
+OUTBOX_LAG_EVENTS = Gauge(
+    "outbox_lag_events",
+    "Недоставленные потребителю события outbox",
+    ["consumer"],
+)
+OUTBOX_LAG_SECONDS = Gauge(
+    "outbox_lag_seconds",
+    "Возраст самого старого недоставленного потребителю события outbox",
+    ["consumer"],
+)
+
+class RuntimeCollector:
+    """Снимает состояние пула соединений и кэшей при каждом опросе"""
+
+    def __init__(self):
+        self.engines = {}
+
+    def collect(self):
+        size = GaugeMetricFamily("db_pool_size", "Размер пула соединений", labels=["engine"])
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Выданные соединения", labels=["engine"])
+        overflow = GaugeMetricFamily("db_pool_overflow", "Соединения сверх размера пула", labels=["engine"])
+        for name, engine in self.engines.items():
+            pool = engine.sync_engine.pool
+            # У NullPool/StaticPool нет счетчиков очереди
+            if hasattr(pool, "checkedout"):
+                size.add_metric([name], pool.size())
+                checked_out.add_metric([name], pool.checkedout())
+                overflow.add_metric([name], max(pool.overflow(), 0))
+        yield size
+        yield checked_out
+        yield overflow
+
+        from .telegram_auth import auth_cache
+
+        stats = auth_cache.stats()
+        hits = CounterMetricFamily("auth_cache_hits", "Попадания в кэш авторизации")
+        hits.add_metric([], stats["hits"])
+        misses = CounterMetricFamily("auth_cache_misses", "Промахи кэша авторизации")
+        misses.add_metric([], stats["misses"])
+        entries = GaugeMetricFamily("auth_cache_size", "Записей в кэше авторизации")
+        entries.add_metric([], stats["size"])
+        yield hits
+        yield misses
+        yield entries
+
+        from .response_cache import response_cache
+
+        stats = response_cache.stats()
+        hits = CounterMetricFamily("response_cache_hits", "Попадания в кэш ответов каталога")
+        hits.add_metric([], stats["hits"])
+        misses = CounterMetricFamily("response_cache_misses", "Промахи кэша ответов каталога")
+        misses.add_metric([], stats["misses"])
+        entries = GaugeMetricFamily("response_cache_entries", "Записей в кэше ответов каталога")
+        entries.add_metric([], stats["entries"])
+        size = GaugeMetricFamily("response_cache_bytes", "Суммарный размер тел в кэше ответов")
+        size.add_metric([], stats["bytes"])
+        yield hits
+        yield misses
+        yield entries
+        yield size
+
+        from .broadcaster import listing_broadcaster
+
+        stats = listing_broadcaster.stats()
+        subscribers = GaugeMetricFamily("listing_stream_subscribers", "Подписчики SSE-ленты объявлений")
+        subscribers.add_metric([], stats["subscribers"])
+        events = CounterMetricFamily("listing_stream_events", "События, разосланные в ленту объявлений")
+        events.add_metric([], stats["events"])
+        dropped = CounterMetricFamily("listing_stream_dropped", "Подписчики, отключенные за переполнение буфера")
+        dropped.add_metric([], stats["dropped"])
+        yield subscribers
+        yield events
+        yield dropped
+
+runtime_collector = RuntimeCollector()
+REGISTRY.register(runtime_collector)
+
+# Время начала хранится в контексте выполнения запроса, а не в conn.info:
+# если запрос упадет, after_cursor_execute не вызовется, и контекст
+# уйдет вместе с ошибкой, ничего не оставив в соединении пула
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.metrics_query_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "metrics_query_start", None)
+    if started is None:
+        return
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "UNKNOWN"
+    DB_STATEMENT_LATENCY.labels(operation).observe(time.perf_counter() - started)
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    DB_POOL_CHECKOUTS.inc()
+
+def instrument_engine(engine: AsyncEngine, name: str = None) -> None:
+    """Подписывает метрики на события движка и его пула (имя - primary или replica)"""
+    sync_engine = engine.sync_engine
+    name = name or sync_engine.logging_name or "primary"
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(sync_engine.pool, "checkout", _on_checkout)
+    runtime_collector.engines[name] = engine
+
+def route_label(request: Request) -> str:
+    """Шаблон маршрута вместо фактического пути, чтобы не плодить метки"""
+    template = getattr(request.scope.get("route"), "path", None)
+    if template is None:
+        return "unmatched"
+    # В новых версиях FastAPI путь маршрута из include_router хранится без
+    # префикса, восстанавливаем его по фактическому пути запроса
+    path = request.scope["path"]
+    extra_segments = path.count("/") - template.count("/")
+    if extra_segments > 0:
+        template = "/".join(path.split("/")[:extra_segments + 1]) + template
+    return template
+
+async def metrics_middleware(request: Request, call_next):
+    """Считает запросы, их длительность и количество запросов в обработке"""
+    started = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        route = route_label(request)
+        REQUEST_LATENCY.labels(request.method, route).observe(time.perf_counter() - started)
+        REQUEST_COUNT.labels(request.method, route, str(status)).inc()
+
+def metrics_response() -> Response:
+    """Отдает все метрики в текстовом формате Prometheus"""
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
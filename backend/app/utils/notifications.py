@@ -0,0 +1,394 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..database.config import new_session
+from ..models.notification import Notification
+from ..models.outbox import OutboxEvent
+from ..models.user import User
+from .metrics import NOTIFICATIONS, NOTIFICATION_SEND_LATENCY
+from .outbox import DEAL_STATUS_CHANGED, REVIEW_CREATED
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+# Ограничение Telegram на длину текста сообщения
+MAX_MESSAGE_LENGTH = 4096
+
+STATUS_LABELS = {
+    "pending": "ожидает подтверждения",
+    "completed": "завершена",
+    "cancelled": "отменена",
+}
+
+async def notify_users(db: AsyncSession, user_ids: Iterable[int], text: str) -> None:
+    """
+    Ставит сообщение в очередь отправки для пользователей
+
+    Строки добавляются в текущую транзакцию: уведомление сохраняется
+    только вместе с изменением, о котором сообщает.
+    """
+    ids = {user_id for user_id in user_ids if user_id is not None}
+    if not ids:
+        return
+    result = await db.execute(select(User.telegram_id).where(User.id.in_(ids), User.telegram_id.isnot(None)))
+    now = datetime.utcnow()
+    db.add_all([
+        Notification(chat_id=chat_id, text=text, next_attempt_at=now)
+        for chat_id in result.scalars().all()
+    ])
+
+async def notify_outbox_event(db: AsyncSession, event: OutboxEvent) -> None:
+    """
+    Потребитель outbox: ставит уведомления участникам сделки
+
+    Уведомления пишутся в транзакцию, которая сдвигает позицию
+    потребителя, поэтому повторная доставка события их не задвоит.
+    """
+    payload = event.payload
+    if event.topic == DEAL_STATUS_CHANGED:
+        await notify_users(
+            db,
+            [payload["seller_id"], payload["buyer_id"]],
+            f"Сделка #{payload['deal_id']}: {STATUS_LABELS[payload['status']]}"
+        )
+    elif event.topic == REVIEW_CREATED:
+        await notify_users(
+            db,
+            [payload["seller_id"]],
+            f"Новый отзыв по сделке #{payload['deal_id']}: {payload['rating']}/5"
+        )
+
+def format_digest(texts: List[str]) -> str:
+    """Объединяет несколько событий одного чата в одно сообщение"""
+    if len(texts) == 1:
+        return texts[0]
+    return f"Обновления по вашим сделкам ({len(texts)}):\n" + "\n".join(f"• {text}" for text in texts)
+
+def take_digest(rows: List[Notification]) -> List[Notification]:
+    """Первые строки чата, дайджест которых укладывается в лимит длины сообщения"""
+    taken = rows[:1]
+    for row in rows[1:]:
+        if len(format_digest([item.text for item in taken + [row]])) > MAX_MESSAGE_LENGTH:
+            break
+        taken.append(row)
+    return taken
+
+class TokenBucket:
+    """
+    Token bucket с резервированием
+
+    take() сразу списывает токен и возвращает, сколько нужно подождать,
+    чтобы уложиться в лимит; баланс может уходить в минус.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= 1
+
+    def full(self) -> bool:
+        """Ведро полное: за последнее время токены не брались"""
+        self._refill(time.monotonic())
+        return self.tokens >= self.burst
+
+    def take(self) -> float:
+        self._refill(time.monotonic())
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def delay(self, seconds: float) -> None:
+        """Приостанавливает выдачу токенов (ответ 429 с retry_after)"""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+class SendResult:
+    """Итог отправки: sent, retry (с задержкой) или failed"""
+
+    def __init__(self, status: str, error: str = None, retry_after: float = None):
+        self.status = status
+        self.error = error
+        self.retry_after = retry_after
+
+class NotificationSender:
+    """
+    Фоновая отправка уведомлений из таблицы notifications
+
+    За проход выбирается пачка готовых сообщений, они группируются по
+    чату и уходят одним дайджестом на чат. Общий лимит и лимит на чат
+    соблюдаются token bucket'ами; чат без свободного токена пропускается
+    до следующего прохода. Перед отправкой сообщения захватываются
+    условным UPDATE (status=sending, locked_by, locked_until), поэтому
+    несколько процессов не отправят одно сообщение дважды. Временные
+    ошибки повторяются с экспоненциальной задержкой, 4xx кроме 429 -
+    окончательная ошибка. 429 с retry_after приостанавливает ведро чата,
+    а общее - только если чат не мог превысить свой лимит. Сообщение помечается отправленным только после
+    ответа Bot API; захват упавшего процесса истекает через NOTIFY_LEASE,
+    и неотправленное будет отправлено снова.
+    """
+
+    def __init__(
+        self,
+        session_factory=None,
+        client: Optional["httpx.AsyncClient"] = None,
+        api_url: str = None,
+        token: str = None,
+    ):
+        self.session_factory = session_factory or new_session
+        self.client = client
+        self.api_url = (api_url or settings.TELEGRAM_API_URL).rstrip("/")
+        self.token = token or settings.BOT_TOKEN
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.global_bucket = TokenBucket(settings.NOTIFY_GLOBAL_RATE, settings.NOTIFY_GLOBAL_RATE)
+        self.chat_buckets: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+        self._owns_client = client is None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Дает текущей пачке дойти и записать результат, затем останавливается"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            # Прерванные отправки возвращаются в очередь и уйдут повторно
+            await self._release_claims()
+        self._task = None
+        if self._owns_client and self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def wake(self) -> None:
+        """Будит отправщик сразу после коммита новых уведомлений"""
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                busy = await self.process_batch()
+            except Exception:
+                logger.exception("Notification batch failed")
+                busy = False
+            if busy or self._stopping:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.NOTIFY_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(settings.NOTIFY_CHAT_RATE, settings.NOTIFY_CHAT_BURST)
+            self.chat_buckets[chat_id] = bucket
+            # Полные ведра ничего не ограничивают, их можно забыть
+            while len(self.chat_buckets) > 10000:
+                stale_id, stale = next(iter(self.chat_buckets.items()))
+                if not stale.available():
+                    break
+                del self.chat_buckets[stale_id]
+        self.chat_buckets.move_to_end(chat_id)
+        return bucket
+
+    @staticmethod
+    def _ready(now: datetime):
+        """Сообщения, которые можно захватить: ожидающие и с истекшим захватом"""
+        return or_(
+            and_(Notification.status == "pending", Notification.next_attempt_at <= now),
+            and_(Notification.status == "sending", Notification.locked_until < now),
+        )
+
+    async def _claim(self) -> Tuple[int, List[Notification]]:
+        """
+        Захватывает дайджесты чатов со свободным токеном
+
+        Возвращает размер выборки готовых сообщений и захваченные строки:
+        сообщения, которые успел захватить другой процесс, в них не попадут.
+        """
+        now = datetime.utcnow()
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(Notification)
+                .where(self._ready(now))
+                .order_by(Notification.id)
+                .limit(settings.NOTIFY_BATCH_SIZE)
+            )
+            rows = result.scalars().all()
+            by_chat: Dict[int, List[Notification]] = OrderedDict()
+            for row in rows:
+                by_chat.setdefault(row.chat_id, []).append(row)
+            ids = [
+                row.id
+                for chat_id, chat_rows in by_chat.items()
+                if self._chat_bucket(chat_id).available()
+                for row in take_digest(chat_rows)
+            ]
+            if not ids:
+                return len(rows), []
+
+            await session.execute(
+                update(Notification)
+                .where(Notification.id.in_(ids), self._ready(now))
+                .values(
+                    status="sending",
+                    locked_by=self.owner,
+                    locked_until=now + timedelta(seconds=settings.NOTIFY_LEASE),
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            result = await session.execute(
+                select(Notification)
+                .where(
+                    Notification.id.in_(ids),
+                    Notification.status == "sending",
+                    Notification.locked_by == self.owner,
+                )
+                .order_by(Notification.id)
+            )
+            return len(rows), result.scalars().all()
+
+    async def process_batch(self) -> bool:
+        """Отправляет одну пачку; True, если готовых сообщений могло остаться больше"""
+        ready, claimed = await self._claim()
+        # Нет готовых сообщений или ни один чат не получил токен - ждем следующего прохода
+        if not claimed:
+            return False
+
+        by_chat: Dict[int, List[Notification]] = OrderedDict()
+        for row in claimed:
+            by_chat.setdefault(row.chat_id, []).append(row)
+        outcomes = await asyncio.gather(*[
+            self._send_digest(chat_id, self._chat_bucket(chat_id), chat_rows)
+            for chat_id, chat_rows in by_chat.items()
+        ])
+
+        async with self.session_factory() as session:
+            for chat_rows, outcome in outcomes:
+                await self._record(session, chat_rows, outcome)
+            await session.commit()
+        return ready == settings.NOTIFY_BATCH_SIZE
+
+    async def _release_claims(self) -> None:
+        """Возвращает в очередь сообщения, захваченные этим отправщиком"""
+        async with self.session_factory() as session:
+            await session.execute(
+                update(Notification)
+                .where(Notification.status == "sending", Notification.locked_by == self.owner)
+                .values(status="pending", locked_by=None, locked_until=None)
+            )
+            await session.commit()
+
+    async def _send_digest(self, chat_id: int, chat_bucket: TokenBucket, rows: List[Notification]):
+        wait = self.global_bucket.take()
+        if wait:
+            await asyncio.sleep(wait)
+        # Лимит чата можно превысить, только если чат недавно получал сообщения;
+        # 429 для чата с полным ведром - это общий лимит бота
+        chat_idle = chat_bucket.full()
+        # Токен чата берется в момент отправки, а не постановки в пачку
+        chat_bucket.take()
+        outcome = await self.send_message(chat_id, format_digest([row.text for row in rows]))
+        if outcome.retry_after is not None:
+            chat_bucket.delay(outcome.retry_after)
+            if chat_idle:
+                self.global_bucket.delay(outcome.retry_after)
+        return rows, outcome
+
+    async def send_message(self, chat_id: int, text: str) -> SendResult:
+        """Вызов sendMessage с разбором ответа Bot API"""
+        # httpx импортируется при первой отправке, а не на старте приложения
+        import httpx
+
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=10)
+        started = time.perf_counter()
+        try:
+            response = await self.client.post(
+                f"{self.api_url}/bot{self.token}/sendMessage",
+                json={"chat_id": chat_id, "text": text},
+            )
+        except httpx.HTTPError as e:
+            return SendResult("retry", error=f"{type(e).__name__}: {e}")
+        finally:
+            NOTIFICATION_SEND_LATENCY.observe(time.perf_counter() - started)
+
+        if response.status_code == 200:
+            return SendResult("sent")
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {}
+        error = f"{response.status_code}: {payload.get('description', response.text[:200])}"
+        if response.status_code == 429:
+            retry_after = float(payload.get("parameters", {}).get("retry_after", 1))
+            return SendResult("retry", error=error, retry_after=retry_after)
+        if response.status_code >= 500:
+            return SendResult("retry", error=error)
+        return SendResult("failed", error=error)
+
+    async def _record(self, session: AsyncSession, rows: List[Notification], outcome: SendResult) -> None:
+        """Сохраняет результат отправки для всех сообщений дайджеста"""
+        ids = [row.id for row in rows]
+        now = datetime.utcnow()
+        attempts = max(row.attempts for row in rows) + 1
+        if outcome.status == "sent":
+            label = "sent"
+            values = {"status": "sent", "sent_at": now, "attempts": attempts, "last_error": None}
+        elif outcome.status == "retry" and attempts < settings.NOTIFY_MAX_ATTEMPTS:
+            delay = outcome.retry_after
+            if delay is None:
+                delay = min(settings.NOTIFY_RETRY_BASE * 2 ** (attempts - 1), settings.NOTIFY_RETRY_MAX)
+                delay *= random.uniform(0.5, 1.0)
+            label = "retry"
+            values = {
+                "status": "pending",
+                "attempts": attempts,
+                "next_attempt_at": now + timedelta(seconds=delay),
+                "last_error": outcome.error,
+            }
+        else:
+            label = "failed"
+            values = {"status": "failed", "attempts": attempts, "last_error": outcome.error}
+            logger.warning("Notification to chat %s failed: %s", rows[0].chat_id, outcome.error)
+        NOTIFICATIONS.labels(label).inc(len(ids))
+        # Если захват истек и сообщения забрал другой процесс, итог пишет он
+        await session.execute(
+            update(Notification)
+            .where(Notification.id.in_(ids), Notification.locked_by == self.owner)
+            .values(locked_by=None, locked_until=None, **values)
+        )
+
+notification_sender = NotificationSender()
@@ -0,0 +1,379 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..database.config import new_session
+from ..models.outbox import OutboxCursor, OutboxEvent
+from .metrics import OUTBOX_DELIVERY_LAG, OUTBOX_EVENTS, OUTBOX_LAG_EVENTS, OUTBOX_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Темы событий
+DEAL_CREATED = "deal.created"
+DEAL_STATUS_CHANGED = "deal.status_changed"
+REVIEW_CREATED = "review.created"
+REVIEW_UPDATED = "review.updated"
+
+OutboxHandler = Callable[[AsyncSession, OutboxEvent], Awaitable[None]]
+
+def add_outbox_event(db: AsyncSession, topic: str, aggregate_id: int, payload: dict) -> None:
+    """
+    Добавляет событие в текущую транзакцию
+
+    Событие сохраняется только вместе с изменением, о котором сообщает,
+    и доставляется потребителям фоновым OutboxDispatcher после commit.
+    """
+    db.add(OutboxEvent(topic=topic, aggregate_id=aggregate_id, payload=payload))
+
+class DeliveryError(Exception):
+    """Обработчик потребителя упал на событии с индексом index в пачке"""
+
+    def __init__(self, index: int):
+        super().__init__(index)
+        self.index = index
+
+class Consumer:
+    """Зарегистрированный потребитель и его состояние в этом процессе"""
+
+    def __init__(self, name: str, handler: OutboxHandler, on_commit: Optional[Callable[[], None]]):
+        self.name = name
+        self.handler = handler
+        self.on_commit = on_commit
+        self.position = 0
+        self.lease_until: Optional[datetime] = None
+        self.failed_id: Optional[int] = None
+        self.attempts = 0
+        self.retry_at = 0.0
+
+class OutboxDispatcher:
+    """
+    Фоновая доставка событий outbox зарегистрированным потребителям
+
+    У каждого потребителя своя позиция (high-water mark) в outbox_cursors.
+    За проход потребитель получает пачку событий после своей позиции;
+    обработчики вызываются в одной транзакции, которая затем сдвигает
+    позицию условным UPDATE. Если процесс упадет до commit, пачка будет
+    доставлена снова (at-least-once); записи обработчика в ту же сессию
+    фиксируются ровно один раз вместе с позицией. Упавшее событие
+    повторяется с экспоненциальной задержкой и после OUTBOX_MAX_ATTEMPTS
+    пропускается с ошибкой в логе. Потребителя одновременно обрабатывает
+    один процесс - тот, у кого аренда.
+    """
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory or new_session
+        self.consumers: Dict[str, Consumer] = {}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+        self._pruned_at = 0.0
+
+    def register(self, name: str, handler: OutboxHandler, on_commit: Optional[Callable[[], None]] = None) -> None:
+        """Регистрирует потребителя; on_commit вызывается после фиксации каждой пачки"""
+        self.consumers[name] = Consumer(name, handler, on_commit)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Дает текущей пачке зафиксироваться и освобождает аренды"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._task = None
+        await self._release_leases()
+
+    def wake(self) -> None:
+        """Будит диспетчер сразу после коммита новых событий"""
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                busy = await self.process_once()
+            except Exception:
+                logger.exception("Outbox dispatch failed")
+                busy = False
+            if busy or self._stopping:
+                continue
+            # Не спим дольше, чем до ближайшего повтора упавшего потребителя
+            timeout = settings.OUTBOX_POLL_INTERVAL
+            now = asyncio.get_running_loop().time()
+            for consumer in self.consumers.values():
+                if consumer.retry_at > now:
+                    timeout = min(timeout, consumer.retry_at - now)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def process_once(self) -> bool:
+        """Один проход по всем потребителям; True, если у кого-то осталась очередь"""
+        busy = False
+        now = asyncio.get_running_loop().time()
+        for consumer in self.consumers.values():
+            if consumer.retry_at > now:
+                continue
+            busy |= await self.process_consumer(consumer)
+        if now - self._pruned_at >= settings.OUTBOX_PRUNE_INTERVAL:
+            self._pruned_at = now
+            removed = await self.prune()
+            if removed:
+                logger.info("Pruned %d delivered outbox events", removed)
+        return busy
+
+    async def _claim(self, consumer: Consumer) -> bool:
+        """
+        Берет или продлевает аренду потребителя
+
+        Пока больше половины аренды впереди, позиция берется из памяти
+        без записи в БД.
+        """
+        now = datetime.utcnow()
+        lease = timedelta(seconds=settings.OUTBOX_LEASE)
+        if consumer.lease_until is not None and consumer.lease_until - now > lease / 2:
+            return True
+
+        async with self.session_factory() as db:
+            exists = await db.scalar(select(OutboxCursor.id).where(OutboxCursor.consumer == consumer.name))
+            if exists is None:
+                db.add(OutboxCursor(consumer=consumer.name, position=0))
+                try:
+                    await db.commit()
+                except IntegrityError:
+                    await db.rollback()
+            result = await db.execute(
+                update(OutboxCursor)
+                .where(
+                    OutboxCursor.consumer == consumer.name,
+                    or_(
+                        OutboxCursor.locked_by == self.owner,
+                        OutboxCursor.locked_until.is_(None),
+                        OutboxCursor.locked_until < now,
+                    ),
+                )
+                .values(locked_by=self.owner, locked_until=now + lease)
+            )
+            if result.rowcount == 0:
+                await db.rollback()
+                consumer.lease_until = None
+                return False
+            consumer.position = await db.scalar(
+                select(OutboxCursor.position).where(OutboxCursor.consumer == consumer.name)
+            )
+            await db.commit()
+        consumer.lease_until = now + lease
+        return True
+
+    async def _release_leases(self) -> None:
+        async with self.session_factory() as db:
+            await db.execute(
+                update(OutboxCursor)
+                .where(OutboxCursor.locked_by == self.owner)
+                .values(locked_by=None, locked_until=None)
+            )
+            await db.commit()
+        for consumer in self.consumers.values():
+            consumer.lease_until = None
+
+    async def _fetch(self, position: int) -> List[OutboxEvent]:
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(OutboxEvent)
+                .where(OutboxEvent.id > position)
+                .order_by(OutboxEvent.id)
+                .limit(settings.OUTBOX_BATCH_SIZE)
+            )
+            return result.scalars().all()
+
+    def _contiguous(self, position: int, events: List[OutboxEvent]) -> List[OutboxEvent]:
+        """
+        Префикс пачки без пропусков в id
+
+        Пропуск значит, что транзакция с меньшим id еще не зафиксирована
+        (в PostgreSQL id выдаются до commit): позиция не должна ее
+        перепрыгнуть. Пропуск старше OUTBOX_GAP_TIMEOUT считается откатом.
+        """
+        horizon = datetime.utcnow() - timedelta(seconds=settings.OUTBOX_GAP_TIMEOUT)
+        expected = position + 1
+        deliverable = []
+        for event in events:
+            if event.id != expected and event.created_at > horizon:
+                break
+            deliverable.append(event)
+            expected = event.id + 1
+        return deliverable
+
+    async def _commit(self, consumer: Consumer, events: List[OutboxEvent], handle: bool = True) -> bool:
+        """
+        Вызывает обработчик для events и сдвигает позицию в одной транзакции
+
+        False, если позицию тем временем сдвинул другой процесс (аренда
+        истекла): транзакция откатывается вместе с записями обработчика.
+        """
+        async with self.session_factory() as db:
+            if handle:
+                for index, event in enumerate(events):
+                    try:
+                        await consumer.handler(db, event)
+                    except Exception as e:
+                        raise DeliveryError(index) from e
+            result = await db.execute(
+                update(OutboxCursor)
+                .where(OutboxCursor.consumer == consumer.name, OutboxCursor.position == consumer.position)
+                .values(position=events[-1].id)
+            )
+            if result.rowcount == 0:
+                await db.rollback()
+                consumer.lease_until = None
+                return False
+            await db.commit()
+        consumer.position = events[-1].id
+        if consumer.on_commit is not None:
+            consumer.on_commit()
+        return True
+
+    async def process_consumer(self, consumer: Consumer) -> bool:
+        """Доставляет потребителю одну пачку; True, если за ней есть еще события"""
+        if not await self._claim(consumer):
+            return False
+        events = await self._fetch(consumer.position)
+        deliverable = self._contiguous(consumer.position, events)
+        delivered = 0
+        if deliverable:
+            try:
+                if await self._commit(consumer, deliverable):
+                    delivered = len(deliverable)
+                    self._observe_delivery(consumer, deliverable, "delivered")
+            except DeliveryError as e:
+                delivered = await self._handle_failure(consumer, deliverable, e)
+        await self._report_lag(consumer, events, delivered)
+        return delivered > 0 and len(events) == settings.OUTBOX_BATCH_SIZE
+
+    async def _handle_failure(self, consumer: Consumer, events: List[OutboxEvent], error: DeliveryError) -> int:
+        """Фиксирует события до упавшего и планирует повтор; возвращает число доставленных"""
+        delivered = 0
+        if error.index:
+            retry_error = None
+            try:
+                committed = await self._commit(consumer, events[:error.index])
+            except DeliveryError as e:
+                retry_error = e
+            if retry_error is not None:
+                # Повторный вызов обработчика упал раньше - это и есть упавшее событие
+                return await self._handle_failure(consumer, events[:error.index], retry_error)
+            if not committed:
+                return 0
+            delivered = error.index
+            self._observe_delivery(consumer, events[:delivered], "delivered")
+
+        failed = events[error.index]
+        if consumer.failed_id == failed.id:
+            consumer.attempts += 1
+        else:
+            consumer.failed_id = failed.id
+            consumer.attempts = 1
+
+        if consumer.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            logger.error(
+                "Outbox consumer %s skipped event %d (%s) after %d attempts",
+                consumer.name, failed.id, failed.topic, consumer.attempts, exc_info=error.__cause__,
+            )
+            if await self._commit(consumer, [failed], handle=False):
+                delivered += 1
+                self._observe_delivery(consumer, [failed], "skipped")
+            consumer.failed_id = None
+            consumer.attempts = 0
+            return delivered
+
+        delay = min(settings.OUTBOX_RETRY_BASE * 2 ** (consumer.attempts - 1), settings.OUTBOX_RETRY_MAX)
+        consumer.retry_at = asyncio.get_running_loop().time() + delay * random.uniform(0.5, 1.0)
+        OUTBOX_EVENTS.labels(consumer.name, "retry").inc()
+        logger.warning(
+            "Outbox consumer %s failed on event %d (%s), attempt %d",
+            consumer.name, failed.id, failed.topic, consumer.attempts, exc_info=error.__cause__,
+        )
+        return delivered
+
+    def _observe_delivery(self, consumer: Consumer, events: List[OutboxEvent], result: str) -> None:
+        OUTBOX_EVENTS.labels(consumer.name, result).inc(len(events))
+        now = datetime.utcnow()
+        histogram = OUTBOX_DELIVERY_LAG.labels(consumer.name)
+        for event in events:
+            histogram.observe((now - event.created_at).total_seconds())
+
+    async def _report_lag(self, consumer: Consumer, events: List[OutboxEvent], delivered: int) -> None:
+        """Отставание потребителя: число недоставленных событий и возраст самого старого"""
+        remaining = events[delivered:]
+        if len(events) == settings.OUTBOX_BATCH_SIZE:
+            async with self.session_factory() as db:
+                last_id = await db.scalar(select(func.max(OutboxEvent.id)))
+            OUTBOX_LAG_EVENTS.labels(consumer.name).set((last_id or 0) - consumer.position)
+        else:
+            OUTBOX_LAG_EVENTS.labels(consumer.name).set(len(remaining))
+        oldest = (datetime.utcnow() - remaining[0].created_at).total_seconds() if remaining else 0
+        OUTBOX_LAG_SECONDS.labels(consumer.name).set(oldest)
+
+    async def prune(self) -> int:
+        """
+        Удаляет события, доставленные всем потребителям и старше OUTBOX_RETENTION
+
+        Удаление идет пачками по OUTBOX_PRUNE_BATCH; возвращает число строк.
+        """
+        if not self.consumers:
+            return 0
+        async with self.session_factory() as db:
+            low_water = await db.scalar(
+                select(func.min(OutboxCursor.position))
+                .where(OutboxCursor.consumer.in_(list(self.consumers)))
+            )
+            registered = await db.scalar(
+                select(func.count()).select_from(OutboxCursor)
+                .where(OutboxCursor.consumer.in_(list(self.consumers)))
+            )
+        # Потребитель без курсора еще ничего не получил
+        if low_water is None or registered < len(self.consumers):
+            return 0
+
+        horizon = datetime.utcnow() - timedelta(seconds=settings.OUTBOX_RETENTION)
+        removed = 0
+        while True:
+            async with self.session_factory() as db:
+                expired = (
+                    select(OutboxEvent.id)
+                    .where(OutboxEvent.id <= low_water, OutboxEvent.created_at < horizon)
+                    .order_by(OutboxEvent.id)
+                    .limit(settings.OUTBOX_PRUNE_BATCH)
+                    .scalar_subquery()
+                )
+                result = await db.execute(
+                    delete(OutboxEvent)
+                    .where(OutboxEvent.id.in_(expired))
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+            removed += result.rowcount
+            if result.rowcount < settings.OUTBOX_PRUNE_BATCH:
+                return removed
+            await asyncio.sleep(0)
+
+outbox_dispatcher = OutboxDispatcher()
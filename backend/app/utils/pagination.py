@@ -0,0 +1,62 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+
+# Заголовок, в котором возвращается курсор следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    """Кодирует позицию (created_at, id) в непрозрачный курсор"""
+    raw = json.dumps([created_at.isoformat(), id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Декодирует курсор обратно в позицию (created_at, id)
+
+    Raises:
+        HTTPException: если курсор поврежден
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(query, model, skip: int, limit: int, cursor: Optional[str] = None):
+    """
+    Применяет к запросу постраничную выборку
+
+    В режиме курсора используется keyset-условие по (created_at, id),
+    которое обслуживается составным индексом, поэтому стоимость любой
+    страницы не зависит от ее номера. Без курсора работает старый режим
+    offset/limit.
+
+    Оба режима идут по возрастанию (created_at, id): для строк,
+    записанных приложением, это тот же порядок вставки (по id), в
+    котором списки отдавались до появления курсоров, а курсор с
+    offset-страницы продолжает ее без пропусков.
+    """
+    query = query.order_by(model.created_at.asc(), model.id.asc())
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        query = query.where(tuple_(model.created_at, model.id) > (created_at, id))
+    else:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+
+def next_cursor(items: Sequence, limit: int) -> Optional[str]:
+    """Возвращает курсор следующей страницы, если текущая заполнена целиком"""
+    if limit <= 0 or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(last.created_at, last.id)
@@ -0,0 +1,106 @@
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+class QueryStats:
+    """Количество и суммарное время SQL-запросов в пределах запроса или теста"""
+
+    def __init__(self, parent: Optional["QueryStats"] = None):
+        self.parent = parent
+        self.count = 0
+        self.total_time = 0.0
+        self.statements: Counter = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.total_time += duration
+        self.statements[statement] += 1
+        if self.parent is not None:
+            self.parent.record(statement, duration)
+
+    def repeated(self, threshold: int = None) -> List[Tuple[str, int]]:
+        """Одинаковые запросы, повторенные не меньше threshold раз (вероятный N+1)"""
+        threshold = threshold or settings.N_PLUS_ONE_THRESHOLD
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+# Как и в метриках, время начала хранится в контексте выполнения, чтобы
+# упавшие запросы ничего не оставляли в conn.info
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current_stats.get() is not None:
+        context.query_counter_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    started = getattr(context, "query_counter_start", None)
+    if stats is not None and started is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+def install_query_counter(engine: AsyncEngine) -> None:
+    """Подписывает счетчик запросов на события движка"""
+    sync_engine = engine.sync_engine
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Считает SQL-запросы, выполненные внутри блока, включая запросы обработчиков"""
+    stats = QueryStats(parent=_current_stats.get())
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+@contextmanager
+def assert_max_queries(limit: int) -> Iterator[QueryStats]:
+    """
+    Хелпер для тестов: проверяет бюджет SQL-запросов на эндпоинт
+
+    Работает с запросами через httpx.AsyncClient и ASGI-транспорт,
+    которые выполняются в том же event loop:
+
+        with assert_max_queries(2):
+            await client.get("/api/v1/deals/1")
+    """
+    with track_queries() as stats:
+        yield stats
+    if stats.count > limit:
+        statements = "\n".join(f"  {n}x {sql}" for sql, n in stats.statements.most_common())
+        raise AssertionError(f"Expected at most {limit} SQL queries, got {stats.count}:\n{statements}")
+
+async def query_counter_middleware(request: Request, call_next):
+    """
+    Считает SQL-запросы каждого HTTP-запроса при включенном DEBUG_SQL
+
+    Возвращает количество и время запросов в заголовках и пишет
+    предупреждение, если одинаковый запрос повторился N_PLUS_ONE_THRESHOLD
+    и более раз.
+    """
+    if not settings.DEBUG_SQL:
+        return await call_next(request)
+
+    with track_queries() as stats:
+        response = await call_next(request)
+
+    repeated = stats.repeated()
+    response.headers["X-DB-Query-Count"] = str(stats.count)
+    response.headers["X-DB-Time-Ms"] = f"{stats.total_time * 1000:.2f}"
+    if repeated:
+        response.headers["X-DB-Repeated-Queries"] = str(len(repeated))
+        for sql, n in repeated:
+            logger.warning("Possible N+1 on %s %s: %dx %s", request.method, request.url.path, n, sql)
+    return response
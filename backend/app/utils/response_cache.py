@@ -0,0 +1,142 @@
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set
+from urllib.parse import urlencode
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from ..config import settings
+
+# Теги инвалидации
+ACCOUNTS_LIST_TAG = "accounts:list"
+ACCOUNTS_SEARCH_TAG = "accounts:search"
+
+def account_tag(account_id: int) -> str:
+    """Тег всех закэшированных ответов, в которых есть аккаунт"""
+    return f"account:{account_id}"
+
+class CachedResponse:
+    """Готовое тело JSON-ответа со строгим ETag"""
+
+    __slots__ = ("body", "etag", "headers", "tags")
+
+    def __init__(self, body: bytes, headers: Dict[str, str], tags: Set[str]):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.headers = headers
+        self.tags = tags
+
+    def to_response(self, request: Request, cache_status: str) -> Response:
+        """Возвращает 304, если клиент прислал совпадающий If-None-Match, иначе тело"""
+        headers = {
+            **self.headers,
+            "ETag": self.etag,
+            "Cache-Control": "no-cache",
+            "X-Cache": cache_status,
+        }
+        if etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type="application/json", headers=headers)
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Сравнение ETag для If-None-Match (слабое, как требует RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (value.strip() for value in if_none_match.split(","))
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+class ResponseCache:
+    """
+    In-process LRU-кэш JSON-ответов с инвалидацией по тегам
+
+    Ограничен и числом записей, и суммарным размером тел. Каждая
+    инвалидация увеличивает generation: ответ, собранный до нее, в кэш
+    не попадет, чтобы запись, выполненная параллельно с чтением, не
+    оставила в кэше устаревшие данные.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._tags: Dict[str, Set[str]] = {}
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(
+        self,
+        key: str,
+        payload,
+        tags: Iterable[str],
+        generation: int,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> CachedResponse:
+        """Сериализует payload и сохраняет его, если с начала чтения не было инвалидаций"""
+        body = json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")).encode()
+        entry = CachedResponse(body, headers or {}, set(tags))
+        if generation != self.generation or len(body) > self.max_bytes:
+            return entry
+
+        self._remove(key)
+        self._entries[key] = entry
+        self._size += len(body)
+        for tag in entry.tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+        return entry
+
+    def invalidate(self, *tags: str) -> None:
+        """Удаляет все ответы, помеченные любым из тегов"""
+        self.generation += 1
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+        self._tags.clear()
+        self._size = 0
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._size -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_MAX_BYTES)
+
+def cache_key(request: Request) -> str:
+    """Ключ кэша: путь и отсортированные параметры запроса"""
+    query = urlencode(sorted(request.query_params.multi_items()))
+    return f"{request.url.path}?{query}"
@@ -0,0 +1,22 @@
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import Receive, Scope, Send
+
+# Долгоживущие потоки (SSE), которые не проходят через HTTP-middleware
+STREAM_PATHS = {"/api/v1/accounts/stream"}
+
+class StreamBypassMiddleware(BaseHTTPMiddleware):
+    """
+    То же, что app.middleware("http"), но STREAM_PATHS идут мимо dispatch
+
+    Каждый слой BaseHTTPMiddleware держит на открытый ответ отдельную
+    задачу и канал сообщений. Для обычных запросов это незаметно, а для
+    десятков тысяч простаивающих SSE-подписчиков - четыре лишние задачи
+    и десятки килобайт на соединение. Авторизация для потоков проверяется
+    зависимостью маршрута.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"] in STREAM_PATHS:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
@@ -1,12 +1,13 @@
 import hashlib
 import hmac
+import json
 import time
-from typing import Dict
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
 from fastapi import HTTPException, Request
 from dotenv import load_dotenv
 import os
 from ..config import settings
-from jose import jwt
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -16,60 +17,136 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN not set in environment variables")
 
+# Secret key вычисляется один раз при запуске, а не на каждый запрос
+SECRET_KEY = hashlib.sha256(BOT_TOKEN.encode()).digest()
+
+# Данные авторизации действительны в течение суток
+AUTH_MAX_AGE = 86400
+
+class InitDataCache:
+    """
+    Ограниченный LRU-кэш проверенных данных авторизации
+
+    Ключ - сырое значение заголовка, значение - разобранные данные.
+    Запись живет не дольше ttl секунд и не дольше, чем действительны
+    сами данные (auth_date + AUTH_MAX_AGE).
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Возвращает данные из кэша или None, если записи нет или она устарела"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: str, data: Dict) -> None:
+        """Сохраняет проверенные данные, вытесняя самые старые записи"""
+        expires_at = min(time.time() + self.ttl, int(data["auth_date"]) + AUTH_MAX_AGE)
+        self._entries[key] = (expires_at, data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Очищает кэш и счетчики"""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict:
+        """Счетчики попаданий и промахов"""
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+auth_cache = InitDataCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)
+
 def verify_telegram_data(data: Dict) -> bool:
     """
     Проверяет данные авторизации от Telegram
-    
+
     Args:
         data: Словарь с данными от Telegram Web App
-        
+
     Returns:
         bool: True если данные верны, иначе False
     """
     if not all(key in data for key in ["hash", "auth_date"]):
         return False
-    
+
     # Проверяем актуальность данных (не старше 24 часов)
     auth_date = int(data["auth_date"])
-    if time.time() - auth_date > 86400:
+    if time.time() - auth_date > AUTH_MAX_AGE:
         return False
-    
+
     # Получаем хеш от Telegram
     received_hash = data.pop("hash")
-    
+
     # Создаем строку для проверки
     check_string = "\n".join(f"{k}={v}" for k, v in sorted(data.items()))
-    
-    # Создаем secret key из токена бота
-    secret = hashlib.sha256(BOT_TOKEN.encode()).digest()
-    
+
     # Вычисляем хеш
     computed_hash = hmac.new(
-        secret,
+        SECRET_KEY,
         check_string.encode(),
         hashlib.sha256
     ).hexdigest()
-    
-    return computed_hash == received_hash
+
+    return hmac.compare_digest(computed_hash, received_hash)
+
+def telegram_user_id(request: Request) -> Optional[int]:
+    """ID пользователя Telegram из проверенных данных авторизации запроса"""
+    data = getattr(request.state, "telegram_data", None)
+    if not data or data.get("id") is None:
+        return None
+    return int(data["id"])
+
+def client_key(request: Request) -> Optional[str]:
+    """Ключ клиента: пользователь Telegram, без авторизации (разработка) - IP"""
+    user_id = telegram_user_id(request)
+    if user_id is not None:
+        return f"user:{user_id}"
+    if request.client is not None:
+        return f"ip:{request.client.host}"
+    return None
 
 async def verify_telegram_auth(request: Request):
     """
     Middleware для проверки Telegram авторизации
-    
+
+    Повторные запросы с теми же данными авторизации обслуживаются
+    из auth_cache без разбора JSON и вычисления HMAC.
+
     Args:
         request: FastAPI Request объект
-        
+
     Raises:
         HTTPException: если авторизация не прошла
     """
     # В режиме разработки пропускаем проверку
     if settings.ENV == "development":
         return
-    
+
     # Пропускаем некоторые эндпоинты без авторизации
-    if request.url.path in ["/", "/docs", "/redoc", "/openapi.json"]:
+    if request.url.path in ["/", "/docs", "/redoc", "/openapi.json", "/metrics"]:
         return
-    
+
     # Получаем данные авторизации из заголовка
     auth_data = request.headers.get("X-Telegram-Auth-Data")
     if not auth_data:
@@ -77,21 +154,28 @@ async def verify_telegram_auth(request: Request):
             status_code=401,
             detail="No Telegram authentication data provided"
         )
-    
+
+    data = auth_cache.get(auth_data)
+    if data is not None:
+        request.state.telegram_data = data
+        return
+
     try:
         # Парсим данные
-        import json
         data = json.loads(auth_data)
-        
+
         # Проверяем данные
         if not verify_telegram_data(data):
             raise HTTPException(
                 status_code=401,
                 detail="Invalid Telegram authentication data"
             )
-            
+
     except Exception as e:
         raise HTTPException(
             status_code=401,
             detail=f"Authentication error: {str(e)}"
-        ) 
\ No newline at end of file
+        )
+
+    auth_cache.set(auth_data, data)
+    request.state.telegram_data = data
@@ -0,0 +1 @@
+"""Бенчмарки и нагрузочные сценарии TrustyTrade (запуск: python -m benchmarks.<name> из backend/)"""
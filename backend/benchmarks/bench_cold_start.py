@@ -0,0 +1,162 @@
+"""
+Время холодного старта API и бота
+
+    python -m benchmarks.bench_cold_start --runs 5
+
+Каждый прогон - новый процесс Python, как при холодном старте
+serverless-функции. Внутри процесса замеряется время от начала импорта
+до первого ответа:
+
+- api: импорт app.main, startup через ASGI lifespan и GET /;
+- bot: импорт bot и GET /api/health через тестовый клиент Flask.
+
+Время запуска самого интерпретатора в замер не входит, оно выводится
+отдельно как process_ms. Результат - медиана и максимум по фазам и
+сравнение медианы total_ms с целевым значением --target-ms.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+API_CHILD = '''
+import time
+started = time.perf_counter()
+import asyncio
+import json
+from app.main import app
+imported = time.perf_counter()
+
+async def main():
+    messages = asyncio.Queue()
+    await messages.put({"type": "lifespan.startup"})
+    started_up = asyncio.Event()
+    failures = []
+
+    async def lifespan_send(message):
+        if message["type"] == "lifespan.startup.failed":
+            failures.append(message.get("message"))
+        if message["type"].startswith("lifespan.startup."):
+            started_up.set()
+
+    lifespan = asyncio.create_task(app({"type": "lifespan", "asgi": {"version": "3.0"}}, messages.get, lifespan_send))
+    waiter = asyncio.create_task(started_up.wait())
+    await asyncio.wait([lifespan, waiter], return_when=asyncio.FIRST_COMPLETED)
+    if lifespan.done():
+        lifespan.result()
+    if failures:
+        raise RuntimeError(f"startup failed: {failures[0]}")
+    ready = time.perf_counter()
+
+    status = []
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/", "raw_path": b"/", "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    await app(scope, receive, send)
+    responded = time.perf_counter()
+
+    await messages.put({"type": "lifespan.shutdown"})
+    await lifespan
+    return ready, responded, status[0]
+
+ready, responded, status = asyncio.run(main())
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "first_response_ms": (responded - ready) * 1000,
+    "total_ms": (responded - started) * 1000,
+    "status": status,
+}))
+'''
+
+BOT_CHILD = '''
+import time
+started = time.perf_counter()
+import json
+import bot
+imported = time.perf_counter()
+response = bot.app.test_client().get("/api/health")
+responded = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": 0.0,
+    "first_response_ms": (responded - imported) * 1000,
+    "total_ms": (responded - started) * 1000,
+    "status": response.status_code,
+}))
+'''
+
+TARGETS = {"api": API_CHILD, "bot": BOT_CHILD}
+
+
+def run_child(code: str, env: dict) -> dict:
+    """Запускает новый процесс и возвращает его замеры"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", code],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=False,
+    )
+    elapsed = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "child failed")
+    # Последняя строка stdout - замеры, выше может быть вывод логов
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample["process_ms"] = elapsed
+    return sample
+
+
+def summarize(samples: list) -> dict:
+    phases = ["import_ms", "startup_ms", "first_response_ms", "total_ms", "process_ms"]
+    return {
+        phase: {
+            "median": round(statistics.median(sample[phase] for sample in samples), 1),
+            "max": round(max(sample[phase] for sample in samples), 1),
+        }
+        for phase in phases
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target", choices=list(TARGETS), action="append")
+    parser.add_argument("--target-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="trustytrade-bench-")
+    env = dict(
+        os.environ,
+        ENV="production",
+        DATABASE_URL=f"sqlite+aiosqlite:///{workdir}/cold-start.db",
+        USER_STORE_PATH=f"{workdir}/bot_user_data.db",
+        BOT_TOKEN=os.environ.get("BOT_TOKEN", "123456:cold-start-benchmark"),
+    )
+
+    report = {"runs": args.runs, "target_ms": args.target_ms}
+    for name in args.target or list(TARGETS):
+        samples = [run_child(TARGETS[name], env) for _ in range(args.runs)]
+        summary = summarize(samples)
+        summary["statuses"] = sorted({sample["status"] for sample in samples})
+        summary["meets_target"] = summary["total_ms"]["median"] <= args.target_ms
+        report[name] = summary
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Архивация завершенных сделок: размер горячих таблиц и задержка чтения
+
+    python -m benchmarks.bench_deal_archive --deals 200000 --pending-share 0.05
+
+Заполняет deals и reviews напрямую: --pending-share сделок в работе,
+остальные завершены или отменены (у завершенных есть отзыв), старые -
+с updated_at старше DEAL_ARCHIVE_AFTER_DAYS. До и после архивации
+замеряются размер таблиц и индексов deals/reviews (dbstat) и задержка
+GET /api/v1/deals/?status=pending и ?status=completed.
+
+Проверяется, что сделки не теряются и не дублируются, что
+include_archived=true отдает те же страницы (keyset и offset), что и
+до архивации, и что пересчет рейтингов дает те же агрегаты.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from .common import init_app_schema, percentiles, prepare_app_env
+
+
+async def main(args) -> int:
+    prepare_app_env(args.profile)
+
+    import httpx
+    from sqlalchemy import func, insert, select, text
+    from app.config import settings
+    from app.database.archive import archive_finished_deals
+    from app.database.config import new_session
+    from app.database.ratings import rebuild_seller_ratings
+    from app.main import app
+    from app.models.deal import ArchivedDeal, Deal, Review
+    from app.models.user import User
+    from app.schemas.deal import DealStatus
+
+    await init_app_schema()
+    rng = random.Random(1)
+    now = datetime.utcnow()
+    old = now - timedelta(days=settings.DEAL_ARCHIVE_AFTER_DAYS + 30)
+    async with new_session() as db:
+        await db.execute(insert(User), [{"telegram_id": i, "username": f"user{i}"} for i in range(1, 101)])
+        deals, reviews = [], []
+        for i in range(1, args.deals + 1):
+            created = old - timedelta(seconds=args.deals - i) if i <= args.deals * 0.9 else now - timedelta(seconds=args.deals - i)
+            if rng.random() < args.pending_share:
+                status = DealStatus.PENDING
+            else:
+                status = rng.choice([DealStatus.COMPLETED, DealStatus.CANCELLED])
+            deals.append({
+                "id": i, "seller_id": rng.randint(1, 100), "buyer_id": rng.randint(1, 100), "account_id": i,
+                "status": status, "version": 1 if status == DealStatus.PENDING else 2,
+                "created_at": created, "updated_at": created,
+            })
+            if status == DealStatus.COMPLETED:
+                reviews.append({"deal_id": i, "rating": rng.randint(1, 5), "created_at": created, "updated_at": created})
+        for start in range(0, len(deals), 5000):
+            await db.execute(insert(Deal), deals[start:start + 5000])
+        for start in range(0, len(reviews), 5000):
+            await db.execute(insert(Review), reviews[start:start + 5000])
+        await db.commit()
+        await rebuild_seller_ratings(db)
+        ratings_before = (await db.execute(select(User.id, User.review_count, User.rating_sum).order_by(User.id))).all()
+
+    async def table_sizes() -> dict:
+        async with new_session() as db:
+            result = await db.execute(text(
+                "SELECT name, SUM(pgsize) FROM dbstat WHERE name LIKE '%deals%' OR name LIKE '%reviews%' GROUP BY name"
+            ))
+            sizes = dict(result.all())
+        hot = {name: size for name, size in sizes.items() if "archive" not in name}
+        return {"hot_kb": round(sum(hot.values()) / 1024), "all_kb": round(sum(sizes.values()) / 1024)}
+
+    async def read_latency(client, status: str) -> dict:
+        samples = []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            response = await client.get("/api/v1/deals/", params={"status": status, "limit": 50, "expand": "review"})
+            samples.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.text
+        return percentiles(samples)
+
+    async def walk(client, params: dict, pages: int) -> list:
+        """id сделок с первых pages страниц по курсору и с offset-страниц"""
+        ids, cursor = [], None
+        for _ in range(pages):
+            response = await client.get("/api/v1/deals/", params={**params, "limit": 100, **({"cursor": cursor} if cursor else {})})
+            ids.extend(deal["id"] for deal in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        for skip in (0, 250, 5000):
+            response = await client.get("/api/v1/deals/", params={**params, "limit": 100, "skip": skip})
+            ids.extend(deal["id"] for deal in response.json())
+        return ids
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        before_sizes = await table_sizes()
+        before_pending = await read_latency(client, "pending")
+        before_completed = await read_latency(client, "completed")
+        before_pages = [await walk(client, params, args.pages) for params in ({}, {"status": "completed"})]
+
+        async with new_session() as db:
+            started = time.perf_counter()
+            archived = await archive_finished_deals(db)
+            archive_elapsed = time.perf_counter() - started
+            await db.execute(text("VACUUM"))
+
+        after_sizes = await table_sizes()
+        after_pending = await read_latency(client, "pending")
+        after_pages = [
+            await walk(client, {**params, "include_archived": "true"}, args.pages)
+            for params in ({}, {"status": "completed"})
+        ]
+        sample = deals[0]["id"]
+        archived_read = await client.get(f"/api/v1/deals/{sample}", params={"include_archived": "true", "expand": "review"})
+        hidden_read = await client.get(f"/api/v1/deals/{sample}")
+
+    async with new_session() as db:
+        hot = await db.scalar(select(func.count()).select_from(Deal))
+        cold = await db.scalar(select(func.count()).select_from(ArchivedDeal))
+        overlap = await db.scalar(select(func.count()).select_from(Deal).where(Deal.id.in_(select(ArchivedDeal.id))))
+        await rebuild_seller_ratings(db)
+        ratings_after = (await db.execute(select(User.id, User.review_count, User.rating_sum).order_by(User.id))).all()
+
+    ok = (
+        hot + cold == args.deals and not overlap and before_pages == after_pages
+        and ratings_before == ratings_after and archived_read.status_code == 200
+        and "archived_at" in archived_read.json() and hidden_read.status_code == 404
+    )
+    report = {
+        "deals": args.deals,
+        "archived": archived,
+        "archive_sec": round(archive_elapsed, 2),
+        "hot_deals": hot,
+        "tables_before": before_sizes,
+        "tables_after": after_sizes,
+        "pending_read_ms": {"before": before_pending, "after": after_pending},
+        "completed_read_ms_before": before_completed,
+        "pages_match": before_pages == after_pages,
+        "ratings_match": ratings_before == ratings_after,
+        "ok": ok,
+    }
+    print(json.dumps(report, indent=2))
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deals", type=int, default=200000)
+    parser.add_argument("--pending-share", type=float, default=0.05)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--profile", default="production")
+    sys.exit(asyncio.run(main(parser.parse_args())))
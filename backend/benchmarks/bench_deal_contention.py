@@ -0,0 +1,109 @@
+"""
+Конкурентная смена статуса сделки покупателем и продавцом
+
+    python -m benchmarks.bench_deal_contention --deals 50 --actors 20
+
+Для каждой сделки одновременно отправляется --actors запросов
+PUT /api/v1/deals/{id}: половина пытается завершить сделку, половина -
+отменить, все с версией, прочитанной до начала гонки. Проверяется, что
+для каждой сделки выигрывает ровно один переход: запросы с тем же
+статусом, что у победителя, считаются повтором и получают 200 с
+итоговой сделкой, запросы с другим статусом - 409, а доступность
+аккаунта соответствует итоговому статусу (отмененная сделка возвращает
+аккаунт в продажу). Результат - JSON с пропускной
+способностью и задержками; код выхода 1, если инвариант нарушен.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from .common import init_app_schema, percentiles, prepare_app_env
+
+
+async def main(args) -> int:
+    prepare_app_env(args.profile)
+
+    import httpx
+    from sqlalchemy import select
+    from app.database.config import new_session
+    from app.main import app
+    from app.models.account import Account
+
+    await init_app_schema()
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        seller = (await client.post("/api/v1/users/", json={"telegram_id": 1, "username": "seller"})).json()
+        buyer = (await client.post("/api/v1/users/", json={"telegram_id": 2, "username": "buyer"})).json()
+        deals = []
+        for i in range(args.deals):
+            account = (await client.post("/api/v1/accounts/", json={
+                "user_id": seller["id"], "game": "Dota 2", "price": 1000 + i,
+            })).json()
+            deals.append((await client.post("/api/v1/deals/", json={
+                "seller_id": seller["id"], "buyer_id": buyer["id"], "account_id": account["id"],
+            })).json())
+
+        latencies = []
+        statuses = {}
+
+        async def act(deal: dict, status: str) -> tuple:
+            started = time.perf_counter()
+            response = await client.put(f"/api/v1/deals/{deal['id']}", json={
+                "status": status, "version": deal["version"],
+            })
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            return status, response.status_code, response.json()
+
+        started = time.perf_counter()
+        rounds = await asyncio.gather(*[
+            asyncio.gather(*[
+                act(deal, "completed" if i % 2 else "cancelled") for i in range(args.actors)
+            ])
+            for deal in deals
+        ])
+        elapsed = time.perf_counter() - started
+
+        inconsistent = []
+        outcomes = []
+        async with new_session() as session:
+            for deal, results in zip(deals, rounds):
+                final = (await client.get(f"/api/v1/deals/{deal['id']}")).json()
+                # Ровно один исход: все 200 - это итоговая сделка, все запросы
+                # с другим статусом отклонены
+                outcomes.append(all(
+                    (code == 200 and body == final) if status == final["status"] else code == 409
+                    for status, code, body in results
+                ))
+                # Доступность аккаунта не входит в ответ API, читаем ее из БД
+                is_available = await session.scalar(
+                    select(Account.is_available).where(Account.id == deal["account_id"])
+                )
+                if final["version"] != deal["version"] + 1 or is_available != (final["status"] == "cancelled"):
+                    inconsistent.append(deal["id"])
+
+    report = {
+        "profile": args.profile,
+        "deals": args.deals,
+        "actors_per_deal": args.actors,
+        "exactly_one_outcome": all(outcomes),
+        "losers_got_409": all(code in (200, 409) for results in rounds for _, code, _ in results),
+        "inconsistent_deals": inconsistent,
+        "statuses": statuses,
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "latency_ms": percentiles(latencies),
+    }
+    print(json.dumps(report, indent=2))
+    ok = report["exactly_one_outcome"] and report["losers_got_409"] and not inconsistent
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deals", type=int, default=50)
+    parser.add_argument("--actors", type=int, default=20)
+    parser.add_argument("--profile", default="production")
+    sys.exit(asyncio.run(main(parser.parse_args())))
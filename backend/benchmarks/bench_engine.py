@@ -0,0 +1,117 @@
+"""
+Сравнение профилей движка БД на смешанной нагрузке чтения/записи
+
+    python -m benchmarks.bench_engine --workers 32 --duration 5 --write-ratio 0.2
+
+Для каждого профиля (development, production) создается отдельный
+SQLite-файл, заполняется аккаунтами, после чего воркеры в течение
+заданного времени выполняют чтения и записи, каждую в своей сессии,
+как это делают обработчики запросов. Логи echo профиля development
+пишутся в /dev/null, поэтому в результат входит стоимость форматирования
+логов, но не вывода в терминал.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.database.config import create_engine_for_profile
+from app.models.account import Account
+from app.models.user import User
+
+from .common import create_schema, percentiles, temp_database_url
+
+PROFILES = ["development", "production"]
+
+
+async def seed(session_factory, accounts: int) -> None:
+    """Заполняет БД одним продавцом и заданным количеством аккаунтов"""
+    async with session_factory() as session:
+        session.add(User(telegram_id=1, username="seller"))
+        await session.flush()
+        session.add_all([
+            Account(user_id=1, game=f"Game {i % 20}", description=f"Account {i}", price=100 + i)
+            for i in range(accounts)
+        ])
+        await session.commit()
+
+
+async def worker(session_factory, deadline: float, accounts: int, write_ratio: float, stats: dict) -> None:
+    """Выполняет случайные чтения и записи до истечения времени"""
+    while time.perf_counter() < deadline:
+        account_id = random.randint(1, accounts)
+        is_write = random.random() < write_ratio
+        started = time.perf_counter()
+        try:
+            async with session_factory() as session:
+                if is_write:
+                    await session.execute(
+                        update(Account)
+                        .where(Account.id == account_id)
+                        .values(price=random.randint(100, 100000))
+                    )
+                    await session.commit()
+                else:
+                    result = await session.execute(
+                        select(Account).order_by(Account.created_at.desc(), Account.id.desc()).limit(20)
+                    )
+                    result.scalars().all()
+        except Exception:
+            stats["errors"] += 1
+            continue
+        stats["writes" if is_write else "reads"].append(time.perf_counter() - started)
+
+
+async def run_profile(profile: str, args) -> dict:
+    """Прогоняет нагрузку на одном профиле и возвращает метрики"""
+    engine = create_engine_for_profile(temp_database_url(), profile)
+    for handler in logging.getLogger("sqlalchemy.engine.Engine").handlers:
+        if isinstance(handler, logging.StreamHandler):
+            handler.setStream(open(os.devnull, "w"))
+
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await create_schema(engine)
+    await seed(session_factory, args.accounts)
+
+    stats = {"reads": [], "writes": [], "errors": 0}
+    deadline = time.perf_counter() + args.duration
+    await asyncio.gather(*[
+        worker(session_factory, deadline, args.accounts, args.write_ratio, stats)
+        for _ in range(args.workers)
+    ])
+    await engine.dispose()
+
+    operations = len(stats["reads"]) + len(stats["writes"])
+    return {
+        "profile": profile,
+        "ops_per_sec": round(operations / args.duration, 1),
+        "reads": len(stats["reads"]),
+        "writes": len(stats["writes"]),
+        "errors": stats["errors"],
+        "read_latency_ms": percentiles(stats["reads"]),
+        "write_latency_ms": percentiles(stats["writes"]),
+    }
+
+
+async def main(args) -> None:
+    results = [await run_profile(profile, args) for profile in PROFILES]
+    before, after = results
+    if before["ops_per_sec"]:
+        after["speedup"] = round(after["ops_per_sec"] / before["ops_per_sec"], 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    asyncio.run(main(parser.parse_args()))
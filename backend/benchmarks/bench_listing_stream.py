@@ -0,0 +1,142 @@
+"""
+Простаивающие подписчики SSE-ленты объявлений
+
+    python -m benchmarks.bench_listing_stream --subscribers 20000 --events 20
+
+Открывает --subscribers соединений GET /api/v1/accounts/stream напрямую
+через ASGI (как сервер, по задаче на соединение; --game-share из них с
+фильтром по одной игре из --games) и замеряет прирост RSS и число задач на
+одного подписчика. Затем через API публикуется --events изменений цены,
+и измеряется время от отправки PUT до доставки события последнему
+подписчику, а также время одного прохода heartbeat. --slow подписчиков
+не читают поток: они должны быть отключены за переполнение буфера,
+не задерживая остальных.
+"""
+import argparse
+import asyncio
+import json
+import resource
+import sys
+import time
+
+from .common import init_app_schema, percentiles, prepare_app_env
+
+
+def stream_scope(query: bytes, spec_version: str) -> dict:
+    return {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": spec_version}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/api/v1/accounts/stream",
+        "raw_path": b"/api/v1/accounts/stream", "root_path": "", "query_string": query,
+        "headers": [(b"host", b"bench"), (b"accept", b"text/event-stream")],
+        "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+
+async def main(args) -> int:
+    prepare_app_env(args.profile)
+
+    import httpx
+    from app.main import app
+    from app.utils.broadcaster import listing_broadcaster
+
+    await init_app_schema()
+    games = [f"Game {i}" for i in range(args.games)]
+    disconnected = asyncio.Event()
+    stalled = asyncio.Event()
+    received = {}
+
+    async def receive():
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    def make_send(number: int, slow: bool):
+        async def send(message):
+            if message["type"] != "http.response.body" or not message.get("body"):
+                return
+            # Первый кусок - retry; медленный подписчик дальше не читает
+            if slow and number in received:
+                await stalled.wait()
+            received[number] = time.perf_counter()
+        return send
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        user = (await client.post("/api/v1/users/", json={"telegram_id": 1, "username": "seller"})).json()
+        account = (await client.post("/api/v1/accounts/", json={
+            "user_id": user["id"], "game": games[0], "price": 1000,
+        })).json()
+
+        tasks_before = len(asyncio.all_tasks())
+        # Пиковый RSS в КБ (Linux); растет вместе с числом соединений
+        baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        started = time.perf_counter()
+        connections = []
+        total = args.subscribers + args.slow
+        filtered = int(args.subscribers * args.game_share)
+        for number in range(total):
+            query = f"game={games[number % len(games)]}".encode() if number < filtered else b""
+            connections.append(asyncio.create_task(
+                app(stream_scope(query, args.spec_version), receive, make_send(number, number >= args.subscribers))
+            ))
+            if number % 1000 == 999:
+                await asyncio.sleep(0)
+        while len(received) < total:
+            await asyncio.sleep(0.05)
+        connect_elapsed = time.perf_counter() - started
+        per_subscriber = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / total
+        tasks_per_subscriber = (len(asyncio.all_tasks()) - tasks_before) / total
+
+        # Подписчики игры аккаунта и подписчики без фильтра
+        expected = (filtered + len(games) - 1) // len(games) + (args.subscribers - filtered)
+        delivery = []
+        for event in range(args.events):
+            received.clear()
+            started = time.perf_counter()
+            await client.put(f"/api/v1/accounts/{account['id']}", json={"price": 2000 + event})
+            while len(received) < expected:
+                await asyncio.sleep(0.001)
+            delivery.append(max(received.values()) - started)
+
+        # Гарантируем переполнение буферов медленных подписчиков
+        for event in range(listing_broadcaster.buffer_size + 10):
+            await client.put(f"/api/v1/accounts/{account['id']}", json={"price": 3000 + event})
+        await asyncio.sleep(0.1)
+
+        heartbeat_started = time.perf_counter()
+        for subscribers in list(listing_broadcaster._by_game.values()):
+            for subscriber in list(subscribers):
+                listing_broadcaster._deliver(subscriber, b": ping\n\n")
+        heartbeat_elapsed = time.perf_counter() - heartbeat_started
+
+        stats = listing_broadcaster.stats()
+        disconnected.set()
+        stalled.set()
+        listing_broadcaster.close()
+        await asyncio.wait(connections, timeout=30)
+
+    report = {
+        "subscribers": args.subscribers,
+        "slow_subscribers": args.slow,
+        "asgi_spec_version": args.spec_version,
+        "connect_sec": round(connect_elapsed, 2),
+        "rss_per_subscriber_kb": round(per_subscriber, 1),
+        "tasks_per_subscriber": round(tasks_per_subscriber, 1),
+        "recipients_per_event": expected,
+        "put_to_last_delivery_ms": percentiles(delivery),
+        "heartbeat_pass_ms": round(heartbeat_elapsed * 1000, 1),
+        "dropped": stats["dropped"],
+        "subscribers_left": stats["subscribers"],
+    }
+    print(json.dumps(report, indent=2))
+    return 0 if stats["dropped"] == args.slow else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=20000)
+    parser.add_argument("--slow", type=int, default=10)
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--game-share", type=float, default=0.5)
+    parser.add_argument("--events", type=int, default=20)
+    parser.add_argument("--spec-version", default="2.4")
+    parser.add_argument("--profile", default="production")
+    sys.exit(asyncio.run(main(parser.parse_args())))
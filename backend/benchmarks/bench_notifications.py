@@ -0,0 +1,96 @@
+"""
+Отправка уведомлений о сделках через заглушку Bot API
+
+    python -m benchmarks.bench_notifications --chats 50 --events 600 --fail-rate 0.1
+
+В одноразовую БД ставится --events уведомлений для --chats чатов, после
+чего отправщик работает против заглушки (benchmarks.bot_api_stub) через
+ASGI-транспорт. На середине прогона отправщик останавливается и
+создается заново, как при перезапуске процесса. Проверяется, что все
+события доставлены ровно по одному разу, и выводится, во сколько
+сообщений были свернуты события и сколько раз заглушка ответила 429
+(после перезапуска ведра лимитов начинают с нуля) или 502.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from .bot_api_stub import BotApiStub, create_stub_app
+from .common import init_app_schema, prepare_app_env
+
+
+async def main(args) -> int:
+    prepare_app_env()
+    os.environ["NOTIFY_RETRY_BASE"] = "0.2"
+    os.environ["NOTIFY_MAX_ATTEMPTS"] = "20"
+
+    import httpx
+    from sqlalchemy import func, select
+
+    from app.database.config import AsyncSessionLocal
+    from app.models.notification import Notification
+    from app.models.user import User
+    from app.utils.notifications import NotificationSender, notify_users
+
+    await init_app_schema()
+    async with AsyncSessionLocal() as session:
+        session.add_all([User(telegram_id=100 + i, username=f"user{i}") for i in range(args.chats)])
+        await session.flush()
+        for event in range(args.events):
+            await notify_users(session, [1 + event % args.chats], f"Сделка #{event}: завершена")
+        await session.commit()
+
+    stub = BotApiStub(args.global_rate, args.chat_rate, args.fail_rate)
+    transport = httpx.ASGITransport(app=create_stub_app(stub))
+
+    async def pending() -> int:
+        async with AsyncSessionLocal() as session:
+            return await session.scalar(
+                select(func.count()).select_from(Notification).where(Notification.status.in_(["pending", "sending"]))
+            )
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(transport=transport, base_url="http://stub") as client:
+        restarted = False
+        while await pending():
+            sender = NotificationSender(client=client, api_url="http://stub")
+            sender.start()
+            while await pending():
+                await asyncio.sleep(0.2)
+                if not restarted and len(stub.messages) >= args.chats // 2:
+                    break
+            await sender.stop()
+            restarted = True
+    elapsed = time.perf_counter() - started
+
+    async with AsyncSessionLocal() as session:
+        statuses = dict((await session.execute(
+            select(Notification.status, func.count()).group_by(Notification.status)
+        )).all())
+
+    delivered = sum(message["text"].count("Сделка #") for message in stub.messages)
+    report = {
+        "events": args.events,
+        "chats": args.chats,
+        "messages_sent": len(stub.messages),
+        "events_delivered": delivered,
+        "coalescing_ratio": round(delivered / max(len(stub.messages), 1), 2),
+        "stub_responses": dict(stub.responses),
+        "statuses": statuses,
+        "elapsed_sec": round(elapsed, 2),
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0 if delivered == args.events and statuses.get("sent") == args.events else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--events", type=int, default=600)
+    parser.add_argument("--global-rate", type=float, default=30)
+    parser.add_argument("--chat-rate", type=float, default=1)
+    parser.add_argument("--fail-rate", type=float, default=0.1)
+    sys.exit(asyncio.run(main(parser.parse_args())))
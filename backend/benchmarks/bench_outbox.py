@@ -0,0 +1,144 @@
+"""
+Доставка событий outbox при сбоях потребителя и падении диспетчера
+
+    python -m benchmarks.bench_outbox --deals 200 --fail-rate 0.1
+
+Через API создается --deals сделок, затем все они конкурентно
+завершаются или отменяются, а по завершенным оставляются отзывы. В это
+время работает диспетчер с двумя потребителями: штатным notifications и
+тестовым flaky, который падает с вероятностью --fail-rate. На середине
+диспетчер "падает" (задача отменяется без освобождения аренд), и новый
+диспетчер забирает потребителей после истечения аренды.
+
+Проверяется, что flaky получил каждое событие хотя бы раз, а уведомлений
+создано ровно столько, сколько событий этого требуют (записи
+потребителя фиксируются вместе с позицией). Выводится число повторных
+доставок, задержка доставки и задержка PUT /deals/{id}.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+
+from .common import init_app_schema, percentiles, prepare_app_env
+
+
+async def main(args) -> int:
+    prepare_app_env(args.profile)
+    os.environ["OUTBOX_RETRY_BASE"] = "0.05"
+    os.environ["OUTBOX_LEASE"] = str(args.lease)
+    os.environ["OUTBOX_BATCH_SIZE"] = str(args.batch_size)
+
+    import httpx
+    from sqlalchemy import func, select
+    from app.database.config import new_session
+    from app.main import app
+    from app.models.notification import Notification
+    from app.models.outbox import OutboxEvent
+    from app.utils.notifications import notify_outbox_event
+    from app.utils.outbox import OutboxDispatcher, outbox_dispatcher
+
+    await init_app_schema()
+
+    deliveries = Counter()
+    lags = []
+
+    async def flaky(db, event):
+        if random.random() < args.fail_rate:
+            raise RuntimeError("flaky consumer failure")
+        deliveries[event.id] += 1
+        lags.append((datetime.utcnow() - event.created_at).total_seconds())
+
+    def make_dispatcher() -> OutboxDispatcher:
+        dispatcher = OutboxDispatcher()
+        dispatcher.register("notifications", notify_outbox_event)
+        dispatcher.register("flaky", flaky)
+        # Обработчики API будят модульный диспетчер, новый слушает его событие
+        dispatcher._wakeup = outbox_dispatcher._wakeup
+        dispatcher.start()
+        return dispatcher
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        seller = (await client.post("/api/v1/users/", json={"telegram_id": 1, "username": "seller"})).json()
+        buyer = (await client.post("/api/v1/users/", json={"telegram_id": 2, "username": "buyer"})).json()
+        deals = []
+        for i in range(args.deals):
+            account = (await client.post("/api/v1/accounts/", json={
+                "user_id": seller["id"], "game": "Dota 2", "price": 1000 + i,
+            })).json()
+            deals.append((await client.post("/api/v1/deals/", json={
+                "seller_id": seller["id"], "buyer_id": buyer["id"], "account_id": account["id"],
+            })).json())
+
+        dispatcher = make_dispatcher()
+        put_latencies = []
+
+        async def finish(index: int, deal: dict) -> None:
+            status = "completed" if index % 2 else "cancelled"
+            started = time.perf_counter()
+            await client.put(f"/api/v1/deals/{deal['id']}", json={"status": status})
+            put_latencies.append(time.perf_counter() - started)
+            if status == "completed":
+                await client.post(f"/api/v1/deals/{deal['id']}/reviews/", json={"deal_id": deal["id"], "rating": 5})
+
+        half = len(deals) // 2
+        await asyncio.gather(*[finish(i, deal) for i, deal in enumerate(deals[:half])])
+
+        # Падение процесса: задача отменяется, аренды остаются занятыми
+        dispatcher._task.cancel()
+        crashed_at = time.perf_counter()
+        dispatcher = make_dispatcher()
+        await asyncio.gather(*[finish(i, deal) for i, deal in enumerate(deals[half:], start=half)])
+
+        async with new_session() as session:
+            last_id = await session.scalar(select(func.max(OutboxEvent.id)))
+        takeover = None
+        deadline = time.perf_counter() + args.timeout
+        while time.perf_counter() < deadline:
+            positions = [consumer.position for consumer in dispatcher.consumers.values()]
+            if takeover is None and any(dispatcher.consumers[name].lease_until for name in dispatcher.consumers):
+                takeover = time.perf_counter() - crashed_at
+            if min(positions) >= last_id:
+                break
+            await asyncio.sleep(0.05)
+        await dispatcher.stop()
+
+        async with new_session() as session:
+            notifications = await session.scalar(select(func.count()).select_from(Notification))
+            events = await session.scalar(select(func.count()).select_from(OutboxEvent))
+
+    completed = len([i for i in range(len(deals)) if i % 2])
+    # Смена статуса - два уведомления (продавцу и покупателю), отзыв - одно
+    expected_notifications = 2 * len(deals) + completed
+    missing = [event_id for event_id in range(1, last_id + 1) if not deliveries[event_id]]
+    report = {
+        "deals": args.deals,
+        "events": events,
+        "fail_rate": args.fail_rate,
+        "missing_deliveries": len(missing),
+        "redelivered_events": sum(1 for count in deliveries.values() if count > 1),
+        "notifications": notifications,
+        "expected_notifications": expected_notifications,
+        "lease_takeover_sec": round(takeover, 2) if takeover is not None else None,
+        "delivery_lag_ms": percentiles(lags),
+        "put_latency_ms": percentiles(put_latencies),
+    }
+    print(json.dumps(report, indent=2))
+    return 0 if not missing and notifications == expected_notifications else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deals", type=int, default=200)
+    parser.add_argument("--fail-rate", type=float, default=0.1)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--lease", type=float, default=2.0)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--profile", default="production")
+    sys.exit(asyncio.run(main(parser.parse_args())))
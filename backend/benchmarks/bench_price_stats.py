@@ -0,0 +1,123 @@
+"""
+Сводка цен по играм: расчет на лету против сводной таблицы
+
+    python -m benchmarks.bench_price_stats --accounts 200000 --games 50
+
+Заполняет каталог --accounts объявлениями по --games играм и сравнивает
+задержку GET /api/v1/accounts/stats?game= (чтение сводной таблицы) с
+расчетом тех же квартилей на лету (выборка и сортировка цен игры).
+Затем меняет цены, снимает с продажи и удаляет объявления в --changed
+играх и замеряет инкрементальный проход фоновой задачи против полного.
+Проверяется, что после прохода сводка совпадает с расчетом на лету.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import datetime
+
+from .common import init_app_schema, percentiles, prepare_app_env
+
+
+async def main(args) -> int:
+    prepare_app_env(args.profile)
+
+    import httpx
+    import numpy as np
+    from sqlalchemy import delete, insert, select, update
+    from app.database.config import new_session
+    from app.database.price_stats import refresh_price_stats, summarize_prices
+    from app.main import app
+    from app.models.account import Account
+    from app.config import settings
+
+    await init_app_schema()
+    edges = np.asarray(sorted(settings.PRICE_STATS_BUCKETS), dtype=np.float64)
+    games = [f"Game {i}" for i in range(args.games)]
+    rng = random.Random(1)
+    now = datetime.utcnow()
+    async with new_session() as db:
+        rows = [
+            {
+                "user_id": 1, "game": games[i % args.games], "is_available": True,
+                "price": round(rng.lognormvariate(8, 1), 2), "created_at": now, "updated_at": now,
+            }
+            for i in range(args.accounts)
+        ]
+        for start in range(0, len(rows), 5000):
+            await db.execute(insert(Account), rows[start:start + 5000])
+        await db.commit()
+
+    async def on_demand(game: str):
+        async with new_session() as db:
+            result = await db.execute(
+                select(Account.price).where(Account.game == game, Account.is_available == True).order_by(Account.price)
+            )
+            prices = np.asarray(result.scalars().all(), dtype=np.float64)
+        return summarize_prices(prices, edges)
+
+    async with new_session() as db:
+        started = time.perf_counter()
+        await refresh_price_stats(db)
+        full_refresh = time.perf_counter() - started
+
+    endpoint, direct = [], []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for i in range(args.requests):
+            game = games[i % args.games]
+            started = time.perf_counter()
+            response = await client.get("/api/v1/accounts/stats", params={"game": game})
+            endpoint.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.text
+            started = time.perf_counter()
+            await on_demand(game)
+            direct.append(time.perf_counter() - started)
+
+        # Изменения в нескольких играх: цены, снятие с продажи, удаление
+        since = datetime.utcnow()
+        changed_games = games[:args.changed]
+        async with new_session() as db:
+            for game in changed_games:
+                ids = (await db.execute(select(Account.id).where(Account.game == game).limit(300))).scalars().all()
+                await db.execute(update(Account).where(Account.id.in_(ids[:100])).values(price=Account.price * 2))
+                await db.execute(update(Account).where(Account.id.in_(ids[100:200])).values(is_available=False))
+                await db.execute(delete(Account).where(Account.id.in_(ids[200:])))
+            await db.commit()
+
+        async with new_session() as db:
+            started = time.perf_counter()
+            refreshed = await refresh_price_stats(db, since)
+            incremental = time.perf_counter() - started
+
+        mismatched = []
+        for game in games:
+            served = (await client.get("/api/v1/accounts/stats", params={"game": game})).json()
+            expected = await on_demand(game)
+            if served["count"] != expected["count"] or not np.isclose(served["p50"], expected["p50"]) \
+                    or [bucket["count"] for bucket in served["histogram"]] != [b["count"] for b in expected["histogram"]]:
+                mismatched.append(game)
+
+    report = {
+        "accounts": args.accounts,
+        "games": args.games,
+        "endpoint_ms": percentiles(endpoint),
+        "on_demand_ms": percentiles(direct),
+        "full_refresh_ms": round(full_refresh * 1000, 1),
+        "incremental_refresh_ms": round(incremental * 1000, 1),
+        "incremental_games": refreshed,
+        "mismatched_games": mismatched,
+    }
+    print(json.dumps(report, indent=2))
+    return 0 if not mismatched and refreshed == args.changed else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=200000)
+    parser.add_argument("--games", type=int, default=50)
+    parser.add_argument("--changed", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--profile", default="production")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,129 @@
+"""
+Чтения каталога во время потока записей: общий пул или движок чтения
+
+    python -m benchmarks.bench_read_split --split
+    python -m benchmarks.bench_read_split --no-split
+
+--writers задач в течение --duration секунд меняют цены аккаунтов
+(PUT /api/v1/accounts/{id}), а --readers задач с другого адреса клиента
+читают GET /api/v1/accounts/search и GET /api/v1/deals/. С --split
+чтения идут через отдельный пул read-only соединений к тому же файлу
+SQLite (WAL), без него - через общий с записями пул. Пул намеренно
+маленький (--pool-size), чтобы было видно ожидание соединения.
+
+В конце проверяется read-your-writes: писатель меняет цену и сразу
+читает аккаунт через поиск - он должен увидеть новую цену, а сессия
+должна быть открыта на основном движке.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from .common import init_app_schema, percentiles, prepare_app_env
+
+
+async def main(args) -> int:
+    prepare_app_env(args.profile)
+    os.environ["DB_READ_SPLIT"] = "true" if args.split else "false"
+    os.environ["DB_POOL_SIZE"] = str(args.pool_size)
+    os.environ["DB_READ_POOL_SIZE"] = str(args.pool_size)
+    os.environ["DB_MAX_OVERFLOW"] = "0"
+
+    import httpx
+    from app.database.config import has_read_replica
+    from app.main import app
+    from app.utils.metrics import DB_READ_SESSIONS
+
+    await init_app_schema()
+
+    writer = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=("10.0.0.1", 1)), base_url="http://bench")
+    reader = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=("10.0.0.2", 1)), base_url="http://bench")
+    async with writer, reader:
+        seller = (await writer.post("/api/v1/users/", json={"telegram_id": 1, "username": "seller"})).json()
+        buyer = (await writer.post("/api/v1/users/", json={"telegram_id": 2, "username": "buyer"})).json()
+        rows = [{"user_id": seller["id"], "game": f"Game {i % 10}", "price": 1000 + i} for i in range(args.accounts)]
+        await writer.post("/api/v1/accounts/bulk", json=rows)
+        accounts = [{"id": i + 1, "game": row["game"]} for i, row in enumerate(rows)]
+        for account in accounts[:args.deals]:
+            await writer.post("/api/v1/deals/", json={
+                "seller_id": seller["id"], "buyer_id": buyer["id"], "account_id": account["id"],
+            })
+
+        deadline = time.perf_counter() + args.duration
+        read_latencies = []
+        write_latencies = []
+        errors = 0
+
+        async def write_loop(number: int) -> None:
+            nonlocal errors
+            step = 0
+            while time.perf_counter() < deadline:
+                account = accounts[(number * 7919 + step) % len(accounts)]
+                step += 1
+                started = time.perf_counter()
+                response = await writer.put(f"/api/v1/accounts/{account['id']}", json={"price": 2000 + step})
+                write_latencies.append(time.perf_counter() - started)
+                errors += response.status_code != 200
+
+        async def read_loop(number: int) -> None:
+            nonlocal errors
+            step = 0
+            while time.perf_counter() < deadline:
+                step += 1
+                if step % 2:
+                    url = "/api/v1/accounts/search?sort=price_asc&limit=50"
+                else:
+                    url = "/api/v1/deals/?limit=50&expand=account"
+                started = time.perf_counter()
+                response = await reader.get(url)
+                read_latencies.append(time.perf_counter() - started)
+                errors += response.status_code != 200
+
+        before = {label: DB_READ_SESSIONS.labels(label)._value.get() for label in ("primary", "replica")}
+        await asyncio.gather(
+            *[write_loop(i) for i in range(args.writers)],
+            *[read_loop(i) for i in range(args.readers)],
+        )
+        routed = {label: DB_READ_SESSIONS.labels(label)._value.get() - before[label] for label in before}
+
+        # Read-your-writes: запись и сразу чтение тем же клиентом
+        account = accounts[-1]
+        primary_before = DB_READ_SESSIONS.labels("primary")._value.get()
+        await writer.put(f"/api/v1/accounts/{account['id']}", json={"price": 99999})
+        found = (await writer.get(f"/api/v1/accounts/search?game={account['game']}&min_price=99999")).json()
+        sees_own_write = any(item["id"] == account["id"] for item in found["items"])
+        sticky_primary = DB_READ_SESSIONS.labels("primary")._value.get() - primary_before == 1
+
+    elapsed = args.duration
+    report = {
+        "split": has_read_replica(),
+        "pool_size": args.pool_size,
+        "writers": args.writers,
+        "readers": args.readers,
+        "reads_per_sec": round(len(read_latencies) / elapsed, 1),
+        "writes_per_sec": round(len(write_latencies) / elapsed, 1),
+        "read_latency_ms": percentiles(read_latencies),
+        "write_latency_ms": percentiles(write_latencies),
+        "read_sessions": routed,
+        "errors": errors,
+        "read_your_writes": sees_own_write,
+        "read_your_writes_on_primary": sticky_primary,
+    }
+    print(json.dumps(report, indent=2))
+    return 0 if sees_own_write and sticky_primary and not errors else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--split", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--accounts", type=int, default=50000)
+    parser.add_argument("--deals", type=int, default=200)
+    parser.add_argument("--writers", type=int, default=20)
+    parser.add_argument("--readers", type=int, default=20)
+    parser.add_argument("--pool-size", type=int, default=5)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--profile", default="production")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,75 @@
+"""
+Память и пропускная способность хранилища данных Web App бота
+
+    python -m benchmarks.bench_user_store --users 1000000 --max-entries 10000
+
+Записывает данные для --users разных пользователей, затем читает
+случайную выборку (часть из LRU, часть с диска). Пиковая память
+Python-объектов (tracemalloc) снимается по ходу записи: она должна
+выйти на плато, определяемое --max-entries и размером пачки, и не
+расти дальше с количеством пользователей.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from user_store import SQLiteBackend, UserDataStore
+
+from .common import percentiles
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200000)
+    parser.add_argument("--max-entries", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--reads", type=int, default=20000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="trustytrade-bench-"), "user_data.db")
+    store = UserDataStore(
+        SQLiteBackend(path),
+        max_entries=args.max_entries,
+        ttl=3600,
+        flush_interval=0.5,
+        batch_size=args.batch_size,
+    )
+
+    tracemalloc.start()
+    checkpoints = {}
+    step = max(args.users // 5, 1)
+    started = time.perf_counter()
+    for user_id in range(1, args.users + 1):
+        store.set(user_id, {"user_id": user_id, "action": "view", "account_id": user_id % 1000})
+        if user_id % step == 0:
+            checkpoints[user_id] = round(tracemalloc.get_traced_memory()[0] / 1024 / 1024, 2)
+    store.flush()
+    write_elapsed = time.perf_counter() - started
+
+    samples = []
+    for _ in range(args.reads):
+        user_id = random.randint(1, args.users)
+        read_started = time.perf_counter()
+        assert store.get(user_id)["user_id"] == user_id
+        samples.append(time.perf_counter() - read_started)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    store.close()
+
+    print(json.dumps({
+        "users": args.users,
+        "max_entries": args.max_entries,
+        "writes_per_sec": round(args.users / write_elapsed),
+        "read_latency_ms": percentiles(samples),
+        "traced_memory_mb_by_users": checkpoints,
+        "peak_traced_memory_mb": round(peak / 1024 / 1024, 2),
+        "db_size_mb": round(os.path.getsize(path) / 1024 / 1024, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Локальная заглушка Telegram Bot API для проверки отправки уведомлений
+
+    python -m benchmarks.bot_api_stub --port 8081
+    TELEGRAM_API_URL=http://127.0.0.1:8081 uvicorn app.main:app
+
+Поддерживает только sendMessage. Соблюдает лимиты, похожие на лимиты
+Telegram: при превышении общего лимита или лимита на чат отвечает 429
+с retry_after, как настоящий Bot API. Часть запросов можно заставить
+падать с 502 (--fail-rate), чтобы проверить повторы. Принятые сообщения
+доступны по GET /messages.
+"""
+import argparse
+import random
+import time
+from collections import defaultdict, deque
+from typing import Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+class BotApiStub:
+    """Состояние заглушки: принятые сообщения и счетчики ответов"""
+
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, fail_rate: float = 0.0):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.fail_rate = fail_rate
+        self.messages: List[dict] = []
+        self.responses: Dict[int, int] = defaultdict(int)
+        self._global_calls = deque()
+        self._chat_calls: Dict[int, deque] = defaultdict(deque)
+
+    def _over_limit(self, calls: deque, rate: float, now: float) -> bool:
+        """Скользящее окно в 1 секунду"""
+        while calls and now - calls[0] >= 1.0:
+            calls.popleft()
+        return len(calls) >= max(rate, 1)
+
+    def send_message(self, payload: dict):
+        now = time.monotonic()
+        chat_id = payload.get("chat_id")
+        if self._over_limit(self._global_calls, self.global_rate, now) or \
+                self._over_limit(self._chat_calls[chat_id], self.chat_rate, now):
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": "Too Many Requests: retry after 1",
+                "parameters": {"retry_after": 1},
+            }
+        if random.random() < self.fail_rate:
+            return 502, {"ok": False, "error_code": 502, "description": "Bad Gateway"}
+        if not chat_id or not payload.get("text"):
+            return 400, {"ok": False, "error_code": 400, "description": "Bad Request: message text is empty"}
+
+        self._global_calls.append(now)
+        self._chat_calls[chat_id].append(now)
+        self.messages.append({"chat_id": chat_id, "text": payload["text"], "at": now})
+        return 200, {"ok": True, "result": {"message_id": len(self.messages), "chat": {"id": chat_id}}}
+
+
+def create_stub_app(stub: BotApiStub) -> FastAPI:
+    app = FastAPI(title="Bot API stub")
+
+    @app.post("/bot{token}/sendMessage")
+    async def send_message(token: str, request: Request):
+        status, body = stub.send_message(await request.json())
+        stub.responses[status] += 1
+        return JSONResponse(body, status_code=status)
+
+    @app.get("/messages")
+    async def messages():
+        return {"responses": stub.responses, "messages": stub.messages}
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--global-rate", type=float, default=30)
+    parser.add_argument("--chat-rate", type=float, default=1)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    stub = BotApiStub(args.global_rate, args.chat_rate, args.fail_rate)
+    uvicorn.run(create_stub_app(stub), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import os
+import tempfile
+from typing import Dict, List
+
+
+def temp_database_url() -> str:
+    """Возвращает URL одноразового SQLite-файла во временной директории"""
+    fd, path = tempfile.mkstemp(prefix="trustytrade-bench-", suffix=".db")
+    os.close(fd)
+    os.unlink(path)
+    return f"sqlite+aiosqlite:///{path}"
+
+
+async def create_schema(engine) -> None:
+    """Приводит схему БД к последней ревизии, как при старте приложения"""
+    from app.database.migrations import upgrade_schema
+
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade_schema)
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 в миллисекундах по списку длительностей в секундах"""
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return round(ordered[index] * 1000, 3)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+def prepare_app_env(profile: str = "production") -> str:
+    """
+    Настраивает окружение для запуска app.main на одноразовой БД
+
+    Должна вызываться до импорта модулей приложения: настройки читаются
+    из окружения при импорте app.config, а URL БД вычисляется при импорте
+    app.database.config. Сам движок создается лениво, при первом
+    обращении к get_engine().
+    """
+    url = temp_database_url()
+    os.environ["DATABASE_URL"] = url
+    os.environ["DB_PROFILE"] = profile
+    os.environ.setdefault("ENV", "development")
+    os.environ.setdefault("BOT_TOKEN", "benchmark")
+    return url
+
+
+async def init_app_schema() -> None:
+    """Создает схему так же, как старт приложения (миграции и FTS), без сидов"""
+    from app.database.config import get_engine
+    from app.database.fts import ensure_accounts_fts
+    from app.database.migrations import upgrade_schema
+
+    async with get_engine().begin() as conn:
+        await conn.run_sync(upgrade_schema)
+        await ensure_accounts_fts(conn)
@@ -0,0 +1,247 @@
+"""
+Нагрузочный прогон FastAPI-приложения внутри процесса
+
+    python -m benchmarks.loadtest --mix browse=60,search=25,deal=10,review=5 \\
+        --concurrency 50 --duration 10 --output report.json
+
+Приложение app.main:app вызывается через ASGI-транспорт httpx на
+одноразовой SQLite-БД, сеть и uvicorn не участвуют. Воркеры в течение
+--duration секунд выполняют сценарии, выбранные случайно с весами из
+--mix. Результат - JSON с пропускной способностью и p50/p95/p99 по
+каждому маршруту.
+
+С --baseline прошлый отчет сравнивается с текущим: если p95 какого-либо
+маршрута вырос больше чем на --max-regression (доля), код выхода 1.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import deque
+from typing import Callable, Dict, List
+
+from .common import init_app_schema, percentiles, prepare_app_env
+
+GAMES = ["Dota 2", "CS:GO", "World of Warcraft", "Genshin Impact", "PUBG", "Valorant"]
+WORDS = ["Immortal", "Global", "Elite", "MMR", "скины", "рейтинг", "полная", "экипировка"]
+
+SCENARIOS: Dict[str, Callable] = {}
+
+
+def scenario(name: str):
+    """Регистрирует сценарий нагрузки"""
+    def decorator(func):
+        SCENARIOS[name] = func
+        return func
+    return decorator
+
+
+class LoadContext:
+    """Общее состояние прогона: клиент, пользователи, сделки и замеры"""
+
+    def __init__(self, client, users: List[int], accounts: int):
+        self.client = client
+        self.users = users
+        self.accounts = accounts
+        self.pending_deals = deque()
+        self.samples: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[int, int]] = {}
+
+    async def call(self, method: str, route: str, url: str, **kwargs):
+        """Выполняет запрос и записывает длительность под шаблоном маршрута"""
+        label = f"{method} {route}"
+        started = time.perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        self.samples.setdefault(label, []).append(time.perf_counter() - started)
+        codes = self.statuses.setdefault(label, {})
+        codes[response.status_code] = codes.get(response.status_code, 0) + 1
+        return response
+
+
+@scenario("browse")
+async def browse(ctx: LoadContext):
+    """Лента аккаунтов: две страницы по курсору и карточка аккаунта"""
+    response = await ctx.call("GET", "/api/v1/accounts/", "/api/v1/accounts/", params={"limit": 20})
+    cursor = response.headers.get("X-Next-Cursor")
+    if cursor:
+        await ctx.call("GET", "/api/v1/accounts/", "/api/v1/accounts/", params={"limit": 20, "cursor": cursor})
+    account_id = random.randint(1, ctx.accounts)
+    await ctx.call("GET", "/api/v1/accounts/{account_id}", f"/api/v1/accounts/{account_id}")
+
+
+@scenario("search")
+async def search(ctx: LoadContext):
+    """Фасетный и полнотекстовый поиск"""
+    low = random.randint(100, 20000)
+    await ctx.call("GET", "/api/v1/accounts/search", "/api/v1/accounts/search", params={
+        "game": random.choice(GAMES),
+        "min_price": low,
+        "max_price": low + 10000,
+        "sort": random.choice(["price_asc", "price_desc", "newest"]),
+        "limit": 20,
+    })
+    await ctx.call("GET", "/api/v1/accounts/", "/api/v1/accounts/", params={"q": random.choice(WORDS), "limit": 20})
+
+
+@scenario("deal")
+async def create_deal(ctx: LoadContext):
+    """Продавец выставляет аккаунт, покупатель сразу создает сделку"""
+    seller_id, buyer_id = random.sample(ctx.users, 2)
+    response = await ctx.call("POST", "/api/v1/accounts/", "/api/v1/accounts/", json={
+        "user_id": seller_id,
+        "game": random.choice(GAMES),
+        "description": " ".join(random.sample(WORDS, 3)),
+        "price": random.randint(100, 50000),
+    })
+    if response.status_code != 200:
+        return
+    response = await ctx.call("POST", "/api/v1/deals/", "/api/v1/deals/", json={
+        "seller_id": seller_id,
+        "buyer_id": buyer_id,
+        "account_id": response.json()["id"],
+    })
+    if response.status_code == 200:
+        ctx.pending_deals.append(response.json()["id"])
+
+
+@scenario("review")
+async def review(ctx: LoadContext):
+    """Завершение сделки и отзыв о продавце"""
+    if not ctx.pending_deals:
+        await create_deal(ctx)
+        if not ctx.pending_deals:
+            return
+    deal_id = ctx.pending_deals.popleft()
+    await ctx.call("PUT", "/api/v1/deals/{deal_id}", f"/api/v1/deals/{deal_id}", json={"status": "completed"})
+    await ctx.call("POST", "/api/v1/deals/{deal_id}/reviews/", f"/api/v1/deals/{deal_id}/reviews/", json={
+        "deal_id": deal_id,
+        "rating": random.randint(1, 5),
+    })
+
+
+def parse_mix(value: str) -> Dict[str, int]:
+    """Разбирает строку вида browse=60,search=25"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario: {name}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+async def seed(client, users: int, accounts: int) -> List[int]:
+    """Создает пользователей и каталог аккаунтов через API"""
+    user_ids = []
+    for i in range(users):
+        response = await client.post("/api/v1/users/", json={"telegram_id": 10_000 + i, "username": f"user{i}"})
+        user_ids.append(response.json()["id"])
+    rows = [
+        {
+            "user_id": random.choice(user_ids),
+            "game": random.choice(GAMES),
+            "description": " ".join(random.sample(WORDS, 3)),
+            "price": random.randint(100, 50000),
+        }
+        for _ in range(accounts)
+    ]
+    response = await client.post("/api/v1/accounts/bulk", json=rows)
+    response.raise_for_status()
+    return user_ids
+
+
+async def run(args) -> dict:
+    prepare_app_env(args.profile)
+
+    import httpx
+    from app.main import app
+
+    await init_app_schema()
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+        users = await seed(client, args.users, args.accounts)
+        ctx = LoadContext(client, users, args.accounts)
+        names = list(args.mix)
+        weights = [args.mix[name] for name in names]
+        iterations = {name: 0 for name in names}
+
+        async def worker(deadline: float):
+            while time.perf_counter() < deadline:
+                name = random.choices(names, weights)[0]
+                await SCENARIOS[name](ctx)
+                iterations[name] += 1
+
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*[worker(deadline) for _ in range(args.concurrency)])
+        elapsed = time.perf_counter() - started
+
+    routes = {
+        label: {
+            "requests": len(samples),
+            "rps": round(len(samples) / elapsed, 1),
+            "latency_ms": percentiles(samples),
+            "statuses": ctx.statuses[label],
+        }
+        for label, samples in sorted(ctx.samples.items())
+    }
+    total = sum(route["requests"] for route in routes.values())
+    return {
+        "profile": args.profile,
+        "concurrency": args.concurrency,
+        "duration_sec": round(elapsed, 2),
+        "mix": args.mix,
+        "scenario_iterations": iterations,
+        "total_requests": total,
+        "total_rps": round(total / elapsed, 1),
+        "routes": routes,
+    }
+
+
+def find_regressions(report: dict, baseline: dict, max_regression: float) -> List[str]:
+    """Маршруты, у которых p95 вырос больше допустимого относительно базового отчета"""
+    regressions = []
+    for label, route in report["routes"].items():
+        previous = baseline.get("routes", {}).get(label)
+        if not previous or not previous["latency_ms"]["p95"]:
+            continue
+        ratio = route["latency_ms"]["p95"] / previous["latency_ms"]["p95"]
+        if ratio > 1 + max_regression:
+            regressions.append(f"{label}: p95 {previous['latency_ms']['p95']} -> {route['latency_ms']['p95']} ms")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("browse=60,search=25,deal=10,review=5"))
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--accounts", type=int, default=5000)
+    parser.add_argument("--profile", default="production")
+    parser.add_argument("--output", help="Файл для JSON-отчета (по умолчанию stdout)")
+    parser.add_argument("--baseline", help="Прошлый JSON-отчет для сравнения")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = find_regressions(report, json.load(f), args.max_regression)
+        report["regressions"] = regressions
+        exit_code = 1 if regressions else 0
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Стресс-тест одновременной покупки одного аккаунта
+
+    python -m benchmarks.stress_create_deal --buyers 300 --listings 10
+
+Для каждого аккаунта одновременно отправляется --buyers запросов
+POST /api/v1/deals/ от разных покупателей через ASGI-транспорт
+(приложение работает в этом же процессе на одноразовой SQLite-БД).
+Проверяется, что ровно один покупатель получает сделку, а остальные -
+ответ 400. Выводит пропускную способность и задержки в JSON, код выхода
+равен 1, если хотя бы для одного аккаунта победителей не ровно один.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from .common import init_app_schema, percentiles, prepare_app_env
+
+
+async def main(args) -> int:
+    prepare_app_env(args.profile)
+
+    import httpx
+    from app.main import app
+
+    await init_app_schema()
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        seller = (await client.post("/api/v1/users/", json={"telegram_id": 1, "username": "seller"})).json()
+        buyer_ids = []
+        for i in range(args.buyers):
+            response = await client.post("/api/v1/users/", json={"telegram_id": 1000 + i, "username": f"buyer{i}"})
+            buyer_ids.append(response.json()["id"])
+
+        latencies = []
+        statuses = {}
+        rounds = []
+
+        async def buy(account_id: int, buyer_id: int) -> int:
+            started = time.perf_counter()
+            response = await client.post("/api/v1/deals/", json={
+                "seller_id": seller["id"],
+                "buyer_id": buyer_id,
+                "account_id": account_id,
+            })
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            return response.status_code
+
+        started = time.perf_counter()
+        for i in range(args.listings):
+            account = (await client.post("/api/v1/accounts/", json={
+                "user_id": seller["id"], "game": "Dota 2", "price": 1000 + i,
+            })).json()
+            codes = await asyncio.gather(*[buy(account["id"], buyer_id) for buyer_id in buyer_ids])
+            rounds.append(codes.count(200))
+        elapsed = time.perf_counter() - started
+
+    report = {
+        "profile": args.profile,
+        "listings": args.listings,
+        "buyers_per_listing": args.buyers,
+        "winners_per_listing": rounds,
+        "exactly_one_winner": all(winners == 1 for winners in rounds),
+        "statuses": statuses,
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "latency_ms": percentiles(latencies),
+    }
+    print(json.dumps(report, indent=2))
+    return 0 if report["exactly_one_winner"] else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buyers", type=int, default=300)
+    parser.add_argument("--listings", type=int, default=10)
+    parser.add_argument("--profile", default="production")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -5,11 +5,19 @@ import json
 import logging
 import os
 import datetime
-from telegram import Update, WebAppInfo, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Updater, CommandHandler, CallbackContext, MessageHandler, Filters
-from flask import Flask, request, jsonify
+from typing import TYPE_CHECKING
+from flask import Flask, Response, request, jsonify
+from prometheus_client import CONTENT_TYPE_LATEST, Histogram, generate_latest
 import threading
-from config import BOT_TOKEN, WEBAPP_URL, HOST, PORT, SECRET_KEY
+from config import BOT_TOKEN, WEBAPP_URL, HOST, PORT, SECRET_KEY, BOT_WORKERS, BOT_QUEUE_SIZE, BOT_DEDUP_SIZE
+from update_queue import UpdateQueue
+from user_store import create_user_store
+
+# python-telegram-bot импортируется лениво: на холодном старте serverless-функции
+# он нужен только для вебхука, а не для /api/health и /api/user
+if TYPE_CHECKING:
+    from telegram import Update
+    from telegram.ext import CallbackContext
 
 # Настройка логирования
 logging.basicConfig(
@@ -22,12 +30,30 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 app.config['SECRET_KEY'] = SECRET_KEY
 
-# Хранилище данных пользователей (в реальном приложении лучше использовать базу данных)
-user_data = {}
+# Время обработки вебхуков Telegram
+WEBHOOK_LATENCY = Histogram(
+    "bot_webhook_processing_seconds",
+    "Время обработки вебхука Telegram"
+)
+
+# Хранилище данных пользователей: LRU в памяти + SQLite с отложенной записью
+_user_store = None
+_user_store_lock = threading.Lock()
+
+def get_user_store():
+    """Хранилище данных пользователей (создается при первом обращении)"""
+    global _user_store
+    if _user_store is None:
+        with _user_store_lock:
+            if _user_store is None:
+                _user_store = create_user_store()
+    return _user_store
 
 # Обработчики команд для бота
-def start(update: Update, context: CallbackContext) -> None:
+def start(update: "Update", context: "CallbackContext") -> None:
     """Обработка команды /start"""
+    from telegram import WebAppInfo, InlineKeyboardButton, InlineKeyboardMarkup
+
     logger.info(f"Получена команда /start от пользователя {update.effective_user.id}")
     user = update.effective_user
     
@@ -44,7 +70,7 @@ def start(update: Update, context: CallbackContext) -> None:
     )
     logger.info(f"Ответ на команду /start отправлен пользователю {user.id}")
 
-def handle_message(update: Update, context: CallbackContext) -> None:
+def handle_message(update: "Update", context: "CallbackContext") -> None:
     """Обработка сообщений с данными от Web App"""
     logger.info(f"Получено сообщение от пользователя {update.effective_user.id}")
     if update.effective_message.web_app_data:
@@ -53,7 +79,7 @@ def handle_message(update: Update, context: CallbackContext) -> None:
         user_id = update.effective_user.id
         
         # Сохраняем данные
-        user_data[user_id] = data
+        get_user_store().set(user_id, data)
         logger.info(f"Сохранены данные от пользователя {user_id}: {data}")
         
         # Отправляем подтверждение
@@ -70,8 +96,9 @@ def error_handler(update, context):
 @app.route('/api/user/<int:user_id>', methods=['GET'])
 def get_user_data(user_id):
     """Получение данных пользователя по ID"""
-    if user_id in user_data:
-        return jsonify({"success": True, "data": user_data[user_id]})
+    data = get_user_store().get(user_id)
+    if data is not None:
+        return jsonify({"success": True, "data": data})
     return jsonify({"success": False, "error": "User not found"})
 
 @app.route('/api/user/<int:user_id>', methods=['POST'])
@@ -79,7 +106,7 @@ def save_user_data(user_id):
     """Сохранение данных пользователя"""
     try:
         data = request.json
-        user_data[user_id] = data
+        get_user_store().set(user_id, data)
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
@@ -87,37 +114,87 @@ def save_user_data(user_id):
 # Vercel serverless handler
 @app.route('/api/webhook', methods=['POST'])
 def telegram_webhook():
-    """Обработчик вебхуков от Telegram для Vercel"""
+    """
+    Обработчик вебхуков от Telegram для Vercel
+
+    Обновление ставится в очередь, ответ Telegram отправляется сразу.
+    При переполненной очереди возвращается 503, и Telegram повторит доставку.
+    """
     if request.method == 'POST':
-        update = Update.de_json(request.get_json(force=True), None)
-        updater = get_updater()
-        updater.dispatcher.process_update(update)
-        return jsonify({"success": True})
+        from telegram import Update
+
+        update = Update.de_json(request.get_json(force=True), get_updater().bot)
+        status = update_queue.submit(update)
+        if status == "full":
+            return jsonify({"success": False, "error": "Queue is full"}), 503
+        return jsonify({"success": True, "status": status})
     return jsonify({"success": False})
 
+def webhook_stats():
+    """Количество обработанных вебхуков и среднее время обработки"""
+    samples = {sample.name: sample.value for sample in WEBHOOK_LATENCY.collect()[0].samples}
+    count = samples.get("bot_webhook_processing_seconds_count", 0)
+    total = samples.get("bot_webhook_processing_seconds_sum", 0)
+    return {
+        "processed": int(count),
+        "avg_processing_ms": round(total / count * 1000, 3) if count else 0.0
+    }
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Проверка работоспособности API"""
     return jsonify({
         "status": "ok",
         "version": "1.0.0",
-        "timestamp": str(datetime.datetime.now())
+        "timestamp": str(datetime.datetime.now()),
+        "webhook": webhook_stats(),
+        "user_store": get_user_store().stats(),
+        "queue": update_queue.stats()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Метрики бота в формате Prometheus"""
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+# Единственный на процесс экземпляр Updater
+_updater = None
+_updater_lock = threading.Lock()
+
 # Функция для получения экземпляра Updater
 def get_updater():
-    """Получение экземпляра Updater для обработки обновлений"""
-    updater = Updater(BOT_TOKEN)
-    dispatcher = updater.dispatcher
-    
-    # Регистрация обработчиков команд
-    dispatcher.add_handler(CommandHandler("start", start))
-    dispatcher.add_handler(MessageHandler(Filters.text | Filters.status_update.web_app_data, handle_message))
-    
-    # Регистрация обработчика ошибок
-    dispatcher.add_error_handler(error_handler)
-    
-    return updater
+    """Получение экземпляра Updater для обработки обновлений (создается один раз)"""
+    global _updater
+    if _updater is not None:
+        return _updater
+    with _updater_lock:
+        if _updater is None:
+            from telegram.ext import Updater, CommandHandler, MessageHandler, Filters
+
+            updater = Updater(BOT_TOKEN)
+            dispatcher = updater.dispatcher
+            
+            # Регистрация обработчиков команд
+            dispatcher.add_handler(CommandHandler("start", start))
+            dispatcher.add_handler(MessageHandler(Filters.text | Filters.status_update.web_app_data, handle_message))
+            
+            # Регистрация обработчика ошибок
+            dispatcher.add_error_handler(error_handler)
+            _updater = updater
+    return _updater
+
+def process_update(update):
+    """Обработка обновления в воркере очереди"""
+    get_updater().dispatcher.process_update(update)
+
+# Очередь обновлений из вебхука; воркеры стартуют при первом обновлении
+update_queue = UpdateQueue(
+    process_update,
+    workers=BOT_WORKERS,
+    max_size=BOT_QUEUE_SIZE,
+    dedup_size=BOT_DEDUP_SIZE,
+    latency=WEBHOOK_LATENCY
+)
 
 def run_flask():
     """Запуск Flask сервера"""
@@ -142,9 +219,6 @@ def main():
     # Ожидание прерывания
     updater.idle()
 
-# Для Vercel serverless functions
-app.updater = get_updater()
-
 # Дополнительные маршруты для Vercel
 @app.route('/', methods=['GET'])
 def index():
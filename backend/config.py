@@ -15,4 +15,21 @@ HOST = os.getenv('HOST', '0.0.0.0')
 PORT = int(os.getenv('PORT', 8443))
 
 # Секретный ключ для Flask
-SECRET_KEY = os.getenv('SECRET_KEY', 'ваш_секретный_ключ_здесь') 
\ No newline at end of file
+SECRET_KEY = os.getenv('SECRET_KEY', 'ваш_секретный_ключ_здесь') 
+
+# Хранилище данных Web App
+# memory - только в памяти процесса, sqlite - LRU в памяти + SQLite с отложенной записью
+USER_STORE_BACKEND = os.getenv('USER_STORE_BACKEND', 'sqlite')
+USER_STORE_PATH = os.getenv('USER_STORE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'bot_user_data.db'))
+USER_STORE_MAX_ENTRIES = int(os.getenv('USER_STORE_MAX_ENTRIES', 10000))
+USER_STORE_TTL = int(os.getenv('USER_STORE_TTL', 3600))
+# Сколько помнить, что данных пользователя нет (их мог записать другой процесс)
+USER_STORE_MISS_TTL = float(os.getenv('USER_STORE_MISS_TTL', 5.0))
+# Интервал сброса на диск в секундах; 0 - запись сразу (для serverless)
+USER_STORE_FLUSH_INTERVAL = float(os.getenv('USER_STORE_FLUSH_INTERVAL', 1.0))
+USER_STORE_BATCH_SIZE = int(os.getenv('USER_STORE_BATCH_SIZE', 500))
+
+# Обработка вебхуков: число воркеров, емкость очереди и окно отсечения повторов по update_id
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', 4))
+BOT_QUEUE_SIZE = int(os.getenv('BOT_QUEUE_SIZE', 1000))
+BOT_DEDUP_SIZE = int(os.getenv('BOT_DEDUP_SIZE', 10000))
@@ -7,12 +7,16 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 
 from alembic import context
 
-from app.models.base import Base
+from app.models import Base
 from app.database.config import DATABASE_URL
 
 config = context.config
 
-if config.config_file_name is not None:
+# При запуске из приложения (upgrade_schema) соединение уже открыто,
+# а логирование настроено самим приложением
+connection = config.attributes.get("connection")
+
+if config.config_file_name is not None and connection is None:
     fileConfig(config.config_file_name)
 
 target_metadata = Base.metadata
@@ -59,5 +63,7 @@ def run_async_migrations() -> None:
 
 if context.is_offline_mode():
     run_migrations_offline()
+elif connection is not None:
+    do_run_migrations(connection)
 else:
     run_async_migrations() 
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""Базовая схема: users, accounts, deals, reviews
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.database.migrations import has_table
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_baseline"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _base_columns():
+    return [
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    ]
+
+
+def upgrade() -> None:
+    if has_table("users"):
+        return
+    op.create_table(
+        "users",
+        *_base_columns(),
+        sa.Column("telegram_id", sa.Integer()),
+        sa.Column("username", sa.String()),
+        sa.Column("rating", sa.Float()),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_telegram_id", "users", ["telegram_id"], unique=True)
+    op.create_index("ix_users_username", "users", ["username"])
+    op.create_table(
+        "accounts",
+        *_base_columns(),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("game", sa.String()),
+        sa.Column("description", sa.String()),
+        sa.Column("price", sa.Float()),
+        sa.Column("is_available", sa.Boolean()),
+    )
+    op.create_index("ix_accounts_id", "accounts", ["id"])
+    op.create_index("ix_accounts_game", "accounts", ["game"])
+    op.create_table(
+        "deals",
+        *_base_columns(),
+        sa.Column("seller_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("buyer_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("account_id", sa.Integer(), sa.ForeignKey("accounts.id")),
+        sa.Column("status", sa.Enum("PENDING", "COMPLETED", "CANCELLED", name="dealstatus")),
+    )
+    op.create_index("ix_deals_id", "deals", ["id"])
+    op.create_table(
+        "reviews",
+        *_base_columns(),
+        sa.Column("deal_id", sa.Integer(), sa.ForeignKey("deals.id"), unique=True),
+        sa.Column("rating", sa.Integer()),
+        sa.Column("comment", sa.String(), nullable=True),
+    )
+    op.create_index("ix_reviews_id", "reviews", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("reviews")
+    op.drop_table("deals")
+    op.drop_table("accounts")
+    op.drop_table("users")
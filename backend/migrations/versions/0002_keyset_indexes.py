@@ -0,0 +1,32 @@
+"""Индексы (created_at, id) для keyset-пагинации
+
+Revision ID: 0002_keyset_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-18 12:00:01
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.database.migrations import has_index
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_keyset_indexes"
+down_revision: Union[str, None] = "0001_baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ["accounts", "deals", "users"]
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        if not has_index(table, f"ix_{table}_created_at_id"):
+            op.create_index(f"ix_{table}_created_at_id", table, ["created_at", "id"])
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.drop_index(f"ix_{table}_created_at_id", table_name=table)
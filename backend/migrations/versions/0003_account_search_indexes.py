@@ -0,0 +1,36 @@
+"""Индексы фасетного поиска аккаунтов
+
+Revision ID: 0003_account_search_indexes
+Revises: 0002_keyset_indexes
+Create Date: 2026-10-18 12:00:02
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from app.database.migrations import has_index
+
+# revision identifiers, used by Alembic.
+revision: str = "0003_account_search_indexes"
+down_revision: Union[str, None] = "0002_keyset_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not has_index("accounts", "ix_accounts_game_available_price"):
+        op.create_index("ix_accounts_game_available_price", "accounts", ["game", "is_available", "price"])
+    if not has_index("accounts", "ix_accounts_user_id"):
+        op.create_index("ix_accounts_user_id", "accounts", ["user_id"])
+    # Покрывается составным индексом, который начинается с game; в offline-режиме
+    # он есть, как и во всех БД на предыдущей ревизии
+    if context.is_offline_mode() or has_index("accounts", "ix_accounts_game"):
+        op.drop_index("ix_accounts_game", table_name="accounts")
+
+
+def downgrade() -> None:
+    op.create_index("ix_accounts_game", "accounts", ["game"])
+    op.drop_index("ix_accounts_user_id", table_name="accounts")
+    op.drop_index("ix_accounts_game_available_price", table_name="accounts")
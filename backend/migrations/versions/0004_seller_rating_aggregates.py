@@ -0,0 +1,49 @@
+"""Агрегаты рейтинга продавца: users.review_count и users.rating_sum
+
+Revision ID: 0004_seller_rating_aggregates
+Revises: 0003_account_search_indexes
+Create Date: 2026-10-18 12:00:03
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.database.migrations import has_column
+
+# revision identifiers, used by Alembic.
+revision: str = "0004_seller_rating_aggregates"
+down_revision: Union[str, None] = "0003_account_search_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if has_column("users", "review_count"):
+        return
+    op.add_column("users", sa.Column("review_count", sa.Integer(), server_default="0", nullable=False))
+    op.add_column("users", sa.Column("rating_sum", sa.Integer(), server_default="0", nullable=False))
+    # Агрегаты по уже оставленным отзывам; рейтинг, заданный клиентом, заменяется вычисленным
+    op.execute(
+        """
+        UPDATE users SET
+            review_count = (
+                SELECT COUNT(*) FROM reviews JOIN deals ON deals.id = reviews.deal_id
+                WHERE deals.seller_id = users.id
+            ),
+            rating_sum = (
+                SELECT COALESCE(SUM(reviews.rating), 0) FROM reviews JOIN deals ON deals.id = reviews.deal_id
+                WHERE deals.seller_id = users.id
+            )
+        """
+    )
+    op.execute(
+        "UPDATE users SET rating = CASE WHEN review_count > 0 THEN rating_sum * 1.0 / review_count ELSE 0.0 END"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("users") as batch:
+        batch.drop_column("rating_sum")
+        batch.drop_column("review_count")
@@ -0,0 +1,45 @@
+"""Очередь уведомлений notifications с захватом сообщений отправщиком
+
+Revision ID: 0005_notifications
+Revises: 0004_seller_rating_aggregates
+Create Date: 2026-10-18 12:00:04
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.database.migrations import has_column, has_table
+
+# revision identifiers, used by Alembic.
+revision: str = "0005_notifications"
+down_revision: Union[str, None] = "0004_seller_rating_aggregates"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not has_table("notifications"):
+        op.create_table(
+            "notifications",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+            sa.Column("chat_id", sa.Integer(), nullable=False),
+            sa.Column("text", sa.Text(), nullable=False),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("attempts", sa.Integer(), nullable=False),
+            sa.Column("next_attempt_at", sa.DateTime(), nullable=False),
+            sa.Column("sent_at", sa.DateTime(), nullable=True),
+            sa.Column("last_error", sa.String(), nullable=True),
+        )
+        op.create_index("ix_notifications_id", "notifications", ["id"])
+        op.create_index("ix_notifications_status_next_attempt", "notifications", ["status", "next_attempt_at"])
+    if not has_column("notifications", "locked_by"):
+        op.add_column("notifications", sa.Column("locked_by", sa.String(), nullable=True))
+        op.add_column("notifications", sa.Column("locked_until", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_table("notifications")
@@ -0,0 +1,29 @@
+"""Версия сделки deals.version для условных переходов статуса
+
+Revision ID: 0006_deal_version
+Revises: 0005_notifications
+Create Date: 2026-10-18 12:00:05
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.database.migrations import has_column
+
+# revision identifiers, used by Alembic.
+revision: str = "0006_deal_version"
+down_revision: Union[str, None] = "0005_notifications"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not has_column("deals", "version"):
+        op.add_column("deals", sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("deals") as batch:
+        batch.drop_column("version")
@@ -0,0 +1,43 @@
+"""Сохраненные ответы на POST-запросы с Idempotency-Key
+
+Revision ID: 0007_idempotency_keys
+Revises: 0006_deal_version
+Create Date: 2026-10-18 12:00:06
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.database.migrations import has_column, has_table
+
+# revision identifiers, used by Alembic.
+revision: str = "0007_idempotency_keys"
+down_revision: Union[str, None] = "0006_deal_version"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not has_table("idempotency_keys"):
+        op.create_table(
+            "idempotency_keys",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+            sa.Column("key", sa.String(), nullable=False, unique=True),
+            sa.Column("request_hash", sa.String(), nullable=False),
+            sa.Column("status_code", sa.Integer(), nullable=True),
+            sa.Column("body", sa.Text(), nullable=True),
+            sa.Column("media_type", sa.String(), nullable=True),
+            sa.Column("expires_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index("ix_idempotency_keys_id", "idempotency_keys", ["id"])
+        op.create_index("ix_idempotency_keys_expires_at", "idempotency_keys", ["expires_at"])
+    if not has_column("idempotency_keys", "headers"):
+        op.add_column("idempotency_keys", sa.Column("headers", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_table("idempotency_keys")
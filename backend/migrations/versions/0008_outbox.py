@@ -0,0 +1,51 @@
+"""Transactional outbox: события outbox и позиции потребителей outbox_cursors
+
+Revision ID: 0008_outbox
+Revises: 0007_idempotency_keys
+Create Date: 2026-10-18 12:00:07
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.database.migrations import has_table
+
+# revision identifiers, used by Alembic.
+revision: str = "0008_outbox"
+down_revision: Union[str, None] = "0007_idempotency_keys"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not has_table("outbox"):
+        op.create_table(
+            "outbox",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+            sa.Column("topic", sa.String(), nullable=False),
+            sa.Column("aggregate_id", sa.Integer(), nullable=False),
+            sa.Column("payload", sa.JSON(), nullable=False),
+            sqlite_autoincrement=True,
+        )
+        op.create_index("ix_outbox_id", "outbox", ["id"])
+    if not has_table("outbox_cursors"):
+        op.create_table(
+            "outbox_cursors",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+            sa.Column("consumer", sa.String(), nullable=False, unique=True),
+            sa.Column("position", sa.Integer(), nullable=False),
+            sa.Column("locked_by", sa.String(), nullable=True),
+            sa.Column("locked_until", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_outbox_cursors_id", "outbox_cursors", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("outbox_cursors")
+    op.drop_table("outbox")
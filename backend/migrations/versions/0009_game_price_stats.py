@@ -0,0 +1,46 @@
+"""Сводка цен по играм game_price_stats и индекс accounts.updated_at
+
+Revision ID: 0009_game_price_stats
+Revises: 0008_outbox
+Create Date: 2026-10-18 12:00:08
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.database.migrations import has_index, has_table
+
+# revision identifiers, used by Alembic.
+revision: str = "0009_game_price_stats"
+down_revision: Union[str, None] = "0008_outbox"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not has_table("game_price_stats"):
+        op.create_table(
+            "game_price_stats",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+            sa.Column("game", sa.String(), nullable=False, unique=True),
+            sa.Column("count", sa.Integer(), nullable=False),
+            sa.Column("min_price", sa.Float(), nullable=False),
+            sa.Column("max_price", sa.Float(), nullable=False),
+            sa.Column("mean_price", sa.Float(), nullable=False),
+            sa.Column("p25", sa.Float(), nullable=False),
+            sa.Column("p50", sa.Float(), nullable=False),
+            sa.Column("p75", sa.Float(), nullable=False),
+            sa.Column("histogram", sa.JSON(), nullable=False),
+        )
+        op.create_index("ix_game_price_stats_id", "game_price_stats", ["id"])
+    if not has_index("accounts", "ix_accounts_updated_at"):
+        op.create_index("ix_accounts_updated_at", "accounts", ["updated_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_accounts_updated_at", table_name="accounts")
+    op.drop_table("game_price_stats")
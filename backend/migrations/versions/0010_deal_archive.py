@@ -0,0 +1,66 @@
+"""Архив завершенных сделок deals_archive, reviews_archive и индекс deals по статусу
+
+Revision ID: 0010_deal_archive
+Revises: 0009_game_price_stats
+Create Date: 2026-10-18 12:00:09
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from app.database.migrations import has_index, has_table
+
+# revision identifiers, used by Alembic.
+revision: str = "0010_deal_archive"
+down_revision: Union[str, None] = "0009_game_price_stats"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Тип dealstatus уже создан вместе с deals
+DEAL_STATUS = sa.Enum("PENDING", "COMPLETED", "CANCELLED", name="dealstatus").with_variant(
+    postgresql.ENUM("PENDING", "COMPLETED", "CANCELLED", name="dealstatus", create_type=False), "postgresql"
+)
+
+
+def upgrade() -> None:
+    if not has_index("deals", "ix_deals_status_created_at_id"):
+        op.create_index("ix_deals_status_created_at_id", "deals", ["status", "created_at", "id"])
+    if not has_table("deals_archive"):
+        op.create_table(
+            "deals_archive",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+            sa.Column("seller_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("buyer_id", sa.Integer(), sa.ForeignKey("users.id")),
+            sa.Column("account_id", sa.Integer(), sa.ForeignKey("accounts.id")),
+            sa.Column("status", DEAL_STATUS, nullable=False),
+            sa.Column("version", sa.Integer(), nullable=False),
+            sa.Column("archived_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index("ix_deals_archive_id", "deals_archive", ["id"])
+        op.create_index("ix_deals_archive_seller_id", "deals_archive", ["seller_id"])
+        op.create_index("ix_deals_archive_buyer_id", "deals_archive", ["buyer_id"])
+        op.create_index("ix_deals_archive_created_at_id", "deals_archive", ["created_at", "id"])
+        op.create_index("ix_deals_archive_status_created_at_id", "deals_archive", ["status", "created_at", "id"])
+    if not has_table("reviews_archive"):
+        op.create_table(
+            "reviews_archive",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("updated_at", sa.DateTime()),
+            sa.Column("deal_id", sa.Integer(), sa.ForeignKey("deals_archive.id"), unique=True),
+            sa.Column("rating", sa.Integer()),
+            sa.Column("comment", sa.String(), nullable=True),
+            sa.Column("archived_at", sa.DateTime(), nullable=False),
+        )
+        op.create_index("ix_reviews_archive_id", "reviews_archive", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("reviews_archive")
+    op.drop_table("deals_archive")
+    op.drop_index("ix_deals_status_created_at_id", table_name="deals")
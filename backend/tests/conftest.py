@@ -0,0 +1,93 @@
+import os
+import tempfile
+from pathlib import Path
+
+# Окружение задается до импорта приложения: настройки читаются при импорте
+DB_PATH = Path(tempfile.mkdtemp(prefix="trustytrade-tests-")) / "test.db"
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+os.environ["ENV"] = "development"
+os.environ["DB_PROFILE"] = "development"
+os.environ["BOT_TOKEN"] = "test"
+
+import httpx
+import pytest
+
+from app.database.config import get_engine
+from app.database.fts import ensure_accounts_fts
+from app.database.migrations import upgrade_schema
+from app.database.routing import write_stickiness
+from app.main import app
+from app.utils.idempotency import idempotency_cache
+from app.utils.response_cache import response_cache
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db_schema():
+    """Новая БД на каждый тест: та же схема, что создает приложение при старте"""
+    # Движок development-профиля не держит соединений (NullPool), файл можно удалить
+    DB_PATH.unlink(missing_ok=True)
+    async with get_engine().begin() as conn:
+        await conn.run_sync(upgrade_schema)
+        await ensure_accounts_fts(conn)
+    response_cache.clear()
+    idempotency_cache.clear()
+    write_stickiness.clear()
+    yield
+
+
+@pytest.fixture
+async def client(db_schema):
+    """HTTP-клиент к приложению без запуска сервера и фоновых задач"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+async def make_user(client):
+    """Создает пользователя через API"""
+    counter = iter(range(1, 1_000_000))
+
+    async def make(username: str = None) -> dict:
+        telegram_id = next(counter)
+        response = await client.post("/api/v1/users/", json={
+            "telegram_id": telegram_id, "username": username or f"user{telegram_id}",
+        })
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    return make
+
+
+@pytest.fixture
+async def make_account(client):
+    """Создает объявление через API"""
+    async def make(user_id: int, game: str = "Dota 2", price: float = 1000.0, **fields) -> dict:
+        response = await client.post("/api/v1/accounts/", json={
+            "user_id": user_id, "game": game, "price": price, **fields,
+        })
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    return make
+
+
+@pytest.fixture
+async def make_deal(client, make_user, make_account):
+    """Создает сделку между новыми продавцом и покупателем"""
+    async def make(seller: dict = None, buyer: dict = None) -> dict:
+        seller = seller or await make_user()
+        buyer = buyer or await make_user()
+        account = await make_account(seller["id"])
+        response = await client.post("/api/v1/deals/", json={
+            "seller_id": seller["id"], "buyer_id": buyer["id"], "account_id": account["id"],
+        })
+        assert response.status_code == 200, response.text
+        return response.json()
+
+    return make
@@ -0,0 +1,23 @@
+import pytest
+from sqlalchemy import insert
+
+from app.database.config import new_session
+from app.models.account import Account
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_search_skips_accounts_without_game(client, make_user, make_account):
+    seller = await make_user()
+    await make_account(seller["id"], game="Dota 2", price=100)
+    await make_account(seller["id"], game="CS2", price=200)
+    async with new_session() as db:
+        await db.execute(insert(Account), [{"user_id": seller["id"], "game": None, "price": 300, "is_available": True}])
+        await db.commit()
+
+    response = await client.get("/api/v1/accounts/search")
+    assert response.status_code == 200
+    result = response.json()
+    assert {facet["game"] for facet in result["facets"]} == {"Dota 2", "CS2"}
+    assert result["total"] == 2
+    assert [item["game"] for item in result["items"]] == ["CS2", "Dota 2"]
@@ -0,0 +1,126 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
+
+from app.main import app
+from app.utils import broadcaster
+from app.utils.broadcaster import DROPPED_MESSAGE, RETRY_MESSAGE, ListingBroadcaster, publish_listing
+from app.utils.streaming import StreamBypassMiddleware
+
+pytestmark = pytest.mark.anyio
+
+
+def events(subscriber) -> list:
+    """События listing из буфера подписчика"""
+    return [
+        json.loads(message.decode().split("data: ", 1)[1])
+        for message in subscriber.buffer
+        if b"event: listing" in message
+    ]
+
+
+@pytest.fixture
+async def feed(monkeypatch):
+    """Отдельная лента вместо глобальной listing_broadcaster"""
+    feed = ListingBroadcaster(buffer_size=4, max_subscribers=10, heartbeat_interval=3600)
+    monkeypatch.setattr(broadcaster, "listing_broadcaster", feed)
+    yield feed
+    feed.close()
+
+
+async def test_events_reach_only_subscribers_of_their_game(feed):
+    dota, cs, everything = feed.subscribe(["Dota 2"]), feed.subscribe(["CS2"]), feed.subscribe()
+    publish_listing("updated", 1, "Dota 2", {"price": 100, "description": "long text"})
+
+    assert events(dota) == [{"type": "updated", "id": 1, "game": "Dota 2", "price": 100}]
+    assert events(cs) == []
+    assert events(everything) == events(dota)
+
+
+async def test_game_change_reaches_old_and_new_game(feed):
+    dota, cs, other = feed.subscribe(["Dota 2"]), feed.subscribe(["CS2"]), feed.subscribe(["Rust"])
+    publish_listing("updated", 1, "CS2", {"game": "CS2"}, previous_game="Dota 2")
+
+    assert events(dota) == events(cs) == [{"type": "updated", "id": 1, "game": "CS2"}]
+    assert events(other) == []
+    # Одно событие на публикацию, сколько бы игр его ни получили
+    assert feed.stats()["events"] == 1
+
+
+async def test_overflow_sends_dropped_and_unsubscribes(feed):
+    slow, reader = feed.subscribe(["Dota 2"]), feed.subscribe(["Dota 2"])
+    for price in range(feed.buffer_size + 1):
+        publish_listing("updated", 1, "Dota 2", {"price": price})
+        reader.buffer.clear()
+
+    assert slow.closed and slow.dropped
+    assert feed.stats() == {"subscribers": 1, "events": feed.buffer_size + 1, "dropped": 1}
+    assert [chunk async for chunk in feed.stream(slow)] == [RETRY_MESSAGE, DROPPED_MESSAGE]
+
+    # Отключенный подписчик больше ничего не получает
+    publish_listing("updated", 1, "Dota 2", {"price": 0})
+    assert slow.buffer == []
+    assert len(reader.buffer) == 1
+
+
+async def test_stream_is_refused_at_subscriber_limit(client, monkeypatch):
+    monkeypatch.setattr(broadcaster.listing_broadcaster, "max_subscribers", 0)
+    response = await client.get("/api/v1/accounts/stream")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
+
+
+async def test_stream_paths_bypass_http_middlewares():
+    dispatched = []
+
+    async def dispatch(request: Request, call_next):
+        dispatched.append(request.url.path)
+        return await call_next(request)
+
+    sample = FastAPI()
+    sample.add_middleware(StreamBypassMiddleware, dispatch=dispatch)
+    for path in ("/api/v1/accounts/stream", "/api/v1/accounts/"):
+        sample.add_api_route(path, lambda: PlainTextResponse("ok"))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=sample), base_url="http://test") as client:
+        for path in ("/api/v1/accounts/stream", "/api/v1/accounts/"):
+            assert (await client.get(path)).status_code == 200
+    assert dispatched == ["/api/v1/accounts/"]
+
+
+async def test_stream_delivers_account_updates(client, make_user, make_account):
+    seller = await make_user()
+    account = await make_account(seller["id"], game="Dota 2")
+    chunks = asyncio.Queue()
+    disconnected = asyncio.Event()
+
+    async def receive():
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            await chunks.put(message["body"])
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/api/v1/accounts/stream",
+        "raw_path": b"/api/v1/accounts/stream", "root_path": "", "query_string": b"game=Dota+2",
+        "headers": [(b"host", b"test")], "client": ("127.0.0.1", 1), "server": ("test", 80),
+    }
+    stream = asyncio.create_task(app(scope, receive, send))
+    try:
+        assert await asyncio.wait_for(chunks.get(), 5) == RETRY_MESSAGE
+        await client.put(f"/api/v1/accounts/{account['id']}", json={"price": 1500})
+        chunk = await asyncio.wait_for(chunks.get(), 5)
+        assert json.loads(chunk.decode().split("data: ", 1)[1]) == {
+            "type": "updated", "id": account["id"], "game": "Dota 2", "price": 1500,
+        }
+    finally:
+        disconnected.set()
+        broadcaster.listing_broadcaster.close()
+        await asyncio.wait_for(stream, 5)
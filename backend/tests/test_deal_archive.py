@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from app.database.archive import archive_finished_deals
+from app.database.config import new_session
+from app.models.deal import ArchivedDeal, Deal
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def deals(client, make_user, make_deal):
+    """10 сделок одного продавца: первые 7 завершены с отзывом, остальные в работе"""
+    seller = await make_user()
+    created = [await make_deal(seller=seller) for _ in range(10)]
+    for deal in created[:7]:
+        await client.put(f"/api/v1/deals/{deal['id']}", json={"status": "completed"})
+        await client.post(f"/api/v1/deals/{deal['id']}/reviews/", json={"deal_id": deal["id"], "rating": 4})
+    return created
+
+
+async def walk(client, params: dict) -> list:
+    """id всех сделок: по курсору страницами по 3 и offset-страницами по 3"""
+    by_cursor, cursor = [], None
+    while True:
+        response = await client.get("/api/v1/deals/", params={**params, "limit": 3, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        by_cursor.extend(deal["id"] for deal in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor or not response.json():
+            break
+    by_offset = []
+    for skip in range(0, 12, 3):
+        response = await client.get("/api/v1/deals/", params={**params, "limit": 3, "skip": skip})
+        by_offset.extend(deal["id"] for deal in response.json())
+    return [by_cursor, by_offset]
+
+
+async def test_include_archived_pages_match_pages_before_archival(client, deals):
+    before = {status: await walk(client, {"status": status} if status else {}) for status in (None, "completed", "pending")}
+    assert before[None][0] == [deal["id"] for deal in deals]
+
+    async with new_session() as db:
+        archived = await archive_finished_deals(db, older_than=timedelta(0))
+        hot = await db.scalar(select(func.count()).select_from(Deal))
+        cold = await db.scalar(select(func.count()).select_from(ArchivedDeal))
+    # Сделка с последним отзывом остается в горячей таблице (см. _archive_batch)
+    assert archived == 6
+    assert (hot, cold) == (4, 6)
+
+    for status, pages in before.items():
+        params = {"include_archived": "true", **({"status": status} if status else {})}
+        assert await walk(client, params) == pages
+    # Без include_archived видны только горячие сделки
+    assert (await walk(client, {}))[0] == [deal["id"] for deal in deals[6:]]
+
+
+async def test_archived_deal_and_review_are_readable_on_request(client, deals):
+    async with new_session() as db:
+        await archive_finished_deals(db, older_than=timedelta(0))
+    deal_id = deals[0]["id"]
+
+    assert (await client.get(f"/api/v1/deals/{deal_id}")).status_code == 404
+    response = await client.get(f"/api/v1/deals/{deal_id}", params={"include_archived": "true", "expand": "review"})
+    assert response.status_code == 200
+    assert response.json()["archived_at"] is not None
+    assert response.json()["review"]["rating"] == 4
+
+    response = await client.get(f"/api/v1/deals/{deal_id}/review/", params={"include_archived": "true"})
+    assert response.status_code == 200
+    assert response.json()["deal_id"] == deal_id
@@ -0,0 +1,88 @@
+import pytest
+from sqlalchemy import select
+
+from app.database.config import new_session
+from app.models.account import Account
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_deal_is_created_pending_whatever_status_is_sent(client, make_user, make_account):
+    seller, buyer = await make_user(), await make_user()
+    account = await make_account(seller["id"])
+    response = await client.post("/api/v1/deals/", json={
+        "seller_id": seller["id"], "buyer_id": buyer["id"], "account_id": account["id"], "status": "completed",
+    })
+    assert response.status_code == 200
+    assert response.json()["status"] == "pending"
+    assert response.json()["version"] == 1
+
+
+@pytest.mark.parametrize("target", ["completed", "cancelled"])
+async def test_pending_deal_moves_to_final_status_once(client, make_deal, target):
+    deal = await make_deal()
+    response = await client.put(f"/api/v1/deals/{deal['id']}", json={"status": target, "version": 1})
+    assert response.status_code == 200
+    assert response.json()["status"] == target
+    assert response.json()["version"] == 2
+
+    # Из конечного статуса переходов нет
+    other = "cancelled" if target == "completed" else "completed"
+    for status in (other, "pending"):
+        response = await client.put(f"/api/v1/deals/{deal['id']}", json={"status": status})
+        assert response.status_code == 409
+
+
+async def test_same_status_update_returns_current_deal(client, make_deal):
+    deal = await make_deal()
+    response = await client.put(f"/api/v1/deals/{deal['id']}", json={"status": "pending"})
+    assert response.status_code == 200
+    assert response.json()["status"] == "pending"
+    assert response.json()["version"] == 1
+
+    # Повтор успешного перехода тоже не ошибка и не меняет версию
+    for _ in range(2):
+        response = await client.put(f"/api/v1/deals/{deal['id']}", json={"status": "completed", "version": 1})
+        assert response.status_code == 200
+        assert response.json()["version"] == 2
+    response = await client.put(f"/api/v1/deals/{deal['id']}", json={"status": "completed"})
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+
+
+async def test_same_status_with_foreign_version_is_conflict(client, make_deal):
+    deal = await make_deal()
+    response = await client.put(f"/api/v1/deals/{deal['id']}", json={"status": "cancelled", "version": 1})
+    assert response.status_code == 200
+
+    # Сделка уже отменена (версия 2), но версия клиента не предшествует этому
+    # переходу и не совпадает с текущей: это конфликт, а не повтор
+    for version in (0, 3, 5):
+        response = await client.put(f"/api/v1/deals/{deal['id']}", json={"status": "cancelled", "version": version})
+        assert response.status_code == 409
+        assert response.json()["detail"] == "Deal was modified concurrently"
+
+
+async def test_stale_version_is_rejected(client, make_deal):
+    deal = await make_deal()
+    response = await client.put(f"/api/v1/deals/{deal['id']}", json={"status": "cancelled", "version": 5})
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Deal was modified concurrently"
+
+
+async def account_available(account_id: int) -> bool:
+    async with new_session() as db:
+        return await db.scalar(select(Account.is_available).where(Account.id == account_id))
+
+
+async def test_cancel_releases_account(client, make_deal):
+    deal = await make_deal()
+    assert await account_available(deal["account_id"]) is False
+
+    await client.put(f"/api/v1/deals/{deal['id']}", json={"status": "cancelled"})
+    assert await account_available(deal["account_id"]) is True
+
+
+async def test_missing_deal_is_404(client):
+    response = await client.put("/api/v1/deals/999", json={"status": "completed"})
+    assert response.status_code == 404
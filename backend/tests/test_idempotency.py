@@ -0,0 +1,114 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+
+from app.config import settings
+from app.database.config import new_session
+from app.main import app
+from app.models.deal import Deal
+from app.utils.idempotency import (
+    IDEMPOTENCY_HEADER, REPLAYED_HEADER, idempotency_cache, idempotency_middleware,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+async def deal_count() -> int:
+    async with new_session() as db:
+        return await db.scalar(select(func.count()).select_from(Deal))
+
+
+@pytest.fixture
+async def deal_request(make_user, make_account):
+    seller, buyer = await make_user(), await make_user()
+    account = await make_account(seller["id"])
+    return {"seller_id": seller["id"], "buyer_id": buyer["id"], "account_id": account["id"]}
+
+
+async def test_concurrent_retries_create_one_deal(client, deal_request):
+    headers = {IDEMPOTENCY_HEADER: "deal-1"}
+    responses = await asyncio.gather(*[
+        client.post("/api/v1/deals/", json=deal_request, headers=headers) for _ in range(10)
+    ])
+
+    assert [response.status_code for response in responses] == [200] * 10
+    assert len({response.json()["id"] for response in responses}) == 1
+    assert sum(response.headers.get(REPLAYED_HEADER) == "true" for response in responses) == 9
+    assert await deal_count() == 1
+
+
+async def test_replay_keeps_original_headers(client, deal_request):
+    headers = {IDEMPOTENCY_HEADER: "deal-2"}
+    first = await client.post("/api/v1/deals/", json=deal_request, headers=headers)
+    replay = await client.post("/api/v1/deals/", json=deal_request, headers=headers)
+
+    assert replay.headers[REPLAYED_HEADER] == "true"
+    assert replay.json() == first.json()
+    for name in ("content-type", "content-length"):
+        assert replay.headers[name] == first.headers[name]
+
+
+async def test_reused_key_with_other_body_is_rejected(client, deal_request):
+    headers = {IDEMPOTENCY_HEADER: "deal-3"}
+    await client.post("/api/v1/deals/", json=deal_request, headers=headers)
+    response = await client.post("/api/v1/deals/", json={**deal_request, "buyer_id": 1}, headers=headers)
+    assert response.status_code == 422
+
+
+async def test_keys_without_telegram_user_are_scoped_by_client_ip(client, make_user):
+    seller = await make_user()
+    responses = []
+    for host in ("10.0.0.1", "10.0.0.2"):
+        transport = httpx.ASGITransport(app=app, client=(host, 1))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as other:
+            responses.append(await other.post("/api/v1/accounts/", headers={IDEMPOTENCY_HEADER: "same"}, json={
+                "user_id": seller["id"], "game": f"Game from {host}", "price": 100,
+            }))
+
+    assert [response.status_code for response in responses] == [200, 200]
+    assert REPLAYED_HEADER not in responses[1].headers
+    assert responses[0].json()["id"] != responses[1].json()["id"]
+
+
+def post_request(path: str, key: str, body: bytes) -> Request:
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return Request({
+        "type": "http", "method": "POST", "path": path, "query_string": b"",
+        "headers": [(IDEMPOTENCY_HEADER.lower().encode(), key.encode())],
+        "client": ("10.0.0.3", 1),
+    }, receive)
+
+
+async def test_slow_handler_keeps_its_claim_past_wait_timeout(db_schema, monkeypatch):
+    monkeypatch.setattr(settings, "IDEMPOTENCY_WAIT_TIMEOUT", 0.2)
+    monkeypatch.setattr(settings, "IDEMPOTENCY_LEASE", 0.3)
+    calls = 0
+
+    async def slow_handler(request):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(1.0)
+        return StreamingResponse(iter([b'{"id": 1}']), media_type="application/json")
+
+    first = asyncio.create_task(idempotency_middleware(post_request("/api/v1/deals/", "slow", b"{}"), slow_handler))
+    await asyncio.sleep(0.7)
+
+    # Другой процесс (без общего in-flight события) после истечения и
+    # ожидания, и исходной аренды: ключ все еще занят, обработчик не
+    # выполняется второй раз
+    inflight, idempotency_cache.inflight = idempotency_cache.inflight, {}
+    second = await idempotency_middleware(post_request("/api/v1/deals/", "slow", b"{}"), slow_handler)
+    idempotency_cache.inflight = inflight
+    assert second.status_code == 409
+
+    assert (await first).status_code == 200
+    idempotency_cache.clear()
+    replay = await idempotency_middleware(post_request("/api/v1/deals/", "slow", b"{}"), slow_handler)
+    assert replay.headers[REPLAYED_HEADER] == "true"
+    assert calls == 1
@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.database.config import get_engine
+from app.utils.metrics import DB_STATEMENT_LATENCY
+from app.utils.query_counter import track_queries
+
+pytestmark = pytest.mark.anyio
+
+
+def observed(operation: str) -> float:
+    return DB_STATEMENT_LATENCY.labels(operation)._sum.get()
+
+
+async def test_failed_statements_leave_no_timing_state(db_schema):
+    async with get_engine().connect() as conn:
+        with track_queries() as stats:
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    await conn.execute(text("SELECT * FROM missing_table"))
+            before = observed("SELECT")
+            await conn.execute(text("SELECT 1"))
+        # info пула соединения, общее для всех его использований
+        info = conn.sync_connection.info
+
+    # Упавшие запросы не учтены и не оставили отметок времени в соединении
+    assert stats.count == 1
+    assert observed("SELECT") > before
+    assert not any(isinstance(value, list) and value for value in info.values())
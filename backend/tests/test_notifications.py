@@ -0,0 +1,104 @@
+import asyncio
+import re
+from collections import Counter
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from sqlalchemy import func, select
+
+from app.database.config import new_session
+from app.models.notification import Notification
+from app.models.user import User
+from app.utils.notifications import NotificationSender, SendResult, notify_users
+
+pytestmark = pytest.mark.anyio
+
+
+class RecordingSender(NotificationSender):
+    """Отправщик, который вместо Bot API записывает сообщения в общий список"""
+
+    def __init__(self, messages: list):
+        super().__init__(token="test")
+        self.messages = messages
+
+    async def send_message(self, chat_id: int, text: str) -> SendResult:
+        await asyncio.sleep(0.01)
+        self.messages.append(text)
+        return SendResult("sent")
+
+
+async def queue_notifications(chats: int, per_chat: int) -> None:
+    async with new_session() as session:
+        session.add_all([User(telegram_id=100 + i, username=f"user{i}") for i in range(chats)])
+        await session.flush()
+        for event in range(chats * per_chat):
+            await notify_users(session, [1 + event % chats], f"Сделка #{event}: завершена")
+        await session.commit()
+
+
+async def statuses() -> dict:
+    async with new_session() as session:
+        result = await session.execute(select(Notification.status, func.count()).group_by(Notification.status))
+        return dict(result.all())
+
+
+async def test_concurrent_senders_send_each_notification_once(db_schema):
+    await queue_notifications(chats=20, per_chat=3)
+    messages = []
+    senders = [RecordingSender(messages) for _ in range(3)]
+    for _ in range(10):
+        await asyncio.gather(*[sender.process_batch() for sender in senders])
+        if await statuses() == {"sent": 60}:
+            break
+
+    delivered = Counter(re.findall(r"Сделка #(\d+)", "\n".join(messages)))
+    assert len(delivered) == 60
+    assert set(delivered.values()) == {1}
+
+
+async def test_expired_claim_is_taken_over(db_schema):
+    await queue_notifications(chats=2, per_chat=1)
+    now = datetime.utcnow()
+    async with new_session() as session:
+        rows = (await session.execute(select(Notification).order_by(Notification.id))).scalars().all()
+        # Первое сообщение захватил упавший процесс, второе - живой
+        rows[0].status, rows[0].locked_by, rows[0].locked_until = "sending", "dead", now - timedelta(seconds=1)
+        rows[1].status, rows[1].locked_by, rows[1].locked_until = "sending", "alive", now + timedelta(seconds=60)
+        await session.commit()
+
+    messages = []
+    await RecordingSender(messages).process_batch()
+    assert messages == ["Сделка #0: завершена"]
+    assert await statuses() == {"sent": 1, "sending": 1}
+
+
+def flooded_sender() -> NotificationSender:
+    """Отправщик, которому Bot API отвечает 429 для всех чатов"""
+    def flood(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(429, json={
+            "ok": False, "error_code": 429,
+            "description": "Too Many Requests: retry after 5", "parameters": {"retry_after": 5},
+        })
+
+    return NotificationSender(client=httpx.AsyncClient(transport=httpx.MockTransport(flood)), token="test")
+
+
+async def test_flood_limit_of_busy_chat_delays_only_that_chat():
+    sender = flooded_sender()
+    busy = sender._chat_bucket(1)
+    # Чат только что получил сообщение: 429 - его собственный лимит
+    busy.take()
+    await sender._send_digest(1, busy, [Notification(text="x")])
+    assert not busy.available()
+    assert sender._chat_bucket(2).available()
+    assert sender.global_bucket.available()
+
+
+async def test_flood_limit_of_idle_chat_delays_all_chats():
+    sender = flooded_sender()
+    idle = sender._chat_bucket(1)
+    # Чат давно ничего не получал и не мог превысить свой лимит: ограничен бот
+    await sender._send_digest(1, idle, [Notification(text="x")])
+    assert not idle.available()
+    assert not sender.global_bucket.available()
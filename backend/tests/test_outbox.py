@@ -0,0 +1,100 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+from app.database.config import new_session
+from app.models.notification import Notification
+from app.utils.notifications import notify_outbox_event
+from app.utils.outbox import (
+    DEAL_CREATED, DEAL_STATUS_CHANGED, REVIEW_CREATED, OutboxDispatcher,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def recording_dispatcher(fail_on: set = None) -> OutboxDispatcher:
+    """
+    Диспетчер с потребителем, который записывает доставленные события в notifications
+
+    Запись идет в сессию доставки, поэтому фиксируется ровно один раз
+    вместе с позицией потребителя, как записи настоящих обработчиков.
+    """
+    fail_on = fail_on if fail_on is not None else set()
+
+    async def handler(db, event):
+        if event.id in fail_on:
+            fail_on.discard(event.id)
+            raise RuntimeError("temporary failure")
+        db.add(Notification(chat_id=event.payload["deal_id"], text=event.topic, next_attempt_at=datetime.utcnow()))
+
+    dispatcher = OutboxDispatcher()
+    dispatcher.register("test", handler)
+    return dispatcher
+
+
+async def received() -> list:
+    async with new_session() as db:
+        result = await db.execute(select(Notification.text, Notification.chat_id).order_by(Notification.id))
+        return [tuple(row) for row in result]
+
+
+async def drain(dispatcher: OutboxDispatcher) -> None:
+    for _ in range(10):
+        for consumer in dispatcher.consumers.values():
+            consumer.retry_at = 0.0
+        await dispatcher.process_once()
+
+
+async def complete_deal_with_review(client, make_deal) -> dict:
+    deal = await make_deal()
+    await client.put(f"/api/v1/deals/{deal['id']}", json={"status": "completed"})
+    await client.post(f"/api/v1/deals/{deal['id']}/reviews/", json={"deal_id": deal["id"], "rating": 5})
+    return deal
+
+
+async def test_events_are_delivered_once_in_order(client, make_deal):
+    deal = await complete_deal_with_review(client, make_deal)
+    dispatcher = recording_dispatcher()
+    await drain(dispatcher)
+
+    expected = [(DEAL_CREATED, deal["id"]), (DEAL_STATUS_CHANGED, deal["id"]), (REVIEW_CREATED, deal["id"])]
+    assert await received() == expected
+
+    # Позиция сохранена: новый диспетчер (перезапуск процесса) не повторяет доставку
+    await dispatcher.stop()
+    await drain(recording_dispatcher())
+    assert await received() == expected
+
+
+async def test_failed_event_is_retried_without_redelivering_earlier_ones(client, make_deal):
+    await complete_deal_with_review(client, make_deal)
+    # Второе событие падает один раз
+    await drain(recording_dispatcher(fail_on={2}))
+    assert [topic for topic, _ in await received()] == [DEAL_CREATED, DEAL_STATUS_CHANGED, REVIEW_CREATED]
+
+
+async def test_only_lease_holder_delivers(client, make_deal):
+    await complete_deal_with_review(client, make_deal)
+    first, second = recording_dispatcher(), recording_dispatcher()
+    await drain(first)
+    await drain(second)
+    assert len(await received()) == 3
+    assert not await second.process_consumer(second.consumers["test"])
+    assert second.consumers["test"].lease_until is None
+
+
+async def test_notification_consumer_queues_messages(client, make_deal):
+    deal = await complete_deal_with_review(client, make_deal)
+    dispatcher = OutboxDispatcher()
+    dispatcher.register("notifications", notify_outbox_event)
+    await drain(dispatcher)
+
+    async with new_session() as db:
+        texts = (await db.execute(select(Notification.text).order_by(Notification.id))).scalars().all()
+    # Завершение сделки - обоим участникам, отзыв - продавцу
+    assert texts == [
+        f"Сделка #{deal['id']}: завершена",
+        f"Сделка #{deal['id']}: завершена",
+        f"Новый отзыв по сделке #{deal['id']}: 5/5",
+    ]
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert
+
+from app.database.config import new_session
+from app.database.price_stats import refresh_price_stats
+from app.models.account import Account
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_stats_summarize_available_priced_accounts(client, make_user, make_account):
+    seller = await make_user()
+    for price in (100, 200, 300, 400, 5000):
+        await make_account(seller["id"], game="Dota 2", price=price)
+    async with new_session() as db:
+        # Объявление без цены в сводку не попадает
+        await db.execute(insert(Account), [{"user_id": seller["id"], "game": "Dota 2", "price": None, "is_available": True}])
+        await db.commit()
+        assert await refresh_price_stats(db) == 1
+
+    response = await client.get("/api/v1/accounts/stats", params={"game": "Dota 2"})
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["count"] == 5
+    assert stats["min"] == 100
+    assert stats["max"] == 5000
+    assert stats["p50"] == 300
+    assert sum(bucket["count"] for bucket in stats["histogram"]) == 5
+
+
+async def test_unpriced_accounts_do_not_force_refresh(client, make_user, make_account):
+    seller = await make_user()
+    await make_account(seller["id"], game="Dota 2", price=100)
+    async with new_session() as db:
+        await db.execute(insert(Account), [{"user_id": seller["id"], "game": "Dota 2", "price": None, "is_available": True}])
+        await db.commit()
+        await refresh_price_stats(db)
+        since = datetime.utcnow()
+        # Ничего не менялось: инкрементальный проход не пересчитывает ни одной игры
+        assert await refresh_price_stats(db, since) == 0
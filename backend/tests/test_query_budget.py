@@ -0,0 +1,48 @@
+import pytest
+
+from app.utils.query_counter import assert_max_queries
+
+pytestmark = pytest.mark.anyio
+
+# Бюджет SQL-запросов не зависит от размера страницы: лишний запрос на
+# строку (N+1) сразу выходит за лимит
+ENDPOINT_BUDGETS = [
+    ("/api/v1/accounts/", 1),
+    ("/api/v1/accounts/1", 1),
+    ("/api/v1/accounts/user/1", 1),
+    ("/api/v1/accounts/search?game=Dota&sort=price_asc", 2),
+    ("/api/v1/users/", 1),
+    ("/api/v1/users/1", 1),
+    ("/api/v1/users/telegram/1", 1),
+    ("/api/v1/deals/", 1),
+    ("/api/v1/deals/?status=pending", 1),
+    ("/api/v1/deals/1", 1),
+]
+
+
+@pytest.fixture
+async def catalog(make_user, make_deal):
+    seller = await make_user()
+    for _ in range(5):
+        await make_deal(seller=seller)
+
+
+@pytest.mark.parametrize("url, budget", ENDPOINT_BUDGETS)
+async def test_read_endpoints_stay_within_query_budget(client, catalog, url, budget):
+    with assert_max_queries(budget):
+        response = await client.get(url)
+    assert response.status_code == 200, response.text
+
+
+@pytest.mark.parametrize("url", ["/api/v1/deals/1", "/api/v1/deals/"])
+async def test_full_expand_loads_relations_in_two_queries(client, catalog, url):
+    # Продавец, покупатель и аккаунт приходят JOIN-ом, отзывы - одним запросом на страницу
+    with assert_max_queries(2):
+        response = await client.get(url, params={"expand": "account,seller,buyer,review"})
+    assert response.status_code == 200, response.text
+    deals = response.json() if isinstance(response.json(), list) else [response.json()]
+    assert len(deals) >= 1
+    for deal in deals:
+        assert {"account", "seller", "buyer", "review"} <= set(deal)
+        assert deal["seller"]["id"] == deal["seller_id"]
+        assert deal["account"]["id"] == deal["account_id"]
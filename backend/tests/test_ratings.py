@@ -0,0 +1,76 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, update
+
+from app.database.config import new_session
+from app.database.ratings import rebuild_seller_ratings
+from app.models.deal import Review
+from app.models.user import User
+from app.routers.deals import update_review
+from app.schemas.deal import ReviewUpdate
+
+pytestmark = pytest.mark.anyio
+
+
+async def complete_with_review(client, deal: dict, rating: int) -> dict:
+    response = await client.put(f"/api/v1/deals/{deal['id']}", json={"status": "completed"})
+    assert response.status_code == 200, response.text
+    response = await client.post(f"/api/v1/deals/{deal['id']}/reviews/", json={"deal_id": deal["id"], "rating": rating})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def seller_aggregates(user_id: int):
+    async with new_session() as db:
+        result = await db.execute(select(User.review_count, User.rating_sum, User.rating).where(User.id == user_id))
+        return tuple(result.one())
+
+
+async def test_clients_cannot_set_rating(client):
+    response = await client.post("/api/v1/users/", json={"telegram_id": 1, "username": "seller", "rating": 5.0})
+    assert response.status_code == 200
+    user = response.json()
+    assert user["rating"] == 0.0
+
+    response = await client.put(f"/api/v1/users/{user['id']}", json={"rating": 5.0, "username": "renamed"})
+    assert response.status_code == 200
+    assert response.json()["rating"] == 0.0
+    assert response.json()["username"] == "renamed"
+
+
+async def test_reviews_keep_aggregates_consistent(client, make_user, make_deal):
+    seller = await make_user()
+    first = await make_deal(seller=seller)
+    second = await make_deal(seller=seller)
+    await complete_with_review(client, first, 5)
+    await complete_with_review(client, second, 2)
+    assert await seller_aggregates(seller["id"]) == (2, 7, 3.5)
+
+    response = await client.put(f"/api/v1/deals/{second['id']}/review/", json={"rating": 4, "comment": "ok"})
+    assert response.status_code == 200
+    assert response.json()["rating"] == 4
+    assert response.json()["comment"] == "ok"
+    assert await seller_aggregates(seller["id"]) == (2, 9, 4.5)
+
+    # Инкрементальные агрегаты совпадают с полным пересчетом
+    async with new_session() as db:
+        await rebuild_seller_ratings(db)
+    assert await seller_aggregates(seller["id"]) == (2, 9, 4.5)
+
+
+async def test_stale_review_update_does_not_apply_delta(client, make_user, make_deal):
+    seller = await make_user()
+    deal = await make_deal(seller=seller)
+    await complete_with_review(client, deal, 3)
+
+    async with new_session() as db:
+        # Отзыв прочитан до параллельного изменения и остается в сессии со старой оценкой
+        stale = (await db.execute(select(Review).where(Review.deal_id == deal["id"]))).scalar_one()
+        async with new_session() as other:
+            await other.execute(update(Review).where(Review.deal_id == deal["id"]).values(rating=1))
+            await other.commit()
+        with pytest.raises(HTTPException) as error:
+            await update_review(deal["id"], ReviewUpdate(rating=5), db)
+    assert error.value.status_code == 409
+    # Оценка 1 записана в обход агрегатов, поэтому сумма осталась от исходной оценки 3
+    assert await seller_aggregates(seller["id"]) == (1, 3, 3.0)
@@ -0,0 +1,69 @@
+import pytest
+
+from app.utils.response_cache import ResponseCache, account_tag
+
+pytestmark = pytest.mark.anyio
+
+
+async def get_cached(client, path: str):
+    response = await client.get(path)
+    assert response.status_code == 200
+    return response.headers["X-Cache"], response.json()
+
+
+async def test_account_update_evicts_tagged_responses(client, make_user, make_account):
+    seller = await make_user()
+    account = await make_account(seller["id"], price=100)
+    other = await make_account(seller["id"], price=200)
+    paths = ["/api/v1/accounts/", f"/api/v1/accounts/{account['id']}", f"/api/v1/accounts/{other['id']}"]
+    for path in paths:
+        assert (await get_cached(client, path))[0] == "MISS"
+        assert (await get_cached(client, path))[0] == "HIT"
+
+    response = await client.put(f"/api/v1/accounts/{account['id']}", json={"price": 150})
+    assert response.status_code == 200
+
+    # Список и карточка содержат аккаунт - вытеснены, чужая карточка - нет
+    status, body = await get_cached(client, f"/api/v1/accounts/{account['id']}")
+    assert (status, body["price"]) == ("MISS", 150)
+    status, body = await get_cached(client, "/api/v1/accounts/")
+    assert status == "MISS"
+    assert [item["price"] for item in body] == [150, 200]
+    assert (await get_cached(client, f"/api/v1/accounts/{other['id']}"))[0] == "HIT"
+
+
+async def test_deal_writes_evict_account_responses(client, make_user, make_account):
+    seller, buyer = await make_user(), await make_user()
+    account = await make_account(seller["id"])
+    other = await make_account(seller["id"])
+    paths = ["/api/v1/accounts/", f"/api/v1/accounts/{account['id']}", f"/api/v1/accounts/{other['id']}"]
+    for path in paths:
+        await get_cached(client, path)
+
+    deal = (await client.post("/api/v1/deals/", json={
+        "seller_id": seller["id"], "buyer_id": buyer["id"], "account_id": account["id"],
+    })).json()
+    assert [(await get_cached(client, path))[0] for path in paths] == ["MISS", "MISS", "HIT"]
+
+    # Отмена сделки возвращает аккаунт в продажу и снова вытесняет его ответы
+    await client.put(f"/api/v1/deals/{deal['id']}", json={"status": "cancelled"})
+    assert [(await get_cached(client, path))[0] for path in paths] == ["MISS", "MISS", "HIT"]
+
+
+def test_response_built_before_invalidation_is_not_cached():
+    cache = ResponseCache(max_entries=10, max_bytes=10000)
+    generation = cache.generation
+    # Запись завершилась, пока собирался ответ: он мог прочитать старые данные
+    cache.invalidate(account_tag(1))
+    entry = cache.set("/accounts/1", {"price": 100}, {account_tag(1)}, generation)
+    assert entry.body == b'{"price":100}'
+    assert cache.get("/accounts/1") is None
+
+    # Ответ реплики, которая могла отстать (generation=None), не кэшируется
+    cache.set("/accounts/1", {"price": 100}, {account_tag(1)}, None)
+    assert cache.get("/accounts/1") is None
+
+    cache.set("/accounts/1", {"price": 150}, {account_tag(1)}, cache.generation)
+    assert cache.get("/accounts/1").body == b'{"price":150}'
+    cache.invalidate(account_tag(1))
+    assert cache.get("/accounts/1") is None
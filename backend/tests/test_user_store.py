@@ -0,0 +1,92 @@
+import threading
+import time
+from typing import Dict, Optional
+
+import pytest
+
+from user_store import UserDataBackend, UserDataStore
+
+
+class DictBackend(UserDataBackend):
+    """Хранилище в словаре, общее для нескольких UserDataStore (процессов бота)"""
+
+    def __init__(self):
+        self.rows: Dict[int, str] = {}
+        self.loads = 0
+
+    def load(self, user_id: int) -> Optional[str]:
+        self.loads += 1
+        return self.rows.get(user_id)
+
+    def save_many(self, items: Dict[int, str]) -> None:
+        self.rows.update(items)
+
+
+def test_backend_must_implement_load_and_save_many():
+    class Incomplete(UserDataBackend):
+        def load(self, user_id: int) -> Optional[str]:
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_misses_are_cached_only_for_miss_ttl():
+    backend = DictBackend()
+    reader = UserDataStore(backend, ttl=3600, miss_ttl=0.05, flush_interval=0)
+    writer = UserDataStore(backend, flush_interval=0)
+
+    assert reader.get(1) is None
+    assert reader.get(1) is None
+    assert backend.loads == 1
+
+    # Данные записал другой процесс: после miss_ttl они видны
+    writer.set(1, {"balance": 10})
+    time.sleep(0.06)
+    assert reader.get(1) == {"balance": 10}
+
+    # Найденная запись живет полный ttl
+    loads = backend.loads
+    time.sleep(0.06)
+    assert reader.get(1) == {"balance": 10}
+    assert backend.loads == loads
+
+
+class BlockingBackend(DictBackend):
+    """save_many ждет разрешения, чтобы get() попал внутрь сброса"""
+
+    def __init__(self):
+        super().__init__()
+        self.saving = threading.Event()
+        self.release = threading.Event()
+
+    def save_many(self, items: Dict[int, str]) -> None:
+        self.saving.set()
+        self.release.wait(5)
+        super().save_many(items)
+
+
+def test_get_during_flush_sees_pending_write():
+    backend = BlockingBackend()
+    backend.rows[1] = '{"balance": 0}'
+    store = UserDataStore(backend, max_entries=1, flush_interval=3600)
+    try:
+        store.set(1, {"balance": 10})
+        # Вытесняем пользователя 1 из LRU: его запись есть только в буфере
+        store.set(2, {"balance": 20})
+
+        flusher = threading.Thread(target=store.flush)
+        flusher.start()
+        assert backend.saving.wait(5)
+        assert store.get(1) == {"balance": 10}
+
+        # Запись, пришедшая во время сохранения, не теряется после него
+        store.set(2, {"balance": 30})
+        backend.release.set()
+        flusher.join()
+        assert store.stats()["pending"] == 1
+        assert store.get(1) == {"balance": 10}
+    finally:
+        backend.release.set()
+        store.close()
+    assert backend.rows[2] == '{"balance": 30}'
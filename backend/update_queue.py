@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Очередь обработки обновлений Telegram, пришедших через вебхук
+
+Вебхук только кладет обновление в очередь и сразу отвечает Telegram.
+Обработка идет в пуле потоков: у каждого воркера своя ограниченная
+очередь, а обновления распределяются по chat_id, поэтому сообщения
+одного чата обрабатываются строго по порядку. Повторные доставки
+отбрасываются по update_id.
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+UPDATE_QUEUE_DEPTH = Gauge(
+    "bot_update_queue_depth",
+    "Обновлений в очереди на обработку"
+)
+UPDATE_QUEUE_WAIT = Histogram(
+    "bot_update_queue_wait_seconds",
+    "Время ожидания обновления в очереди"
+)
+UPDATES_DROPPED = Counter(
+    "bot_updates_dropped_total",
+    "Обновления, не принятые в очередь",
+    ["reason"]
+)
+
+# Сигнал воркеру завершиться
+_STOP = object()
+
+
+class UpdateQueue:
+    """Пул воркеров с шардированием по чату и отсечением повторов"""
+
+    def __init__(
+        self,
+        handler: Callable,
+        workers: int,
+        max_size: int,
+        dedup_size: int,
+        latency: Histogram = None,
+    ):
+        self.handler = handler
+        self.latency = latency
+        self.dedup_size = dedup_size
+        self._queues = [queue.Queue(maxsize=max(max_size // workers, 1)) for _ in range(workers)]
+        self._seen: "OrderedDict[int, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        UPDATE_QUEUE_DEPTH.set_function(self.depth)
+
+    def start(self) -> None:
+        """Запускает воркеры (повторный вызов ничего не делает)"""
+        with self._lock:
+            if self._threads:
+                return
+            for index, shard in enumerate(self._queues):
+                thread = threading.Thread(target=self._work, args=(shard,), name=f"update-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = None) -> None:
+        """Дожидается обработки уже принятых обновлений и останавливает воркеры"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for shard in self._queues:
+            shard.put(_STOP)
+        for thread in threads:
+            thread.join(timeout)
+
+    def submit(self, update) -> str:
+        """
+        Ставит обновление в очередь
+
+        Возвращает "queued", "duplicate" или "full". При переполнении
+        update_id не запоминается, чтобы повторная доставка от Telegram
+        была принята.
+        """
+        self.start()
+        update_id = update.update_id
+        with self._lock:
+            if update_id in self._seen:
+                UPDATES_DROPPED.labels("duplicate").inc()
+                return "duplicate"
+            self._seen[update_id] = None
+            while len(self._seen) > self.dedup_size:
+                self._seen.popitem(last=False)
+
+        chat = update.effective_chat
+        key = chat.id if chat is not None else update_id
+        try:
+            self._queues[key % len(self._queues)].put_nowait((update, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self._seen.pop(update_id, None)
+            UPDATES_DROPPED.labels("queue_full").inc()
+            return "full"
+        return "queued"
+
+    def depth(self) -> int:
+        return sum(shard.qsize() for shard in self._queues)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": len(self._threads),
+            "depth": self.depth(),
+            "capacity": sum(shard.maxsize for shard in self._queues),
+        }
+
+    def _work(self, shard: queue.Queue) -> None:
+        while True:
+            item = shard.get()
+            if item is _STOP:
+                return
+            update, enqueued_at = item
+            started = time.perf_counter()
+            UPDATE_QUEUE_WAIT.observe(started - enqueued_at)
+            try:
+                self.handler(update)
+            except Exception:
+                logger.exception(f"Ошибка обработки обновления {update.update_id}")
+            finally:
+                if self.latency is not None:
+                    self.latency.observe(time.perf_counter() - started)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Хранилище данных, присланных пользователями из Web App
+
+Перед постоянным хранилищем стоит ограниченный LRU-кэш в памяти
+(по количеству записей и TTL), поэтому память процесса не растет с
+числом пользователей. Запись в SQLite отложенная: изменения копятся в
+буфере и сбрасываются пачками фоновым потоком или при переполнении буфера.
+"""
+
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config import (
+    USER_STORE_BACKEND, USER_STORE_PATH, USER_STORE_MAX_ENTRIES, USER_STORE_TTL,
+    USER_STORE_MISS_TTL, USER_STORE_FLUSH_INTERVAL, USER_STORE_BATCH_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+# Признак отсутствующей записи, чтобы кэшировать и промахи
+_MISSING = object()
+
+
+class UserDataBackend(ABC):
+    """Постоянное хранилище данных пользователей"""
+
+    @abstractmethod
+    def load(self, user_id: int) -> Optional[str]:
+        """JSON данных пользователя или None"""
+
+    @abstractmethod
+    def save_many(self, items: Dict[int, str]) -> None:
+        """Сохраняет пачку user_id -> JSON"""
+
+    def close(self) -> None:
+        pass
+
+
+class NullBackend(UserDataBackend):
+    """Без постоянного хранения: данные живут только в LRU"""
+
+    def load(self, user_id: int) -> Optional[str]:
+        return None
+
+    def save_many(self, items: Dict[int, str]) -> None:
+        pass
+
+
+class SQLiteBackend(UserDataBackend):
+    """Таблица user_id -> JSON в файле SQLite"""
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_data ("
+            "user_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def load(self, user_id: int) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM user_data WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def save_many(self, items: Dict[int, str]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO user_data (user_id, data, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                [(user_id, data, now) for user_id, data in items.items()]
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class UserDataStore:
+    """
+    LRU с TTL перед постоянным хранилищем и отложенной записью
+
+    Промахи (пользователя нет в хранилище) кэшируются на короткий
+    miss_ttl: данные могли записать другие процессы бота.
+
+    Вытеснение из LRU не теряет данные: несохраненные изменения лежат в
+    отдельном буфере до сброса. Буфер ограничен batch_size - при
+    переполнении пачка сбрасывается сразу в вызывающем потоке.
+    """
+
+    def __init__(
+        self,
+        backend: UserDataBackend,
+        max_entries: int = USER_STORE_MAX_ENTRIES,
+        ttl: float = USER_STORE_TTL,
+        miss_ttl: float = USER_STORE_MISS_TTL,
+        flush_interval: float = USER_STORE_FLUSH_INTERVAL,
+        batch_size: int = USER_STORE_BATCH_SIZE,
+    ):
+        self.backend = backend
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._cache: "OrderedDict[int, tuple]" = OrderedDict()
+        self._dirty: Dict[int, str] = {}
+        self._stopped = threading.Event()
+        self._flusher = None
+        if flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="user-store-flush", daemon=True)
+            self._flusher.start()
+
+    def get(self, user_id: int) -> Optional[Any]:
+        """Данные пользователя или None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._cache.move_to_end(user_id)
+                self.hits += 1
+                return None if entry[0] is _MISSING else entry[0]
+            self.misses += 1
+            raw = self._dirty.get(user_id)
+
+        if raw is None:
+            raw = self.backend.load(user_id)
+        value = _MISSING if raw is None else json.loads(raw)
+        with self._lock:
+            # Пока читали с диска, могла прийти новая запись - она важнее
+            entry = self._cache.get(user_id)
+            if entry is not None and entry[1] > now:
+                value = entry[0]
+            else:
+                self._remember(user_id, value, now)
+        return None if value is _MISSING else value
+
+    def set(self, user_id: int, data: Any) -> None:
+        """Сохраняет данные пользователя; на диск они попадут со следующей пачкой"""
+        raw = json.dumps(data, ensure_ascii=False)
+        with self._lock:
+            self._remember(user_id, data, time.monotonic())
+            self._dirty[user_id] = raw
+            overflow = len(self._dirty) >= self.batch_size
+        if overflow or self.flush_interval <= 0:
+            self.flush()
+
+    def flush(self) -> int:
+        """Сбрасывает накопленные изменения, возвращает количество записей"""
+        with self._flush_lock:
+            with self._lock:
+                pending = dict(self._dirty)
+            if not pending:
+                return 0
+            # Записи остаются в буфере, пока пачка не сохранена: get() для
+            # вытесненного из LRU пользователя читает их, а не старую строку
+            self.backend.save_many(pending)
+            with self._lock:
+                for user_id, raw in pending.items():
+                    # Более новую запись, пришедшую во время сохранения, не трогаем
+                    if self._dirty.get(user_id) is raw:
+                        del self._dirty[user_id]
+            return len(pending)
+
+    def close(self) -> None:
+        """Останавливает фоновый сброс и сохраняет остаток"""
+        self._stopped.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        self.backend.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._cache),
+                "pending": len(self._dirty),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _remember(self, user_id: int, value: Any, now: float) -> None:
+        ttl = self.miss_ttl if value is _MISSING else self.ttl
+        self._cache[user_id] = (value, now + ttl)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def _flush_loop(self) -> None:
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Не удалось сохранить данные пользователей")
+
+
+def create_user_store() -> UserDataStore:
+    """Создает хранилище по настройкам USER_STORE_*"""
+    if USER_STORE_BACKEND == "memory":
+        backend = NullBackend()
+    elif USER_STORE_BACKEND == "sqlite":
+        backend = SQLiteBackend(USER_STORE_PATH)
+    else:
+        raise ValueError(f"Unknown USER_STORE_BACKEND: {USER_STORE_BACKEND}")
+    store = UserDataStore(backend)
+    atexit.register(store.close)
+    return store